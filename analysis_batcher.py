@@ -0,0 +1,103 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from intelligence import analyze_batch, analyze_content
+from llm_router import estimate_tokens
+
+# Batch Configuration
+LLM_BATCH_MODE = os.getenv("LLM_BATCH_MODE", "").lower() in ("1", "true", "yes")
+LLM_BATCH_TOKEN_BUDGET = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", "12000"))
+LLM_BATCH_MAX_SITES = int(os.getenv("LLM_BATCH_MAX_SITES", "8"))
+LLM_BATCH_LINGER = float(os.getenv("LLM_BATCH_LINGER", "0.5"))
+
+# Room left for the shared instructions and the JSON answer
+PROMPT_OVERHEAD_TOKENS = 600
+
+# Future result for a lone site whose individual call already failed (no re-queue)
+_ALREADY_TRIED = object()
+
+
+class AnalysisBatcher:
+    """
+    Micro-batcher in front of intelligence.analyze_batch. Workers call
+    `analyze()` one lead at a time; sites are packed into a single request
+    until the token budget or site cap is reached (or `linger` seconds pass),
+    and anything the batched answer misses is re-run on its own.
+    `llm_call(func, *args)` runs a blocking LLM function under the caller's limits.
+    """
+
+    def __init__(self, llm_call: Callable[..., Awaitable], token_budget: int = LLM_BATCH_TOKEN_BUDGET,
+                 max_sites: int = LLM_BATCH_MAX_SITES, linger: float = LLM_BATCH_LINGER):
+        self.llm_call = llm_call
+        self.token_budget = max(1, token_budget - PROMPT_OVERHEAD_TOKENS)
+        self.max_sites = max(1, max_sites)
+        self.linger = linger
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._pending_tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self.batches = 0
+        self.requeued = 0
+
+    async def analyze(self, lead: dict, niche: str, website_content: str) -> Optional[dict]:
+        """Returns the analysis for one lead, batched with whatever else is waiting."""
+        loop = asyncio.get_running_loop()
+        item = {
+            "lead_id": str(lead.get('id', lead['website_url'])),
+            "url": lead['website_url'],
+            "niche": niche,
+            "content": website_content,
+        }
+        tokens = estimate_tokens(website_content)
+
+        if self._pending and self._pending_tokens + tokens > self.token_budget:
+            self._flush()
+
+        future = loop.create_future()
+        self._pending.append((item, future))
+        self._pending_tokens += tokens
+
+        if len(self._pending) >= self.max_sites or self._pending_tokens >= self.token_budget:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger, self._flush)
+
+        result = await future
+        if result is _ALREADY_TRIED:
+            return None
+        if result is None:
+            # Missing or malformed in the batched answer: re-queue on its own
+            self.requeued += 1
+            result = await self.llm_call(analyze_content, item["url"], niche, website_content)
+        return result
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        self._pending_tokens = 0
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[dict, asyncio.Future]]):
+        items = [item for item, _ in batch]
+        try:
+            if len(items) == 1:
+                item = items[0]
+                result = await self.llm_call(analyze_content, item["url"], item["niche"], item["content"])
+                results = {item["lead_id"]: result or _ALREADY_TRIED}
+            else:
+                self.batches += 1
+                results = await self.llm_call(analyze_batch, items)
+        except Exception as e:
+            print(f" [!] Batched analysis failed: {e}")
+            results = {}
+
+        for item, future in batch:
+            if not future.done():
+                future.set_result(results.get(item["lead_id"]))
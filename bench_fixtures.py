@@ -0,0 +1,348 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from maps_payload import ADDRESS, FEATURE_ID, NAME, PLACE_ID, RATING_BLOCK, WEBSITE, XSSI_PREFIX
+
+# Local stand-ins for Google Maps, lead websites and the LLM providers, used by benchmark.py
+# The Maps stand-in writes its search responses with maps_payload's own field
+# offsets, so discovery parsing them is a circular check (the same one
+# fixtures/maps makes): it times the discovery loop but says nothing about
+# whether real Google Maps responses parse.
+
+SERVICES = ["cleanings", "whitening", "implants", "braces", "emergency visits", "checkups", "veneers", "crowns"]
+STREETS = ["Harbour Rd", "Mill Lane", "Station St", "Park Ave", "Market Sq", "Bridge St"]
+PLACES_PER_RESPONSE = 20
+
+MAPS_PAGE = """<!doctype html>
+<html><head><title>Maps</title>
+<style>#feed { height: 600px; overflow-y: auto; } .place { height: 90px; border-bottom: 1px solid #ddd; }</style>
+</head><body>
+<input id="searchboxinput" name="q" aria-label="Search Maps">
+<div id="results"></div>
+<div id="details"></div>
+<script>
+let query = "", page = 0, loading = false, done = false, feed = null;
+
+document.getElementById("searchboxinput").addEventListener("keydown", (event) => {
+  if (event.key === "Enter") search(event.target.value);
+});
+
+function search(q) {
+  query = q; page = 0; done = false;
+  const results = document.getElementById("results");
+  results.innerHTML = "";
+  feed = document.createElement("div");
+  feed.id = "feed";
+  feed.setAttribute("role", "feed");
+  results.appendChild(feed);
+  feed.addEventListener("scroll", () => {
+    if (feed.scrollTop + feed.clientHeight >= feed.scrollHeight - 10) loadPage();
+  });
+  loadPage();
+}
+
+async function loadPage() {
+  if (loading || done) return;
+  loading = true;
+  const response = await fetch("/maps/search/?q=" + encodeURIComponent(query) + "&page=" + page);
+  const body = await response.text();
+  const data = JSON.parse(body.slice(body.indexOf("\\n") + 1));
+  for (const [, place] of data[0][1]) addArticle(place);
+  page += 1;
+  done = data[0][2];
+  if (done) {
+    const end = document.createElement("div");
+    end.textContent = "You've reached the end of the list.";
+    feed.appendChild(end);
+  }
+  loading = false;
+}
+
+function addArticle(place) {
+  const name = place[%(name)d], featureId = place[%(feature_id)d], placeId = place[%(place_id)d];
+  const article = document.createElement("div");
+  article.className = "place";
+  article.setAttribute("role", "article");
+  article.setAttribute("aria-label", name);
+  const link = document.createElement("a");
+  link.href = "/maps/place/" + encodeURIComponent(name) + "/data=!4m7!3m6!1s" + featureId + "!8m2!19s" + placeId;
+  link.textContent = name;
+  article.appendChild(link);
+  article.addEventListener("click", (event) => { event.preventDefault(); openPlace(featureId); });
+  feed.appendChild(article);
+}
+
+async function openPlace(featureId) {
+  const details = document.getElementById("details");
+  details.innerHTML = "";
+  const place = await (await fetch("/maps/place/?id=" + encodeURIComponent(featureId))).json();
+  const panel = document.createElement("div");
+  panel.setAttribute("role", "main");
+  panel.setAttribute("aria-label", place.name);
+  const title = document.createElement("h1");
+  title.textContent = place.name;
+  panel.appendChild(title);
+  if (place.website) {
+    const website = document.createElement("a");
+    website.setAttribute("data-item-id", "authority");
+    website.href = place.website;
+    website.textContent = "Website";
+    panel.appendChild(website);
+  }
+  details.appendChild(panel);
+}
+</script>
+</body></html>
+""" % {"name": NAME, "feature_id": FEATURE_ID, "place_id": PLACE_ID}
+
+
+class Business:
+    """One synthetic place: its Maps record and the website served for it."""
+
+    def __init__(self, index: int, rng: random.Random):
+        self.index = index
+        self.name = f"{rng.choice(['Bright', 'Harbour', 'Oak', 'Smile', 'Summit', 'Union'])} Dental {index}"
+        self.slug = f"site-{index}"
+        self.rating = round(rng.uniform(3.5, 5.0), 1)
+        self.review_count = rng.randint(5, 900)
+        self.feature_id = f"0x{index + 0x1000:x}:0x{rng.getrandbits(48):x}"
+        self.place_id = f"ChIJbench{index:08d}"
+        self.address = f"{rng.randint(1, 200)} {rng.choice(STREETS)}, Benchtown"
+        # Some websites are only shown in the detail panel, so the click path is exercised too
+        self.website_in_payload = index % 4 != 0
+        self.services = rng.sample(SERVICES, 4)
+        self.paragraphs = rng.randint(4, 40)
+        self.url = ""
+
+    def record(self) -> list:
+        record: list = [None] * (PLACE_ID + 1)
+        record[NAME] = self.name
+        record[FEATURE_ID] = self.feature_id
+        record[PLACE_ID] = self.place_id
+        record[ADDRESS] = self.address
+        record[RATING_BLOCK] = [None] * 7 + [self.rating, self.review_count]
+        if self.website_in_payload:
+            record[WEBSITE] = [self.url, urlparse(self.url).netloc]
+        return record
+
+    def page(self, path: str) -> Optional[str]:
+        nav = "".join(f'<a href="/{self.slug}/{p}">{label}</a>'
+                      for p, label in (("", "Home"), ("services", "Services"), ("booking", "Book now"),
+                                       ("contact", "Contact"), ("about", "About us")))
+        header = f"<header><nav>{nav}</nav></header>"
+        footer = f"<footer><p>© 2025 {self.name}. All rights reserved.</p><p>{self.address}</p></footer>"
+        if path == "":
+            title = self.name
+            body = "".join(f"<p>{self.name} has offered {self.services[i % 4]} in Benchtown since {1990 + i}, "
+                           f"with gentle care for the whole family and same-week appointments.</p>"
+                           for i in range(self.paragraphs))
+            body = f"<h1>{self.name}</h1>{body}<a class='cta' href='/{self.slug}/booking'>Book an appointment</a>"
+        elif path == "services":
+            title = "Services"
+            body = "<h1>Our services</h1><ul>" + "".join(f"<li>{s}: from ${40 + 15 * i}</li>"
+                                                          for i, s in enumerate(self.services)) + "</ul>"
+        elif path == "booking":
+            title = "Booking"
+            body = "<h1>Book a visit</h1><p>Call us to book; online booking is coming soon.</p>"
+        elif path == "contact":
+            title = "Contact"
+            body = f"<h1>Contact</h1><p>{self.address}</p><form><input name='email'><button>Send</button></form>"
+        elif path == "about":
+            title = "About"
+            body = "<h1>About us</h1><p>A family practice.</p>"
+        else:
+            return None
+        return f"<html><head><title>{title}</title></head><body>{header}<main>{body}</main>{footer}</body></html>"
+
+
+class FixtureServer:
+    """
+    Serves a Maps-like search page (search box, scrolling feed fed by
+    XSSI-prefixed search responses, detail panels) and one website per
+    business. Sites are spread over `hosts` listeners on 127.0.0.1, each on
+    its own port, so the per-host crawl limit applies the way it would to
+    distinct domains. `latency` is added to every site page, `maps_latency`
+    to every Maps response.
+
+        fixtures = FixtureServer(businesses=50).start()
+        fixtures.maps_url, fixtures.businesses[0].url
+        fixtures.stop()
+    """
+
+    def __init__(self, businesses: int = 50, hosts: int = 8, latency: float = 0.03,
+                 maps_latency: float = 0.1, seed: int = 1):
+        rng = random.Random(seed)
+        self.businesses = [Business(i, rng) for i in range(businesses)]
+        self.latency = latency
+        self.maps_latency = maps_latency
+        self.requests: Counter = Counter()
+        self._by_slug = {b.slug: b for b in self.businesses}
+        self._by_feature = {b.feature_id: b for b in self.businesses}
+        fixtures = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                fixtures._handle(self)
+
+        self.servers = [ThreadingHTTPServer(("127.0.0.1", 0), Handler) for _ in range(max(1, hosts))]
+        for server in self.servers:
+            server.daemon_threads = True
+        for business in self.businesses:
+            port = self.servers[business.index % len(self.servers)].server_address[1]
+            business.url = f"http://127.0.0.1:{port}/{business.slug}/"
+
+    @property
+    def maps_url(self) -> str:
+        return f"http://127.0.0.1:{self.servers[0].server_address[1]}/maps"
+
+    def start(self) -> "FixtureServer":
+        for server in self.servers:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def search_response(self, page: int) -> str:
+        """One page of search results in the shape maps_payload.py parses."""
+        start = page * PLACES_PER_RESPONSE
+        chunk = self.businesses[start:start + PLACES_PER_RESPONSE]
+        done = start + PLACES_PER_RESPONSE >= len(self.businesses)
+        return XSSI_PREFIX + "\n" + json.dumps([["search", [[None, b.record()] for b in chunk], done]])
+
+    def _handle(self, handler: BaseHTTPRequestHandler):
+        parsed = urlparse(handler.path)
+        query = parse_qs(parsed.query)
+        if parsed.path == "/maps":
+            self.requests["maps"] += 1
+            self._send(handler, MAPS_PAGE)
+        elif parsed.path == "/maps/search/":
+            self.requests["maps_search"] += 1
+            time.sleep(self.maps_latency)
+            self._send(handler, self.search_response(int(query.get("page", ["0"])[0])), "application/json")
+        elif parsed.path == "/maps/place/":
+            self.requests["maps_place"] += 1
+            time.sleep(self.maps_latency)
+            business = self._by_feature.get(query.get("id", [""])[0])
+            if business is None:
+                handler.send_error(404)
+                return
+            self._send(handler, json.dumps({"name": business.name, "website": business.url}), "application/json")
+        else:
+            slug, _, path = parsed.path.strip("/").partition("/")
+            business = self._by_slug.get(slug)
+            page = business.page(path) if business else None
+            if page is None:
+                handler.send_error(404)
+                return
+            self.requests["site"] += 1
+            time.sleep(self.latency)
+            self._send(handler, page, etag=True)
+
+    @staticmethod
+    def _send(handler: BaseHTTPRequestHandler, text: str, content_type: str = "text/html; charset=utf-8",
+              etag: bool = False):
+        body = text.encode("utf-8")
+        tag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if etag and handler.headers.get("If-None-Match") == tag:
+            handler.send_response(304)
+            handler.end_headers()
+            return
+        handler.send_response(200)
+        handler.send_header("Content-Type", content_type)
+        if etag:
+            handler.send_header("ETag", tag)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+class FakeRateLimit(Exception):
+    """What a provider's 429 looks like to llm_router.is_rate_limited."""
+
+    status_code = 429
+
+
+class FakeLLM:
+    """
+    Stand-in for one LLM provider's `request(prompt)`: answers the analysis,
+    fused, batch and email prompts in the shape intelligence.py and
+    pipeline.py expect, after `latency` (+/- `jitter`) seconds. Enforces its
+    own `rpm` limit with 429s, like the real APIs, and fails `error_rate` of
+    calls outright.
+    """
+
+    def __init__(self, name: str, latency: float = 0.5, jitter: float = 0.2, rpm: int = 0,
+                 error_rate: float = 0.0, seed: int = 1):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self._rng = random.Random(seed)
+        self._recent: deque = deque()
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt: str) -> str:
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if self.rpm and len(self._recent) >= self.rpm:
+                self.calls["rate_limited"] += 1
+                raise FakeRateLimit(f"429 {self.name}: requests per minute exceeded")
+            self._recent.append(now)
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            failed = self._rng.random() < self.error_rate
+        time.sleep(delay)
+        if failed:
+            self.calls["errors"] += 1
+            raise RuntimeError(f"500 {self.name}: internal error")
+        kind, answer = self.answer(prompt)
+        self.calls[kind] += 1
+        return answer
+
+    def answer(self, prompt: str):
+        """(prompt kind, answer text) for one of the pipeline's prompts."""
+        lead_ids = re.findall(r"=== SITE lead_id=(\S+)", prompt)
+        if lead_ids:
+            return "batch", json.dumps([{"lead_id": lead_id, **self._analysis(lead_id)} for lead_id in lead_ids])
+        if "Step 2 - Write a cold email" in prompt:
+            return "fused", json.dumps({**self._analysis(prompt), "email_draft": self._email(prompt)})
+        if "Write a cold email" in prompt:
+            return "email", self._email(prompt)
+        return "analysis", "```json\n" + json.dumps(self._analysis(prompt)) + "\n```"
+
+    @staticmethod
+    def _analysis(seed: str) -> Dict[str, str]:
+        service = SERVICES[int(hashlib.md5(seed.encode()).hexdigest(), 16) % len(SERVICES)]
+        return {
+            "core_service": f"Family dentistry with a focus on {service}",
+            "problem": "No online booking; visitors have to call during opening hours.",
+            "ai_solution": "A booking assistant that takes appointments on the site around the clock.",
+        }
+
+    @staticmethod
+    def _email(prompt: str) -> str:
+        company = re.search(r"(?:to|outreach to) (.+?)(?: \(Niche|, a )", prompt)
+        return (f"Hi there,\n\nI enjoyed reading about {company.group(1) if company else 'your practice'}. "
+                f"Patients can only book by phone today; an AI booking assistant could take appointments "
+                f"around the clock.\n\nBest, [Your Name]")
+
+
+def fake_llm_stats(fakes: List[FakeLLM]) -> Dict[str, Dict[str, int]]:
+    return {fake.name: dict(fake.calls) for fake in fakes}
@@ -0,0 +1,291 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from bench_fixtures import FakeLLM, FixtureServer, fake_llm_stats
+from postgrest_stub import PostgrestStub
+
+# Benchmark Configuration
+BENCH_RESULTS_DIR = os.getenv("BENCH_RESULTS_DIR", "bench_results")
+# A metric this many percent worse than the baseline is reported as a regression
+BENCH_TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "10"))
+
+# (label, path into the result, True when higher is better)
+COMPARED_METRICS = [
+    ("discovery leads/min", ("stages", "discovery", "leads_per_min"), True),
+    ("phase 2 leads/min", ("stages", "phase2", "leads_per_min"), True),
+    ("analyze_site p50 ms", ("latency_ms", "bench.analyze_site", "p50"), False),
+    ("lead p50 ms", ("latency_ms", "lead.total", "p50"), False),
+    ("lead p95 ms", ("latency_ms", "lead.total", "p95"), False),
+    ("site.read p95 ms", ("latency_ms", "site.read", "p95"), False),
+    ("db requests", ("db", "total_requests"), False),
+    ("db bytes returned", ("db", "bytes_returned"), False),
+    ("peak RSS MB", ("peak_rss_mb",), False),
+]
+# Options that change where results go, not what is measured
+RUN_OPTIONS = {"output_dir", "compare", "tolerance", "no_save", "fail_on_regression"}
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def per_minute(items: int, seconds: float) -> float:
+    return round(items / seconds * 60, 1) if seconds > 0 else 0.0
+
+
+class StageClock:
+    """Wall time and database requests of one benchmark stage."""
+
+    def __init__(self, stub: PostgrestStub):
+        self.stub = stub
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.requests = sum(self.stub.requests.values())
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = round(time.perf_counter() - self.started, 3)
+        self.db_requests = sum(self.stub.requests.values()) - self.requests
+        return False
+
+
+async def run_benchmark(args, fixtures: FixtureServer, stub: PostgrestStub, fakes: List[FakeLLM]) -> dict:
+    # Imported here: these read SUPABASE_URL and the LLM cache settings at import time
+    from discovery import search_leads
+    from intelligence import analyze_site, close_intelligence
+    from lead_engine import LeadEngine
+    from llm_router import LLMRouter, Provider, get_router, set_router
+    from metrics import Metrics, get_metrics, set_metrics, span
+    from pipeline import get_discovered_leads
+
+    set_metrics(Metrics(enabled=True))
+    set_router(LLMRouter(providers=[
+        Provider(fake.name, f"bench-{fake.name}", f"Fake {fake.name}", fake, args.llm_client_rpm, 10_000_000)
+        for fake in fakes
+    ]))
+    stages: Dict[str, dict] = {}
+
+    # Phase 1: discovery against the Maps stand-in
+    if args.skip_discovery:
+        stages["discovery"] = {"skipped": "--skip-discovery"}
+    else:
+        try:
+            with StageClock(stub) as clock:
+                saved = await search_leads(args.niche, args.location, args.leads, headless=True)
+            stages["discovery"] = {"seconds": clock.seconds, "leads": saved,
+                                   "leads_per_min": per_minute(saved, clock.seconds),
+                                   "db_requests": clock.db_requests}
+        except Exception as e:
+            print(f" [!] Discovery skipped: {e}")
+            stages["discovery"] = {"skipped": str(e).splitlines()[0] if str(e) else type(e).__name__}
+    if not stub.rows():
+        # Without a browser the leads discovery would have saved are written directly
+        stub.insert("leads", [{"niche": args.niche, "location": args.location, "company_name": b.name,
+                               "website_url": b.url, "rating": b.rating, "review_count": b.review_count,
+                               "status": "discovered"} for b in fixtures.businesses[:args.leads]])
+
+    # One site at a time through analyze_site, for single-lead latency
+    sample = fixtures.businesses[:args.analyze_sample]
+    with StageClock(stub) as clock:
+        analyzed = 0
+        for business in sample:
+            with span("bench.analyze_site"):
+                analyzed += await analyze_site(business.url, args.niche) is not None
+    stages["analyze_site"] = {"seconds": clock.seconds, "sites": len(sample), "analyzed": analyzed}
+
+    # Phase 2: every discovered lead through the engine, as main.py runs it
+    with StageClock(stub) as clock:
+        leads = get_discovered_leads(args.leads)
+        engine = LeadEngine(concurrency=args.concurrency, fused=args.fused, batch=args.batch)
+        try:
+            succeeded, failed = await engine.run(leads, niche=args.niche)
+        finally:
+            await close_intelligence()
+    stages["phase2"] = {"seconds": clock.seconds, "leads": len(leads), "succeeded": succeeded, "failed": failed,
+                        "leads_per_min": per_minute(succeeded, clock.seconds), "db_requests": clock.db_requests}
+
+    metrics = get_metrics()
+    router = get_router()
+    return {
+        "stages": stages,
+        "latency_ms": {
+            name: {"count": stage.count, "p50": round(stage.percentile(50) * 1000, 1),
+                   "p95": round(stage.percentile(95) * 1000, 1), "max": round(stage.max * 1000, 1),
+                   "errors": stage.errors}
+            for name, stage in sorted(metrics.stages.items())
+        },
+        "counters": dict(sorted(metrics.counters.items())),
+        "db": {"requests": dict(stub.requests), "total_requests": sum(stub.requests.values()),
+               "rows_returned": stub.rows_returned, "bytes_returned": stub.bytes_returned},
+        "llm": {"providers": fake_llm_stats(fakes), "routing": router.stats()},
+        "fixtures": dict(fixtures.requests),
+    }
+
+
+def lookup(result: dict, path) -> Optional[float]:
+    for key in path:
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result if isinstance(result, (int, float)) else None
+
+
+def compare_results(baseline: dict, current: dict, tolerance: float = BENCH_TOLERANCE) -> List[str]:
+    """One line per metric present in both runs; regressions beyond `tolerance` percent are marked."""
+    lines = []
+    for label, path, higher_is_better in COMPARED_METRICS:
+        old, new = lookup(baseline, path), lookup(current, path)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        worse = -change if higher_is_better else change
+        marker = " [!] regression" if worse > tolerance else ""
+        lines.append(f"  {label}: {old:g} -> {new:g} ({change:+.1f}%){marker}")
+    return lines
+
+
+def config_changes(baseline: dict, current: dict) -> List[str]:
+    """Settings that differ between two runs; their numbers are not directly comparable."""
+    old, new = baseline.get("config", {}), current.get("config", {})
+    return [f"{key}={old.get(key)!r}->{new.get(key)!r}" for key in sorted(set(old) | set(new))
+            if key not in RUN_OPTIONS and old.get(key) != new.get(key)]
+
+
+def latest_result(directory: str) -> Optional[str]:
+    paths = sorted(glob.glob(os.path.join(directory, "bench-*.json")))
+    return paths[-1] if paths else None
+
+
+def print_report(result: dict):
+    for name, stage in result["stages"].items():
+        if "skipped" in stage:
+            print(f"  {name}: skipped ({stage['skipped']})")
+            continue
+        details = ", ".join(f"{key}={value}" for key, value in stage.items() if key != "seconds")
+        print(f"  {name}: {stage['seconds']:.1f}s, {details}")
+        if name == "discovery":
+            print("    (Maps stand-in built from maps_payload's own offsets: times the loop, "
+                  "doesn't validate parsing of real Maps responses)")
+    for name, stage in result["latency_ms"].items():
+        errors = f", {stage['errors']} errors" if stage["errors"] else ""
+        print(f"  {name}: {stage['count']}x, p50 {stage['p50']:.0f}ms, p95 {stage['p95']:.0f}ms, "
+              f"max {stage['max']:.0f}ms{errors}")
+    db = result["db"]
+    print(f"  Database: {db['total_requests']} requests {db['requests']}, {db['rows_returned']} rows / "
+          f"{db['bytes_returned']} bytes returned")
+    print(f"  LLM: {result['llm']['routing']}")
+    if result["peak_rss_mb"] is not None:
+        print(f"  Peak RSS: {result['peak_rss_mb']} MB")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark against local stand-ins")
+    parser.add_argument("--sites", type=int, default=60, help="Businesses on the Maps stand-in, one website each")
+    parser.add_argument("--leads", type=int, default=40, help="Leads to discover and process")
+    parser.add_argument("--niche", default="dentist")
+    parser.add_argument("--location", default="Benchtown")
+    parser.add_argument("--concurrency", type=int, default=None, help="Leads processed in parallel (LEAD_CONCURRENCY)")
+    parser.add_argument("--fused", action="store_true", help="Analyze and draft the email in a single LLM call")
+    parser.add_argument("--batch", action="store_true", help="Pack several sites into each analysis request")
+    parser.add_argument("--analyze-sample", type=int, default=5, help="Sites run one at a time through analyze_site")
+    parser.add_argument("--skip-discovery", action="store_true", help="Seed the leads instead of driving a browser")
+    parser.add_argument("--site-latency", type=float, default=0.03, help="Seconds added to every site page")
+    parser.add_argument("--maps-latency", type=float, default=0.1, help="Seconds added to every Maps response")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Mean seconds per LLM answer")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="Uniform +/- spread on the LLM latency")
+    parser.add_argument("--llm-rpm", type=int, default=0, help="Requests per minute the fake providers accept (0 = unlimited)")
+    parser.add_argument("--llm-client-rpm", type=int, default=6000, help="Requests per minute the router allows itself")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Share of LLM calls that fail outright")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output-dir", default=BENCH_RESULTS_DIR, help="Where results are saved")
+    parser.add_argument("--compare", help="Result file to compare against (default: the latest in --output-dir)")
+    parser.add_argument("--tolerance", type=float, default=BENCH_TOLERANCE, help="Percent change reported as a regression")
+    parser.add_argument("--no-save", action="store_true", help="Print the results without saving them")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit 1 when a metric regressed")
+    args = parser.parse_args()
+
+    fixtures = FixtureServer(businesses=max(args.sites, args.leads), latency=args.site_latency,
+                             maps_latency=args.maps_latency, seed=args.seed).start()
+    stub = PostgrestStub().start()
+    cache_dir = tempfile.TemporaryDirectory()
+    os.environ.update({
+        "SUPABASE_URL": stub.url,
+        "SUPABASE_KEY": "bench-key",
+        "DISCOVERY_MAPS_URL": fixtures.maps_url,
+        "LLM_CACHE_PATH": os.path.join(cache_dir.name, "llm_cache.sqlite3"),
+        "LLM_CACHE_BYPASS": "1",
+        "BOILERPLATE_STATS_PATH": os.path.join(cache_dir.name, "boilerplate_stats.json"),
+    })
+    # The politeness floor would only measure itself here
+    os.environ.setdefault("SCROLL_JITTER_MIN", "0")
+    os.environ.setdefault("SCROLL_JITTER_MAX", "0")
+    if args.concurrency is None:
+        from lead_engine import LEAD_CONCURRENCY
+        args.concurrency = LEAD_CONCURRENCY
+    fakes = [FakeLLM(name, args.llm_latency, args.llm_jitter, args.llm_rpm, args.llm_error_rate, args.seed + i)
+             for i, name in enumerate(("gemini", "groq"))]
+
+    print(f"\n=== Benchmark: {args.leads} leads, {len(fixtures.businesses)} sites, concurrency {args.concurrency} ===")
+    try:
+        result = asyncio.run(run_benchmark(args, fixtures, stub, fakes))
+    finally:
+        stub.stop()
+        fixtures.stop()
+        cache_dir.cleanup()
+
+    result = {"created_at": datetime.now(timezone.utc).isoformat(), "git_commit": git_commit(),
+              "config": vars(args), **result, "peak_rss_mb": peak_rss_mb()}
+    print("\n=== Benchmark Results ===")
+    print_report(result)
+
+    baseline_path = args.compare or latest_result(args.output_dir)
+    regressions = False
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines = compare_results(baseline, result, args.tolerance)
+        print(f"\nCompared with {baseline_path} ({baseline.get('git_commit') or 'unknown commit'}):")
+        print("\n".join(lines) if lines else "  no metrics in common")
+        changes = config_changes(baseline, result)
+        if changes:
+            print(f"  [!] Settings differ: {', '.join(changes)}")
+        regressions = any("regression" in line for line in lines)
+
+    if not args.no_save:
+        os.makedirs(args.output_dir, exist_ok=True)
+        path = os.path.join(args.output_dir, f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nSaved to {path}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
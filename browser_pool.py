@@ -0,0 +1,205 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from playwright.async_api import async_playwright
+
+from metrics import span
+
+# Pool Configuration
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "6"))
+BROWSER_RECYCLE_AFTER = int(os.getenv("BROWSER_RECYCLE_AFTER", "200"))
+
+
+class _BrowserSlot:
+    """One long-lived browser plus the contexts it keeps warm for reuse."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.browser = None
+        self.idle_contexts = []
+        self.active = 0
+        self.pages_served = 0
+        self.crashed = False
+        # Set while the browser is being (re)started, outside the pool lock
+        self.launching: Optional[asyncio.Task] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.browser is not None and not self.crashed and self.browser.is_connected()
+
+
+class BrowserPool:
+    """
+    Shared pool of headless Chromium browsers that lives for the whole run.
+    Pages are handed out through `async with pool.page() as page:`; contexts are
+    recycled between leads and each browser is restarted after
+    `recycle_after` pages or as soon as it crashes.
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE, max_pages: int = BROWSER_MAX_PAGES,
+                 recycle_after: int = BROWSER_RECYCLE_AFTER, headless: bool = True):
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self.recycle_after = max(1, recycle_after)
+        self.headless = headless
+        self._playwright_cm = None
+        self._playwright = None
+        self._slots = [_BrowserSlot(i) for i in range(self.size)]
+        self._page_semaphore = asyncio.Semaphore(self.max_pages)
+        self._lock = asyncio.Lock()
+        self.launches = 0
+
+    async def start(self):
+        """Starts Playwright. Browsers themselves are launched lazily on first use."""
+        if self._playwright is None:
+            self._playwright_cm = async_playwright()
+            self._playwright = await self._playwright_cm.start()
+
+    async def close(self):
+        """Closes every browser and stops Playwright."""
+        async with self._lock:
+            for slot in self._slots:
+                if slot.launching is not None:
+                    await asyncio.gather(slot.launching, return_exceptions=True)
+                await self._shutdown_slot(slot)
+            if self._playwright_cm is not None:
+                try:
+                    await self._playwright_cm.__aexit__(None, None, None)
+                except Exception:
+                    pass
+            self._playwright_cm = None
+            self._playwright = None
+
+    async def _launch(self, slot: _BrowserSlot):
+        with span("browser.launch"):
+            browser = await self._playwright.chromium.launch(headless=self.headless)
+
+        def on_disconnect(_browser):
+            # A browser closed or crashed after it was replaced must not take its successor down
+            if slot.browser is browser:
+                slot.crashed = True
+
+        browser.on("disconnected", on_disconnect)
+        slot.browser = browser
+        slot.crashed = False
+        slot.pages_served = 0
+        self.launches += 1
+
+    async def _relaunch(self, slot: _BrowserSlot, old_browser, old_contexts):
+        """Closes a slot's previous browser and starts a new one; runs without the pool lock."""
+        try:
+            await self._close_browser(old_browser, old_contexts)
+            await self._launch(slot)
+        finally:
+            slot.launching = None
+
+    async def _close_browser(self, browser, contexts):
+        for context in contexts:
+            try:
+                await context.close()
+            except Exception:
+                pass
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception:
+                pass
+
+    async def _shutdown_slot(self, slot: _BrowserSlot):
+        browser, contexts = slot.browser, slot.idle_contexts
+        slot.browser, slot.idle_contexts = None, []
+        await self._close_browser(browser, contexts)
+
+    async def _acquire_slot(self) -> _BrowserSlot:
+        async with self._lock:
+            await self.start()
+            # Prefer healthy browsers with the fewest pages in flight; a browser
+            # that crashed or is due for recycling is only restarted once it has drained.
+            def rank(s: _BrowserSlot):
+                draining = s.active > 0 and (not s.alive or s.pages_served >= self.recycle_after)
+                return (draining, s.active)
+
+            slot = min(self._slots, key=rank)
+            if slot.active == 0 and (not slot.alive or slot.pages_served >= self.recycle_after):
+                # Detach the old browser now; closing it and launching the next happen after the lock is released
+                old_browser, old_contexts = slot.browser, slot.idle_contexts
+                slot.browser, slot.idle_contexts = None, []
+                slot.launching = asyncio.create_task(self._relaunch(slot, old_browser, old_contexts))
+            slot.active += 1
+            launching = slot.launching
+
+        # Other callers handed the same slot wait on the same launch
+        if launching is not None:
+            try:
+                await asyncio.shield(launching)
+            except BaseException:
+                slot.active -= 1
+                raise
+        return slot
+
+    async def _checkout_context(self, slot: _BrowserSlot):
+        while slot.idle_contexts:
+            context = slot.idle_contexts.pop()
+            try:
+                await context.clear_cookies()
+                return context
+            except Exception:
+                continue
+        return await slot.browser.new_context()
+
+    async def _release(self, slot: _BrowserSlot, context, page, healthy: bool):
+        try:
+            if page is not None:
+                await page.close()
+        except Exception:
+            healthy = False
+        if context is not None:
+            if healthy and slot.alive:
+                slot.idle_contexts.append(context)
+            else:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+        slot.active -= 1
+        slot.pages_served += 1
+
+    @asynccontextmanager
+    async def page(self):
+        """Yields a fresh page from a pooled browser, bounded by `max_pages`."""
+        async with self._page_semaphore:
+            slot = await self._acquire_slot()
+            context = None
+            page = None
+            healthy = True
+            try:
+                context = await self._checkout_context(slot)
+                page = await context.new_page()
+                yield page
+            except Exception:
+                healthy = False
+                raise
+            finally:
+                await self._release(slot, context, page, healthy)
+
+
+_shared_pool: Optional[BrowserPool] = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """Returns the process-wide browser pool, creating it on first use."""
+    global _shared_pool
+    if _shared_pool is None:
+        _shared_pool = BrowserPool()
+    return _shared_pool
+
+
+async def close_browser_pool():
+    """Closes the process-wide browser pool if one was started."""
+    global _shared_pool
+    if _shared_pool is not None:
+        await _shared_pool.close()
+        _shared_pool = None
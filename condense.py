@@ -0,0 +1,281 @@
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+from llm_router import estimate_tokens
+
+# Condensation Configuration
+CONDENSE_CONTENT = os.getenv("CONDENSE_CONTENT", "1").lower() not in ("0", "false", "no")
+CONDENSE_TOKEN_BUDGET = int(os.getenv("CONDENSE_TOKEN_BUDGET", "1200"))
+# A line seen on this many different sites is treated as template boilerplate
+BOILERPLATE_MIN_SITES = int(os.getenv("BOILERPLATE_MIN_SITES", "3"))
+BOILERPLATE_MAX_LINES = int(os.getenv("BOILERPLATE_MAX_LINES", "50000"))
+# Cross-site stats are kept here between runs ("" keeps them in memory only, so they never apply)
+BOILERPLATE_STATS_PATH = os.getenv("BOILERPLATE_STATS_PATH", ".boilerplate_stats.json")
+# Stats from fewer sites than this are not used yet
+BOILERPLATE_WARMUP_SITES = int(os.getenv("BOILERPLATE_WARMUP_SITES", "20"))
+
+# What extract_text_from_url used to send when condensation is off
+LEGACY_CHAR_LIMIT = 10000
+
+# Boilerplate recognisable before any cross-site stats exist (short lines only)
+BOILERPLATE_PATTERNS = re.compile(
+    r"cookie|all rights reserved|privacy policy|terms (of|and) (use|service|conditions)|"
+    r"skip to (main )?content|powered by|toggle navigation|^menu$|^close$|^search$|"
+    r"^accept( all)?$|^reject( all)?$|^home$|^back to top$|©|copyright",
+    re.IGNORECASE,
+)
+BOILERPLATE_PATTERN_MAX_CHARS = 120
+
+CONTACT_PATTERN = re.compile(
+    r"\+?\d[\d\s().-]{7,}\d|[\w.+-]+@[\w-]+\.[\w.]+|"
+    r"\b(suite|street|st\.|avenue|ave\.?|road|rd\.|blvd|floor|p\.?o\.? box)\b|"
+    r"\b(mon|tue|wed|thu|fri|sat|sun)[a-z]*\b.*\d|\d\s?(am|pm)\b",
+    re.IGNORECASE,
+)
+SIGNAL_PATTERN = re.compile(
+    r"servic|offer|speciali|treatment|pricing|price|packages?\b|\$|aed|book|appointment|schedule|"
+    r"consult|quote|online|chat|whatsapp|24/7|reviews?\b|testimonial|years of experience|certified",
+    re.IGNORECASE,
+)
+
+
+def normalize_line(line: str) -> str:
+    """Key for cross-site comparison: lowercase, digits folded, whitespace collapsed."""
+    return " ".join(re.sub(r"\d+", "0", line.lower()).split())
+
+
+def content_fingerprint(text: str) -> str:
+    """
+    Hash of a site's meaningful text, for telling whether it changed since the
+    last visit. Lines are normalized (so dates, counters and copyright years
+    don't register as edits) and template lines like cookie banners are left
+    out; the order of what remains still matters.
+    """
+    digest = hashlib.sha256()
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not is_template_line(line):
+            digest.update(normalize_line(line).encode("utf-8"))
+            digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class BoilerplateStats:
+    """
+    Counts on how many distinct sites each normalized line appears. Lines
+    shared by BOILERPLATE_MIN_SITES sites (cookie banners, "Powered by Wix",
+    theme footers) carry no signal about the business and are dropped,
+    unless they look like service or contact details.
+    Lines are judged against a snapshot taken by `freeze()` (on `load()`),
+    not against whatever this run has seen so far: a page condenses to the
+    same prompt whichever sites came before it, so the LLM cache keeps
+    hitting. What a run observes is saved for the next one.
+    """
+
+    def __init__(self, min_sites: int = BOILERPLATE_MIN_SITES, max_lines: int = BOILERPLATE_MAX_LINES,
+                 warmup_sites: int = BOILERPLATE_WARMUP_SITES):
+        self.min_sites = max(2, min_sites)
+        self.max_lines = max_lines
+        self.warmup_sites = warmup_sites
+        # Where load() read the stats from, and save() writes them back ("" keeps them in memory)
+        self.path = ""
+        self._sites: Dict[str, Set[str]] = {}
+        self._site_count = 0
+        # Keeps a site from counting twice towards warmup; capped, since line counts don't depend on it
+        self._seen_sites: Set[str] = set()
+        self._shared: Set[str] = set()
+
+    @classmethod
+    def load(cls, path: Optional[str] = None, **kwargs) -> "BoilerplateStats":
+        """
+        Stats saved by earlier runs, frozen for this one. Empty when there are
+        none yet. `path` defaults to BOILERPLATE_STATS_PATH.
+        """
+        stats = cls(**kwargs)
+        stats.path = BOILERPLATE_STATS_PATH if path is None else path
+        if stats.path and os.path.exists(stats.path):
+            try:
+                with open(stats.path, encoding="utf-8") as f:
+                    data = json.load(f)
+                stats._site_count = data["site_count"]
+                stats._sites = {key: set(sites) for key, sites in data["lines"].items()}
+            except (OSError, ValueError, KeyError) as e:
+                print(f" [!] Ignoring boilerplate stats in {stats.path}: {e}")
+        stats.freeze()
+        return stats
+
+    def save(self, path: Optional[str] = None):
+        """Writes the stats to `path`, or back to where load() read them from."""
+        path = self.path if path is None else path
+        if not path:
+            return
+        data = {"site_count": self._site_count,
+                "lines": {key: sorted(sites) for key, sites in self._sites.items()}}
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+    def freeze(self):
+        """Snapshots the lines shared so far; is_shared() answers from it until the next freeze."""
+        if self._site_count < self.warmup_sites:
+            self._shared = set()
+        else:
+            self._shared = {key for key, sites in self._sites.items() if len(sites) >= self.min_sites}
+
+    def observe(self, site: str, lines: List[str]):
+        if site in self._seen_sites:
+            return
+        if len(self._seen_sites) >= self.max_lines:
+            self._seen_sites.clear()
+        self._seen_sites.add(site)
+        self._site_count += 1
+        for key in {normalize_line(line) for line in lines}:
+            sites = self._sites.setdefault(key, set())
+            if len(sites) < self.min_sites:
+                sites.add(site)
+        if len(self._sites) > self.max_lines:
+            # Keep only lines already shared by several sites
+            self._sites = {k: v for k, v in self._sites.items() if len(v) > 1}
+
+    def is_shared(self, line: str) -> bool:
+        return normalize_line(line) in self._shared
+
+
+def is_template_line(line: str) -> bool:
+    return len(line) <= BOILERPLATE_PATTERN_MAX_CHARS and bool(BOILERPLATE_PATTERNS.search(line))
+
+
+def _line_score(line: str) -> int:
+    if CONTACT_PATTERN.search(line):
+        return 3
+    if SIGNAL_PATTERN.search(line):
+        return 2
+    words = len(line.split())
+    if words >= 8:
+        return 1
+    # Short fragments without keywords are mostly menu items and labels
+    return 0 if words >= 3 else -1
+
+
+def _header(outline: Dict[str, object]) -> List[str]:
+    lines = []
+    if outline.get("title"):
+        lines.append(f"Title: {outline['title']}")
+    if outline.get("description"):
+        lines.append(f"Description: {outline['description']}")
+    if outline.get("headings"):
+        lines.append("Headings: " + " | ".join(outline["headings"]))
+    if outline.get("ctas"):
+        lines.append("Calls to action: " + " | ".join(outline["ctas"]))
+    forms = outline.get("forms") or []
+    lines.append("Forms: " + ("; ".join(f"[{f}]" for f in forms) if forms else "none found"))
+    lines.append("Online booking widget: " + (", ".join(outline.get("booking") or []) or "none detected"))
+    lines.append("Chat widget: " + (", ".join(outline.get("chat") or []) or "none detected"))
+    if outline.get("contacts"):
+        lines.append("Contact links: " + ", ".join(outline["contacts"]))
+    return lines
+
+
+def _fit_header(lines: List[str], budget: int) -> List[str]:
+    """Shortens the longest header lines (long heading/CTA lists) until the header fits `budget` tokens."""
+    lines = list(lines)
+    while lines and estimate_tokens("\n".join(lines)) > budget:
+        longest = max(range(len(lines)), key=lambda i: len(lines[i]))
+        if len(lines[longest]) > 40:
+            lines[longest] = lines[longest][: len(lines[longest]) // 2].rstrip() + "…"
+        else:
+            lines.pop()
+    return lines
+
+
+class Condenser:
+    """Turns a page's visible text and outline into a compact, budgeted prompt section."""
+
+    def __init__(self, token_budget: int = CONDENSE_TOKEN_BUDGET, stats: Optional[BoilerplateStats] = None):
+        self.token_budget = token_budget
+        self.stats = stats if stats is not None else BoilerplateStats.load()
+        self.pages = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.boilerplate_dropped = 0
+
+    def condense(self, url: str, text: str, outline: Dict[str, object]) -> str:
+        site = urlparse(url).netloc.lower() or url
+        lines = [line for line in text.splitlines() if line.strip()]
+        self.stats.observe(site, lines)
+
+        header = _fit_header(_header(outline), self.token_budget)
+        budget = self.token_budget - estimate_tokens("\n".join(header))
+
+        # Distinct, non-boilerplate lines with a relevance score, in page order
+        candidates = []
+        seen = {normalize_line(str(outline.get(field) or "")) for field in ("title", "description")}
+        seen.update(normalize_line(heading) for heading in outline.get("headings") or [])
+        for index, line in enumerate(lines):
+            key = normalize_line(line)
+            if key in seen:
+                continue
+            seen.add(key)
+            score = _line_score(line)
+            # Same-niche sites legitimately share service and contact lines; keep those
+            if is_template_line(line) or (score < 2 and self.stats.is_shared(line)):
+                self.boilerplate_dropped += 1
+                continue
+            candidates.append((index, line, score))
+
+        # Highest-signal lines win the budget; the output keeps page order
+        kept = []
+        for index, line, score in sorted(candidates, key=lambda c: (-c[2], c[0])):
+            cost = estimate_tokens(line)
+            if cost > budget:
+                continue
+            kept.append((index, line))
+            budget -= cost
+
+        body = [line for _, line in sorted(kept)]
+        condensed = "\n".join(header + (["Page text:"] + body if body else []))
+
+        self.pages += 1
+        self.tokens_in += estimate_tokens(text[:LEGACY_CHAR_LIMIT])
+        self.tokens_out += estimate_tokens(condensed)
+        return condensed
+
+    def summary(self) -> str:
+        if not self.pages:
+            return "no pages condensed"
+        return (f"{self.pages} pages, ~{self.tokens_in // self.pages} -> ~{self.tokens_out // self.pages} "
+                f"prompt tokens per page, {self.boilerplate_dropped} boilerplate lines dropped")
+
+
+_condenser: Optional[Condenser] = None
+
+
+def get_condenser() -> Condenser:
+    """Returns the process-wide condenser, so boilerplate stats accumulate across sites."""
+    global _condenser
+    if _condenser is None:
+        _condenser = Condenser()
+    return _condenser
+
+
+def condense_page(url: str, text: str, outline: Dict[str, object]) -> str:
+    """Prompt-ready page content: condensed when enabled, else the legacy first 10,000 characters."""
+    if not CONDENSE_CONTENT:
+        return text[:LEGACY_CHAR_LIMIT]
+    return get_condenser().condense(url, text, outline)
+
+
+def save_boilerplate_stats():
+    """Keeps what this run learned about shared lines for the next run (see BoilerplateStats)."""
+    if _condenser is not None:
+        _condenser.stats.save()
+
+
+def condense_stats() -> str:
+    if not CONDENSE_CONTENT:
+        return "off"
+    return get_condenser().summary()
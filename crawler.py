@@ -0,0 +1,172 @@
+import asyncio
+import os
+import re
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urldefrag, urljoin, urlparse
+
+# Crawl Configuration
+# Pages read per site, homepage included; 1 reads only the homepage
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "4"))
+CRAWL_HOST_CONCURRENCY = int(os.getenv("CRAWL_HOST_CONCURRENCY", "3"))
+CRAWL_MAX_BYTES = int(os.getenv("CRAWL_MAX_BYTES", str(4 * 1024 * 1024)))
+# Seconds allowed for the extra pages once the homepage has been read
+CRAWL_TIME_BUDGET = float(os.getenv("CRAWL_TIME_BUDGET", "6"))
+
+# Path/label keywords for the pages where booking, chat and contact gaps show up
+LINK_KEYWORDS = [
+    (re.compile(r"book|appointment|schedule|reserv|calendar", re.I), 5),
+    (re.compile(r"contact|get-in-touch|enquir|inquir|locations?\b|find-us", re.I), 4),
+    (re.compile(r"servic|treatment|pricing|prices?\b|packages?|menu|rates", re.I), 3),
+    (re.compile(r"faq|about|team", re.I), 1),
+]
+SKIP_EXTENSIONS = (".pdf", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".zip", ".mp4", ".mp3", ".doc", ".docx")
+MAX_MERGED_HEADINGS = 25
+MAX_MERGED_CTAS = 20
+
+# (tier, html, text, outline) for one page, as returned by intelligence.read_page
+PageRead = Tuple[str, str, str, Dict[str, object]]
+
+crawl_counts: Counter = Counter()
+
+
+def _host(url: str) -> str:
+    host = urlparse(url).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def score_link(href: str, label: str) -> int:
+    path = urlparse(href).path
+    target = f"{path} {label}"
+    return max((weight for pattern, weight in LINK_KEYWORDS if pattern.search(target)), default=0)
+
+
+def pick_links(base_url: str, links: List[Tuple[str, str]], limit: int) -> List[str]:
+    """Top `limit` same-site links by keyword score (ties keep page order)."""
+    if limit <= 0:
+        return []
+    host = _host(base_url)
+    seen = {urldefrag(base_url)[0].rstrip("/")}
+    scored = []
+    for index, (href, label) in enumerate(links):
+        url = urldefrag(urljoin(base_url, href))[0]
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or _host(url) != host:
+            continue
+        if parsed.path.lower().endswith(SKIP_EXTENSIONS):
+            continue
+        key = url.rstrip("/")
+        if key in seen:
+            continue
+        seen.add(key)
+        score = score_link(url, label)
+        if score > 0:
+            scored.append((-score, index, url))
+    return [url for _, _, url in sorted(scored)[:limit]]
+
+
+class HostLimiter:
+    """Caps concurrent requests per host across every site being crawled."""
+
+    def __init__(self, per_host: int = CRAWL_HOST_CONCURRENCY):
+        self.per_host = max(1, per_host)
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._users: Counter = Counter()
+
+    async def run(self, url: str, call: Callable[[], Awaitable]):
+        host = _host(url)
+        semaphore = self._slots.setdefault(host, asyncio.Semaphore(self.per_host))
+        self._users[host] += 1
+        try:
+            async with semaphore:
+                return await call()
+        finally:
+            self._users[host] -= 1
+            if not self._users[host]:
+                del self._users[host]
+                del self._slots[host]
+
+
+_limiter: Optional[HostLimiter] = None
+
+
+def get_host_limiter() -> HostLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = HostLimiter()
+    return _limiter
+
+
+async def crawl_pages(urls: List[str], read: Callable[[str, int], Awaitable[Optional[PageRead]]],
+                      byte_budget: int, time_budget: float = CRAWL_TIME_BUDGET) -> List[Tuple[str, str, Dict[str, object]]]:
+    """
+    Reads `urls` in parallel under the per-host cap. `read(url, max_bytes)`
+    fetches one page; each gets an equal share of `byte_budget`. Pages still
+    loading when `time_budget` runs out are cancelled and left out.
+    Returns (url, text, outline) for the pages that came back, in `urls` order.
+    """
+    if not urls or byte_budget <= 0:
+        return []
+    share = byte_budget // len(urls)
+    limiter = get_host_limiter()
+    tasks = [asyncio.ensure_future(limiter.run(url, lambda url=url: read(url, share))) for url in urls]
+    started = time.monotonic()
+    done, pending = await asyncio.wait(tasks, timeout=time_budget)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+        crawl_counts["timed_out"] += len(pending)
+
+    pages = []
+    for url, task in zip(urls, tasks):
+        if task not in done:
+            continue
+        if task.exception() is not None or task.result() is None:
+            crawl_counts["failed"] += 1
+            continue
+        _, _, text, outline = task.result()
+        pages.append((url, text, outline))
+    crawl_counts["pages"] += len(pages)
+    crawl_counts["seconds"] += time.monotonic() - started
+    return pages
+
+
+def _extend(target: List, items, limit: int):
+    for item in items or []:
+        if item not in target and len(target) < limit:
+            target.append(item)
+
+
+def merge_pages(pages: List[Tuple[str, str, Dict[str, object]]]) -> Tuple[str, Dict[str, object]]:
+    """Joins page texts and outlines; the first page (the homepage) supplies title and description."""
+    _, text, home = pages[0]
+    texts = [text]
+    merged = {
+        "title": home.get("title", ""),
+        "description": home.get("description", ""),
+        "headings": list(home.get("headings") or []),
+        "ctas": list(home.get("ctas") or []),
+        "forms": list(home.get("forms") or []),
+        "chat": list(home.get("chat") or []),
+        "booking": list(home.get("booking") or []),
+        "contacts": list(home.get("contacts") or []),
+    }
+    for _, text, outline in pages[1:]:
+        texts.append(text)
+        _extend(merged["headings"], outline.get("headings"), MAX_MERGED_HEADINGS)
+        _extend(merged["ctas"], outline.get("ctas"), MAX_MERGED_CTAS)
+        for field in ("forms", "chat", "booking", "contacts"):
+            _extend(merged[field], outline.get(field), MAX_MERGED_CTAS)
+    merged["chat"].sort()
+    merged["booking"].sort()
+    return "\n".join(texts), merged
+
+
+def crawl_stats() -> str:
+    if not crawl_counts:
+        return "homepage only"
+    pages = crawl_counts["pages"]
+    return (f"{pages} extra pages, {crawl_counts['timed_out']} timed out, {crawl_counts['failed']} failed, "
+            f"{crawl_counts['seconds']:.1f}s spent on extra pages")
@@ -1,20 +1,66 @@
 import asyncio
 import os
 import random
+import re
+import time
+from typing import Dict, List, Optional, Set, Tuple
 from playwright.async_api import async_playwright
 from playwright_stealth import Stealth
-from supabase_client import create_client, SupabaseClient as Client
+from supabase_client import create_client, create_async_client, SupabaseClient as Client
+from lead_index import LeadIndex
+from lead_writer import LeadWriteBuffer
+from resource_policy import apply_policy, DISCOVERY_RESOURCE_POLICY
+from maps_payload import PlaceCollector, matches_listing
+from shard_scheduler import Shard, ShardScheduler, make_shards
+from metrics import span, timed
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Discovery Wait Configuration (milliseconds for Playwright waits, seconds for the jitter floor)
+PANEL_WAIT_TIMEOUT = int(os.getenv("PANEL_WAIT_TIMEOUT", "5000"))
+FEED_WAIT_TIMEOUT = int(os.getenv("FEED_WAIT_TIMEOUT", "8000"))
+# Minimum gap between feed scrolls, drawn at random from this range; 0 disables it
+SCROLL_JITTER_MIN = float(os.getenv("SCROLL_JITTER_MIN", "0.5"))
+SCROLL_JITTER_MAX = float(os.getenv("SCROLL_JITTER_MAX", "1.5"))
+# Feed batches an article may stay without a label (still rendering) before it is skipped
+FEED_UNLABELED_MAX_POLLS = int(os.getenv("FEED_UNLABELED_MAX_POLLS", "3"))
+
+END_OF_LIST_TEXT = "You've reached the end of the list"
+
+# "click" opens every listing; "network" reads place data from the search
+# responses Maps loads anyway and only clicks listings it can't fully read there.
+# The response field offsets are only checked against the synthetic fixtures
+# in fixtures/maps, which are written with those same offsets, so "click" stays
+# the default until they are checked against live Maps traffic
+DISCOVERY_EXTRACTION = os.getenv("DISCOVERY_EXTRACTION", "click")
+
+# Sharded Discovery Configuration
+DISCOVERY_CONTEXTS = int(os.getenv("DISCOVERY_CONTEXTS", "3"))
+DISCOVERY_HEADLESS = os.getenv("DISCOVERY_HEADLESS", "").lower() in ("1", "true", "yes")
+# Page the search box is on; benchmark.py points this at its local Maps stand-in
+DISCOVERY_MAPS_URL = os.getenv("DISCOVERY_MAPS_URL", "https://www.google.com/maps")
+
 # Initialize Supabase Client
 url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
 supabase: Client = create_client(url, key)
 
+# Known website URLs, loaded once per run so dedup doesn't hit the network per listing
+lead_index = LeadIndex(supabase)
+_lead_index_lock = asyncio.Lock()
+
+async def ensure_lead_index():
+    """Loads the dedup index on first use (off the event loop)."""
+    async with _lead_index_lock:
+        if not lead_index.loaded:
+            count = await asyncio.to_thread(lead_index.load)
+            print(f" [*] Dedup index loaded: {count} known leads.")
+
 def check_lead_exists(website_url: str) -> bool:
     """Checks if a lead with the given URL already exists in Supabase."""
+    if lead_index.loaded:
+        return lead_index.contains(website_url)
     try:
         response = supabase.table("leads").select("website_url").eq("website_url", website_url).execute()
         return len(response.data) > 0
@@ -22,38 +68,126 @@ def check_lead_exists(website_url: str) -> bool:
         print(f"[!] database check error: {e}")
         return False
 
-def save_discovered_lead(lead_data: dict):
-    """Upserts a discovered lead into Supabase with status 'discovered'."""
-    try:
-        supabase.table("leads").upsert(lead_data, on_conflict="website_url").execute()
-        print(f" [+] Valid Lead Found & Saved: {lead_data['company_name']}")
-    except Exception as e:
-        print(f" [!] Database Upsert Error: {e}")
+# Place ids inside Maps listing links (".../data=!...!1s0x..:0x..!...!19sChIJ...")
+PLACE_ID_PATTERNS = [re.compile(r"!19s(ChIJ[\w-]+)"), re.compile(r"!1s(0x[0-9a-f]+:0x[0-9a-f]+)")]
 
-async def process_listing(listing, processed_urls, niche, location):
-    """Extracts data from a single listing and saves it if valid."""
-    try:
-        # Extract Name
-        aria_label = await listing.get_attribute("aria-label")
-        if not aria_label or aria_label in processed_urls:
-             return False
+# Identity of every article appended to the feed after `start`, in one round trip
+FEED_ITEMS_JS = """(articles, start) => articles.slice(start).map((article, i) => {
+    const link = article.querySelector('a[href*="/maps/place/"]');
+    return {index: start + i, label: article.getAttribute('aria-label'), href: link ? link.href : null};
+})"""
 
-        # Click to load details
-        await listing.click()
-        # Small wait for panel to load, can be improved with specific wait
-        await asyncio.sleep(1) 
+def listing_identity(index: int, label: Optional[str], href: Optional[str]) -> str:
+    """Stable key for a feed item: its place id, else its place link, else name + position."""
+    if href:
+        for pattern in PLACE_ID_PATTERNS:
+            match = pattern.search(href)
+            if match:
+                return match.group(1)
+        return href.split("?")[0]
+    return f"{label}#{index}"
 
-        # We need to find the website button in the newly opened panel or the list item
-        # Just searching the whole page for the authority link is risky but often effective if we assume the clicked item is active.
-        # A better approach for the "active" item in Google Maps is hard without specific stable classes.
-        # We will try to find the website link specifically.
-        
-        # 'a[data-item-id="authority"]' is often the website button in the detail panel.
-        website_element = listing.page.locator('a[data-item-id="authority"]')
-        
-        website = None
-        if await website_element.count() > 0:
-            website = await website_element.first.get_attribute("href")
+class FeedTracker:
+    """
+    Remembers how far into the Google Maps feed discovery has got. The feed
+    only ever appends, so each batch starts at `cursor` and every article
+    is visited once, however deep the scroll goes.
+    """
+
+    def __init__(self, max_unlabeled_polls: int = FEED_UNLABELED_MAX_POLLS):
+        self.cursor = 0
+        self.visited: Set[str] = set()
+        self.scrolls = 0
+        self.max_unlabeled_polls = max(1, max_unlabeled_polls)
+        # Index -> batches an article has been seen without a label
+        self.unlabeled: Dict[int, int] = {}
+
+    async def new_items(self, articles) -> List[Tuple[int, str, Optional[str]]]:
+        """(index, identity, name) for unvisited articles at or after the cursor."""
+        items = await articles.evaluate_all(FEED_ITEMS_JS, self.cursor)
+        fresh = []
+        for item in items:
+            if not item["label"]:
+                polls = self.unlabeled[item["index"]] = self.unlabeled.get(item["index"], 0) + 1
+                if polls < self.max_unlabeled_polls:
+                    # Probably still rendering; picked up by the next batch
+                    break
+                # Never labelled (e.g. an ad slot): step over it so the rest of the feed isn't blocked
+                continue
+            identity = listing_identity(item["index"], item["label"], item["href"])
+            if identity not in self.visited:
+                fresh.append((item["index"], identity, item["label"]))
+        return fresh
+
+    def mark(self, index: int, identity: str):
+        self.visited.add(identity)
+        self.cursor = max(self.cursor, index + 1)
+
+# True once the detail panel shows the clicked listing
+PANEL_READY_JS = """(name) => {
+    const panel = document.querySelector('div[role="main"][aria-label]');
+    if (panel && panel.getAttribute('aria-label') === name) return true;
+    const title = document.querySelector('h1');
+    return !!title && title.textContent.trim() === name;
+}"""
+
+# True once the feed has grown past `count` articles or shows its end marker
+FEED_GREW_JS = """([count, endText]) => {
+    const feed = document.querySelector('div[role="feed"]');
+    if (!feed) return true;
+    return feed.querySelectorAll('div[role="article"]').length > count || feed.textContent.includes(endText);
+}"""
+
+class WaitClock:
+    """Splits discovery time (per browser context) into waiting on Maps and everything else."""
+
+    def __init__(self, contexts: int = 1):
+        self.started = time.monotonic()
+        self.contexts = contexts
+        self.waited = 0.0
+        self.timeouts = 0
+
+    async def wait_for(self, page, expression: str, arg, timeout: int) -> bool:
+        """Waits for a JS condition; False (and counted) on timeout instead of raising."""
+        started = time.monotonic()
+        try:
+            await page.wait_for_function(expression, arg=arg, timeout=timeout, polling=100)
+            return True
+        except Exception:
+            self.timeouts += 1
+            return False
+        finally:
+            self.waited += time.monotonic() - started
+
+    async def sleep(self, seconds: float):
+        if seconds > 0:
+            self.waited += seconds
+            await asyncio.sleep(seconds)
+
+    def summary(self) -> str:
+        # With several contexts, both figures are summed across them
+        total = (time.monotonic() - self.started) * self.contexts
+        return (f"{self.waited:.1f}s waiting on Maps, {max(0.0, total - self.waited):.1f}s working "
+                f"({self.timeouts} waits timed out)")
+
+@timed("discovery.listing")
+async def process_listing(listing, name, place: Optional[dict], processed_urls, niche, location,
+                          writer: LeadWriteBuffer, clock: WaitClock):
+    """
+    Extracts data from a single listing and queues it on the write-behind buffer if valid.
+    `place` is the listing's entry from the intercepted search responses, if any.
+    """
+    try:
+        if not name:
+            return False
+
+        # A place that doesn't carry this listing's name may have been misparsed; ignore it
+        if not matches_listing(place, name):
+            place = None
+        # No website in the search responses: read it from the detail panel
+        website = place.get("website") if place else None
+        if not website:
+            website = await read_website_from_panel(listing, name, clock)
         
         if not website:
             return False
@@ -68,134 +202,269 @@ async def process_listing(listing, processed_urls, niche, location):
         if website in processed_urls:
              return False
         
-        # Extract Rating and Review Count
-        # This is tricky with obfuscated classes. We will skip for now or use generic aria-label search on the listing/panel if requested.
-        # The prompt asked for them optionally. We'll leave them as default for robustness.
-        rating = None 
-        review_count = None
+        # Rating and review count come from the search responses; the panel DOM is obfuscated
+        rating = place.get("rating") if place else None
+        review_count = place.get("review_count") if place else None
 
         processed_urls.add(website)
         
         lead_data = {
             "niche": niche,
             "location": location,
-            "company_name": aria_label,
+            "company_name": name,
             "website_url": website,
             "rating": rating,
             "review_count": review_count,
             "status": "discovered",
             "engine_used": "google_maps_playwright"
         }
-        save_discovered_lead(lead_data)
+        # The dedup index learns the URL once the write is confirmed (see discover_shards)
+        await writer.add(lead_data)
         return True
 
     except Exception:
         return False
 
-async def scroll_feed(page):
-    """Scrolls the Google Maps feed to load more results."""
+@timed("discovery.click")
+async def read_website_from_panel(listing, name, clock: WaitClock) -> Optional[str]:
+    """Click path: opens the listing's detail panel and reads its website button."""
+    # Click to load details
+    await listing.click()
+    # Wait for the detail panel to show this listing, so its website link is the one read
+    await clock.wait_for(listing.page, PANEL_READY_JS, name, PANEL_WAIT_TIMEOUT)
+
+    # We need to find the website button in the newly opened panel or the list item
+    # Just searching the whole page for the authority link is risky but often effective if we assume the clicked item is active.
+    # A better approach for the "active" item in Google Maps is hard without specific stable classes.
+    # We will try to find the website link specifically.
+    
+    # 'a[data-item-id="authority"]' is often the website button in the detail panel.
+    website_element = listing.page.locator('a[data-item-id="authority"]')
+    
+    website = None
+    if await website_element.count() > 0:
+        website = await website_element.first.get_attribute("href")
+    return website
+
+@timed("discovery.scroll")
+async def scroll_feed(page, clock: WaitClock):
+    """
+    Scrolls the Google Maps feed to the bottom and waits until more results
+    load or the end marker shows. Returns False when the feed is gone.
+    """
     feed = page.locator('div[role="feed"]')
     if await feed.count() > 0:
-        await feed.focus()
-        await page.keyboard.press("PageDown")
-        await asyncio.sleep(random.uniform(2, 5))
+        started = time.monotonic()
+        count = await page.locator('div[role="article"]').count()
+        await feed.evaluate("feed => feed.scrollTo(0, feed.scrollHeight)")
+        await clock.wait_for(page, FEED_GREW_JS, [count, END_OF_LIST_TEXT], FEED_WAIT_TIMEOUT)
+        # Politeness floor: never scroll faster than the jitter allows
+        floor = random.uniform(SCROLL_JITTER_MIN, SCROLL_JITTER_MAX)
+        await clock.sleep(floor - (time.monotonic() - started))
         return True
     else:
         print("No feed found, stopping.")
         return False
 
-async def process_batch(page, processed_urls, niche, location, limit, current_count):
-    """Processes a batch of listings from the current view."""
-    listings = await page.locator('div[role="article"]').all()
+async def process_batch(page, tracker: FeedTracker, processed_urls, niche, location, limit, writer, clock: WaitClock,
+                        places: Optional[PlaceCollector] = None):
+    """Processes the listings appended to the feed since the last batch."""
+    articles = page.locator('div[role="article"]')
     new_leads = 0
     
-    for listing in listings:
-        if current_count + new_leads >= limit:
+    for index, identity, name in await tracker.new_items(articles):
+        # Rows still in the write buffer, and listings other contexts are reading, count towards the limit
+        if writer.committed_count >= limit:
             break
         
-        if await process_listing(listing, processed_urls, niche, location):
-            new_leads += 1
+        tracker.mark(index, identity)
+        place = places.lookup(identity, name) if places is not None else None
+        # Claim the slot before the click awaits; it is given back if the listing yields no lead
+        with writer.reserve():
+            if await process_listing(articles.nth(index), name, place, processed_urls, niche, location, writer, clock):
+                new_leads += 1
             
     return new_leads
 
-async def search_leads(niche: str, location: str, limit: int):
-    """
-    Searches for leads on Google Maps using Playwright.
-    Scrolls results, extracts data, deduplicates, and saves to Supabase.
-    """
-    search_query = f"{niche} in {location}"
-    print(f"\n[*] Starting Discovery for: {search_query} (Limit: {limit} new leads)")
+async def open_discovery_context(browser):
+    """A fresh, isolated browser context with stealth and the discovery resource policy."""
+    context = await browser.new_context(
+        viewport={"width": 1280, "height": 800},
+        user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    )
+    # Apply stealth to context
+    stealth = Stealth()
+    await stealth.apply_stealth_async(context)
+    # Map tiles, photos and fonts are never read; skip downloading them
+    await apply_policy(context, DISCOVERY_RESOURCE_POLICY)
+    return context
 
-    unique_leads_count = 0
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
-        context = await browser.new_context(
-            viewport={"width": 1280, "height": 800},
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        # Apply stealth to context
-        stealth = Stealth()
-        await stealth.apply_stealth_async(context)
-        
-        page = await context.new_page()
-        
-        try:
-            await page.goto("https://www.google.com/maps", timeout=60000)
-            
-            # Consent handling (common in EU/others)
-            try:
-                # Look for "Accept all" or matches
-                consent_button = page.locator('button[aria-label="Accept all"], button:has-text("Accept all")')
-                if await consent_button.count() > 0:
-                    await consent_button.first.click()
-                    await asyncio.sleep(2)
-            except Exception:
-                pass
-
-            # Try to find search box with multiple strategies
-            search_box = page.locator('input#searchboxinput')
-            if await search_box.count() == 0:
-                 search_box = page.get_by_role("searchbox")
-            if await search_box.count() == 0:
-                 # Fallback for different locales/versions
-                 search_box = page.locator('input[name="q"]')
-            
-            # Wait for it to be ready
-            await search_box.first.wait_for(state="visible", timeout=30000)
-            
-            await search_box.first.fill(search_query)
-            await page.keyboard.press("Enter")
-            
-            # Wait for results to load
-            await page.wait_for_selector('div[role="feed"]', timeout=30000)
+async def run_shard(page, shard: Shard, processed_urls, limit, writer, clock: WaitClock,
+                    places: Optional[PlaceCollector]) -> str:
+    """Runs one Maps query on `page` until its feed ends or the run's lead limit is reached."""
+    await page.goto(DISCOVERY_MAPS_URL, timeout=60000)
+    
+    # Consent handling (common in EU/others)
+    try:
+        # Look for "Accept all" or matches
+        consent_button = page.locator('button[aria-label="Accept all"], button:has-text("Accept all")')
+        if await consent_button.count() > 0:
+            await consent_button.first.click()
+            await consent_button.first.wait_for(state="detached", timeout=PANEL_WAIT_TIMEOUT)
+    except Exception:
+        pass
+
+    # Try to find search box with multiple strategies
+    search_box = page.locator('input#searchboxinput')
+    if await search_box.count() == 0:
+         search_box = page.get_by_role("searchbox")
+    if await search_box.count() == 0:
+         # Fallback for different locales/versions
+         search_box = page.locator('input[name="q"]')
+    
+    # Wait for it to be ready
+    await search_box.first.wait_for(state="visible", timeout=30000)
+    
+    await search_box.first.fill(shard.query)
+    await page.keyboard.press("Enter")
+    
+    # Wait for results to load
+    await page.wait_for_selector('div[role="feed"]', timeout=30000)
+    
+    # The tracker remembers which listings of this query's feed were visited
+    tracker = FeedTracker()
+    try:
+        while writer.saved_count < limit:
+            shard.leads += await process_batch(page, tracker, processed_urls, shard.niche, shard.location,
+                                               limit, writer, clock, places)
             
-            processed_urls = set()
+            if writer.committed_count >= limit:
+                # Confirm the buffered rows; keep scrolling only if some failed to save
+                await writer.drain()
+                if writer.saved_count >= limit:
+                    return "limit reached"
             
-            while unique_leads_count < limit:
-                unique_leads_count += await process_batch(page, processed_urls, niche, location, limit, unique_leads_count)
-                
-                if unique_leads_count >= limit:
-                    break
+            # Scroll Logic
+            if not await scroll_feed(page, clock):
+                return "no feed"
+            tracker.scrolls += 1
                 
-                # Scroll Logic
-                if not await scroll_feed(page):
-                    break
-                    
-                if await page.get_by_text("You've reached the end of the list").is_visible():
-                     print("End of results reached.")
-                     break
+            if await page.get_by_text(END_OF_LIST_TEXT).is_visible():
+                 return "end of list"
+        return "limit reached"
+    finally:
+        shard.listings = len(tracker.visited)
+        shard.scrolls = tracker.scrolls
+
+async def discovery_worker(worker: int, browser, scheduler: ShardScheduler, processed_urls, limit, writer,
+                           clock: WaitClock, collectors: List[PlaceCollector]):
+    """One isolated context working through shards until none are left or the limit is reached."""
+    context = await open_discovery_context(browser)
+    page = await context.new_page()
+    places = PlaceCollector() if DISCOVERY_EXTRACTION == "network" else None
+    if places is not None:
+        # Must listen before the search runs so the first page of results is captured
+        places.attach(page)
+        collectors.append(places)
 
-        except Exception as e:
-            print(f"Discovery Error: {e}")
+    try:
+        while writer.saved_count < limit:
+            shard = scheduler.next(worker)
+            if shard is None:
+                break
+            shard.start(worker)
+            print(f"\n[*] [context {worker + 1}] Searching: {shard.query}")
             try:
-                await page.screenshot(path="error_screenshot.png")
-                print(" [!] Screenshot saved to error_screenshot.png")
-            except:
-                pass
+                outcome = await run_shard(page, shard, processed_urls, limit, writer, clock, places)
+            except Exception as e:
+                outcome = "error"
+                print(f"Discovery Error ({shard.query}): {e}")
+                screenshot = "error_screenshot.png" if worker == 0 else f"error_screenshot_{worker + 1}.png"
+                try:
+                    await page.screenshot(path=screenshot)
+                    print(f" [!] Screenshot saved to {screenshot}")
+                except:
+                    pass
+            shard.finish(outcome)
+            print(f" [*] [context {worker + 1}] Done: {shard.summary()}")
+    finally:
+        await context.close()
+
+async def discover_shards(pairs: List[Tuple[str, str]], limit: int, lead_queue: Optional[asyncio.Queue] = None,
+                          contexts: int = DISCOVERY_CONTEXTS, headless: bool = DISCOVERY_HEADLESS) -> int:
+    """
+    Runs many (niche, location) queries across `contexts` isolated browser
+    contexts of one browser. All of them share the dedup index, the write
+    buffer and the global `limit`; shards are handed out with work-stealing.
+    If `lead_queue` is given, every newly saved lead is also streamed onto it.
+    Returns the number of leads saved.
+    """
+    shards = make_shards(pairs)
+    contexts = max(1, min(contexts, len(shards)))
+    scheduler = ShardScheduler(shards, contexts)
+
+    await ensure_lead_index()
+
+    # Website URLs seen this run, across every shard
+    processed_urls = set()
+
+    async def on_saved(row):
+        print(f" [+] Valid Lead Found & Saved: {row.get('company_name')}")
+        lead_index.add(row["website_url"])
+        if lead_queue is not None and row.get("id") is not None:
+            # Blocks while the workers are saturated (backpressure on the scroll loop)
+            await lead_queue.put(row)
+
+    async def on_failed(lead):
+        # Never saved: let a later listing with the same website try again
+        processed_urls.discard(lead["website_url"])
+
+    # Writes go through the awaitable client so they never stall the scroll loop
+    db = create_async_client(url, key)
+    # Streaming workers need each saved lead's id; otherwise nothing has to come back
+    writer = LeadWriteBuffer(db, returning="id" if lead_queue is not None else "minimal",
+                             on_saved=on_saved, on_failed=on_failed)
+    await writer.start()
+    clock = WaitClock(contexts)
+    collectors: List[PlaceCollector] = []
+    async with async_playwright() as p:
+        with span("browser.launch"):
+            browser = await p.chromium.launch(headless=headless)
+        try:
+            await asyncio.gather(*(
+                discovery_worker(worker, browser, scheduler, processed_urls, limit, writer, clock, collectors)
+                for worker in range(contexts)
+            ))
         finally:
+            scheduler.skip_remaining()
+            await writer.close()
+            await db.aclose()
             await browser.close()
     
-    print(f"\n[*] Discovery Complete. Found {unique_leads_count} new leads.")
+    print(f"\n[*] Discovery Complete. Found {writer.saved_count} new leads.")
+    if len(shards) > 1:
+        print(f" [*] Shards ({contexts} contexts, {scheduler.steals} stolen):")
+        for shard in shards:
+            print(f"     - {shard.summary()}")
+    else:
+        print(f" [*] Feed: {shards[0].listings} listings visited over {shards[0].scrolls} scrolls.")
+    print(f" [*] Discovery time: {clock.summary()}")
+    if collectors:
+        print(f" [*] Search responses: {sum(c.place_count for c in collectors)} places from "
+              f"{sum(c.responses for c in collectors)} responses, {sum(c.hits for c in collectors)} listings matched, "
+              f"{sum(c.misses for c in collectors)} not found")
+    return writer.saved_count
+
+async def search_leads(niche: str, location: str, limit: int, lead_queue: Optional[asyncio.Queue] = None,
+                       headless: bool = DISCOVERY_HEADLESS):
+    """
+    Searches for leads on Google Maps using Playwright.
+    Scrolls results, extracts data, deduplicates, and saves to Supabase.
+    If `lead_queue` is given, every newly saved lead is also streamed onto it.
+    """
+    search_query = f"{niche} in {location}"
+    print(f"\n[*] Starting Discovery for: {search_query} (Limit: {limit} new leads)")
+    return await discover_shards([(niche, location)], limit, lead_queue=lead_queue, contexts=1, headless=headless)
 
 if __name__ == "__main__":
     # Test run
@@ -0,0 +1,176 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+# Parser Configuration
+# "html.parser" matches the historical output exactly; "lxml" is faster when installed
+HTML_PARSER = os.getenv("HTML_PARSER", "html.parser")
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+# Pages smaller than this are parsed inline; shipping them to a worker costs more than parsing
+INLINE_PARSE_MAX_BYTES = int(os.getenv("INLINE_PARSE_MAX_BYTES", "20000"))
+
+
+# Third-party widgets worth telling the model about (they only show up in scripts/iframes)
+CHAT_WIDGETS = {
+    "intercom": "Intercom", "drift.com": "Drift", "tawk.to": "Tawk.to", "livechatinc": "LiveChat",
+    "zopim": "Zendesk Chat", "zdassets": "Zendesk Chat", "crisp.chat": "Crisp", "tidio": "Tidio",
+    "olark": "Olark", "freshchat": "Freshchat", "hs-scripts": "HubSpot", "manychat": "ManyChat",
+    "wati.io": "WATI", "elfsight": "Elfsight",
+}
+BOOKING_WIDGETS = {
+    "calendly": "Calendly", "acuityscheduling": "Acuity", "setmore": "Setmore", "booksy": "Booksy",
+    "fresha": "Fresha", "mindbody": "Mindbody", "zocdoc": "Zocdoc", "opentable": "OpenTable",
+    "resy.com": "Resy", "simplybook": "SimplyBook.me", "vagaro": "Vagaro", "squareup.com/appointments": "Square",
+}
+CTA_KEYWORDS = ("book", "schedule", "appointment", "reserve", "quote", "contact", "call", "get started",
+                "order", "buy", "sign up", "register", "enquire", "inquire", "consult", "whatsapp", "free")
+MAX_HEADINGS = 15
+MAX_CTAS = 12
+MAX_FORMS = 4
+MAX_LINKS = 300
+
+
+def _text(tag) -> str:
+    return " ".join(tag.get_text(" ").split())
+
+
+def page_outline(soup: BeautifulSoup) -> Dict[str, object]:
+    """
+    Collects the structural signals the analysis prompt cares about: title,
+    meta description, headings, calls to action, form fields, chat/booking
+    widgets and tel:/mailto: contacts, plus the page's links for the crawler.
+    Must run before scripts are stripped.
+    """
+    title = _text(soup.title) if soup.title else ""
+    description = ""
+    for attrs in ({"name": "description"}, {"property": "og:description"}):
+        meta = soup.find("meta", attrs=attrs)
+        if meta and meta.get("content"):
+            description = " ".join(meta["content"].split())
+            break
+
+    headings: List[str] = []
+    for tag in soup.find_all(["h1", "h2", "h3"]):
+        heading = _text(tag)
+        if heading and heading not in headings:
+            headings.append(heading)
+        if len(headings) >= MAX_HEADINGS:
+            break
+
+    ctas: List[str] = []
+    contacts: List[str] = []
+    links: List[Tuple[str, str]] = []
+    for tag in soup.find_all(["a", "button"]):
+        label = _text(tag)
+        href = (tag.get("href") or "").strip() if tag.name == "a" else ""
+        if href.startswith(("tel:", "mailto:")):
+            contact = href.split(":", 1)[1].split("?")[0]
+            if contact and contact not in contacts:
+                contacts.append(contact)
+            continue
+        if href and not href.startswith(("#", "javascript:")) and len(links) < MAX_LINKS:
+            links.append((href, label[:80]))
+        classes = " ".join(tag.get("class") or []).lower()
+        is_cta = tag.name == "button" or "btn" in classes or "button" in classes
+        if not label or len(label) > 60:
+            continue
+        if is_cta or any(keyword in label.lower() for keyword in CTA_KEYWORDS):
+            if label not in ctas and len(ctas) < MAX_CTAS:
+                ctas.append(label)
+
+    forms: List[str] = []
+    for form in soup.find_all("form")[:MAX_FORMS]:
+        fields = []
+        for field in form.find_all(["input", "select", "textarea"]):
+            if field.get("type") in ("hidden", "submit", "button"):
+                continue
+            name = field.get("placeholder") or field.get("name") or field.get("type") or field.name
+            if name and name not in fields:
+                fields.append(name.strip())
+        if fields:
+            forms.append(", ".join(fields))
+
+    sources = " ".join(
+        (tag.get("src") or "") + " " + (tag.string or "")[:2000]
+        for tag in soup.find_all(["script", "iframe"])
+    ).lower()
+    sources += " " + " ".join((a.get("href") or "") for a in soup.find_all("a")).lower()
+    chat = sorted({name for marker, name in CHAT_WIDGETS.items() if marker in sources})
+    booking = sorted({name for marker, name in BOOKING_WIDGETS.items() if marker in sources})
+
+    return {
+        "title": title,
+        "description": description,
+        "headings": headings,
+        "ctas": ctas,
+        "forms": forms,
+        "chat": chat,
+        "booking": booking,
+        "contacts": contacts,
+        "links": links,
+    }
+
+
+def _visible_text(soup: BeautifulSoup) -> str:
+    # Remove scripts and styles
+    for script in soup(["script", "style"]):
+        script.decompose()
+
+    text = soup.get_text()
+
+    # Clean chunks
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+
+def parse_page(content: str, parser: str = HTML_PARSER) -> Tuple[str, Dict[str, object]]:
+    """
+    One parse for both the page's visible text (scripts and styles stripped,
+    one phrase per line) and its outline.
+    """
+    soup = BeautifulSoup(content, parser)
+    outline = page_outline(soup)
+    return _visible_text(soup), outline
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """Returns the shared parsing process pool, sized to the core count."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=max(1, PARSE_WORKERS))
+    return _pool
+
+
+def shutdown_parse_pool():
+    """Stops the parsing workers if they were started."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def _parse(func, content: str):
+    if len(content) <= INLINE_PARSE_MAX_BYTES:
+        return func(content)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_parse_pool(), func, content)
+    except Exception:
+        # A broken pool (e.g. a worker was killed) shouldn't lose the page
+        shutdown_parse_pool()
+        return func(content)
+
+
+async def extract_page(content: str) -> Tuple[str, Dict[str, object]]:
+    """
+    Runs parse_page in the process pool so large pages never block the event
+    loop; returns (visible text, outline).
+    """
+    return await _parse(parse_page, content)
@@ -0,0 +1,359 @@
+"""
+Stand-ins shared by the tests. Nothing here talks to a real browser,
+database or model; each fake implements just the calls the code under
+test makes and records what it was asked to do.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import condense
+import llm_cache
+from supabase_client import Response
+
+# Local HTTP
+
+class QuietHandler(BaseHTTPRequestHandler):
+    """Base handler for local test servers: no request logging, and `reply()` sends a whole response."""
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body="", headers=None):
+        data = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def reply_json(self, data, status=200):
+        self.reply(status, json.dumps(data), {"Content-Type": "application/json"})
+
+@contextmanager
+def serve(handler):
+    """Serves `handler` on a free 127.0.0.1 port for the duration of the block; yields the base URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+# Call tracking
+
+class InFlight:
+    """Thread- and task-safe gauge: `with gauge:` around a call records the most calls running at once."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.most = 0
+        self.calls = 0
+
+    def __enter__(self):
+        with self.lock:
+            self.running += 1
+            self.calls += 1
+            self.most = max(self.most, self.running)
+        return self
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.running -= 1
+
+@contextmanager
+def patched(module, **attributes):
+    """Swaps module attributes for the duration of the block, e.g. `patched(lead_engine, analyze_content=fake)`."""
+    previous = {name: getattr(module, name) for name in attributes}
+    for name, value in attributes.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(module, name, value)
+
+# LLM
+
+class StandIn:
+    """
+    A local LLM provider request function: answers, raises or sleeps as told
+    and counts its calls. `answer` is the text, an exception to raise, or a
+    function of the prompt returning either.
+    """
+
+    def __init__(self, name, answer=None, delay=0.0):
+        self.name = name
+        self.answer = f"ok from {name}" if answer is None else answer
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self, prompt):
+        self.calls += 1
+        time.sleep(self.delay)
+        answer = self.answer(prompt) if callable(self.answer) else self.answer
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+@contextmanager
+def scratch_llm_cache(**options):
+    """Installs a throwaway LLMCache as the process-wide cache for the block; the real cache file is never opened."""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = llm_cache.LLMCache(os.path.join(tmp, "cache.sqlite3"), **options)
+        try:
+            with patched(llm_cache, _shared_cache=cache):
+                yield cache
+        finally:
+            cache.close()
+
+# Condensing
+
+@contextmanager
+def scratch_boilerplate_stats():
+    """
+    Gives the process-wide condenser boilerplate stats in a temporary file for
+    the block, so close_intelligence() never writes .boilerplate_stats.json
+    into the working directory.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        with patched(condense, BOILERPLATE_STATS_PATH=os.path.join(tmp, "boilerplate_stats.json"), _condenser=None):
+            yield
+
+# Playwright
+
+class FakePage:
+    def __init__(self):
+        self.closed = False
+        self.routes = []
+
+    async def route(self, pattern, handler):
+        self.routes.append((pattern, handler))
+
+    async def close(self):
+        self.closed = True
+
+class FakeFeed:
+    """The Maps results feed as FEED_ITEMS_JS reports it: one (label, href) per article, in feed order."""
+
+    def __init__(self, *articles):
+        self.articles = list(articles)
+
+    async def evaluate_all(self, script, start):
+        return [{"index": start + i, "label": label, "href": href}
+                for i, (label, href) in enumerate(self.articles[start:])]
+
+    def nth(self, index):
+        return self.articles[index]
+
+class FakeRequest:
+    def __init__(self, resource_type, url):
+        self.resource_type = resource_type
+        self.url = url
+
+class FakeRoute:
+    """A route handed to a `page.route()` handler; records whether it was aborted or let through."""
+
+    def __init__(self, resource_type, url):
+        self.request = FakeRequest(resource_type, url)
+        self.outcome = None
+
+    async def abort(self):
+        self.outcome = "aborted"
+
+    async def continue_(self):
+        self.outcome = "continued"
+
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+
+    async def new_page(self):
+        return FakePage()
+
+    async def clear_cookies(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+class FakeBrowser:
+    """Stands in for a Chromium browser: `crash()` drops the connection like a dead renderer would."""
+
+    def __init__(self, number):
+        self.number = number
+        self.connected = True
+        self.handlers = []
+        self.contexts_opened = 0
+
+    def on(self, event, handler):
+        assert event == "disconnected"
+        self.handlers.append(handler)
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self):
+        self.contexts_opened += 1
+        return FakeContext()
+
+    def crash(self):
+        self.connected = False
+        for handler in self.handlers:
+            handler(self)
+
+    async def close(self):
+        if self.connected:
+            self.crash()
+
+class FakeChromium:
+    """Launches numbered FakeBrowsers, each after `delay` seconds, and tracks how many launch at once."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.browsers = []
+        self.launching = 0
+        self.most_at_once = 0
+
+    async def launch(self, headless=True):
+        self.launching += 1
+        self.most_at_once = max(self.most_at_once, self.launching)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.launching -= 1
+        self.browsers.append(FakeBrowser(len(self.browsers) + 1))
+        return self.browsers[-1]
+
+class FakePlaywright:
+    def __init__(self, delay=0.0):
+        self.chromium = FakeChromium(delay)
+
+# Supabase
+
+class FakeSupabase:
+    """
+    In-memory stand-in for SupabaseClient. Rows are plain dicts given ids in
+    insert order; `columns`, if set, makes writes naming any other column
+    fail the way PostgREST rejects them. Status codes pushed onto `failures`
+    answer the next writes instead, one each; None stands for a dropped
+    connection.
+    """
+
+    def __init__(self, rows=(), columns=None):
+        self.rows = []
+        self.columns = set(columns) if columns else None
+        self.requests = Counter()
+        self.failures = []
+        self.lock = threading.Lock()
+        for row in rows:
+            self.insert(row)
+
+    def table(self, table_name):
+        return FakeQuery(self)
+
+    def insert(self, row, on_conflict=None):
+        existing = next((r for r in self.rows if on_conflict and r.get(on_conflict) == row.get(on_conflict)), None)
+        if existing is not None:
+            existing.update(row)
+            return dict(existing)
+        self.rows.append({**row, "id": len(self.rows) + 1})
+        return dict(self.rows[-1])
+
+class FakeQuery:
+    """The fluent query builder: filters, ordering, paging, keyset pagination and upserts."""
+
+    def __init__(self, db):
+        self.db = db
+        self.method = "GET"
+        self.filters = []
+        self.order_by = None
+        self.count = None
+        self.skip = 0
+        self.data = None
+        self.on_conflict = None
+        self.returning = "minimal"
+
+    def select(self, columns="*"):
+        self.method = "GET"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: str(row.get(column)) == str(value))
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    def offset(self, count):
+        self.skip = count
+        return self
+
+    def paginate(self, page_size=1000, key="id"):
+        """Keyset pages like SupabaseQueryBuilder.paginate, one GET per page."""
+        after = None
+        while True:
+            page = FakeQuery(self.db)
+            page.filters = self.filters + ([lambda row, after=after: row[key] > after] if after is not None else [])
+            page.order_by, page.count = (key, False), page_size
+            rows = page.execute().data
+            yield from rows
+            if len(rows) < page_size:
+                return
+            after = rows[-1][key]
+
+    def upsert(self, data, on_conflict=None, returning="minimal"):
+        self.method = "POST"
+        self.data = data if isinstance(data, list) else [data]
+        self.on_conflict = on_conflict
+        self.returning = returning
+        return self
+
+    def execute(self):
+        db = self.db
+        with db.lock:
+            db.requests[self.method] += 1
+            if self.method == "POST":
+                if db.failures:
+                    status = db.failures.pop(0)
+                    if status is None:
+                        return Response([], "Connection reset by peer")
+                    return Response([], f"{status} {'Client' if status < 500 else 'Server'} Error", status)
+                unknown = {column for row in self.data for column in row} - db.columns if db.columns else set()
+                if unknown:
+                    return Response([], f"400 Client Error: Bad Request (no column {sorted(unknown)[0]})", 400)
+                written = [db.insert(row, self.on_conflict) for row in self.data]
+                if self.returning == "minimal":
+                    return Response([])
+                if self.returning != "representation":
+                    columns = self.returning.split(",")
+                    written = [{column: row.get(column) for column in columns} for row in written]
+                return Response(written)
+            rows = [row for row in db.rows if all(match(row) for match in self.filters)]
+            if self.order_by:
+                column, desc = self.order_by
+                rows.sort(key=lambda row: row.get(column), reverse=desc)
+            rows = rows[self.skip:]
+            if self.count is not None:
+                rows = rows[:self.count]
+            return Response([dict(row) for row in rows])
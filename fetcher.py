@@ -0,0 +1,123 @@
+import os
+import re
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+# HTTP Tier Configuration
+HTTP_FETCH_TIMEOUT = float(os.getenv("HTTP_FETCH_TIMEOUT", "10"))
+HTTP_FETCH_MAX_BYTES = int(os.getenv("HTTP_FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "50"))
+MIN_VISIBLE_TEXT = int(os.getenv("MIN_VISIBLE_TEXT", "400"))
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# Markup that means the real content is rendered client-side
+JS_SHELL_MARKERS = [
+    re.compile(r'<div[^>]+id=["\'](root|app|__next|__nuxt)["\'][^>]*>\s*</div>', re.I),
+    re.compile(r'<noscript>[^<]*(enable|requires?) javascript', re.I),
+    re.compile(r'window\.__INITIAL_STATE__|ng-version=|data-reactroot=""', re.I),
+]
+
+# Response headers that let the next visit ask "has this changed?"
+VALIDATOR_HEADERS = [("etag", "etag"), ("last_modified", "last-modified")]
+
+TIER_HTTP = "http"
+TIER_BROWSER = "browser"
+
+# Sites handled by each tier this run
+tier_counts: Counter = Counter()
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the shared keep-alive HTTP client used for the fast tier."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=HTTP_FETCH_TIMEOUT,
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+            headers={
+                "User-Agent": USER_AGENT,
+                "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+                "Accept-Encoding": "gzip, deflate",
+            },
+        )
+    return _client
+
+
+async def close_fetcher():
+    """Closes the shared HTTP client if one was opened."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch_html(url: str, max_bytes: int = HTTP_FETCH_MAX_BYTES) -> Optional[str]:
+    """
+    Plain HTTP GET of a page's HTML, capped at `max_bytes` (decompressed).
+    Returns None for errors and non-HTML responses so the caller can escalate.
+    """
+    _, html, _ = await _get(url, max_bytes)
+    return html
+
+
+async def fetch_html_conditional(url: str, etag: Optional[str] = None, last_modified: Optional[str] = None,
+                                 max_bytes: int = HTTP_FETCH_MAX_BYTES) -> Tuple[bool, Optional[str], Dict[str, str]]:
+    """
+    GET with If-None-Match / If-Modified-Since from a previous visit.
+    Returns (not_modified, html, validators): a 304 means the server vouches
+    the page is unchanged and no body was sent; `validators` holds the
+    response's "etag" and "last_modified" to store for next time.
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    status, html, validators = await _get(url, max_bytes, headers)
+    return status == 304, html, validators
+
+
+async def _get(url: str, max_bytes: int, headers: Optional[Dict[str, str]] = None) -> Tuple[int, Optional[str], Dict[str, str]]:
+    """(status, html or None, validators) for one GET; status 0 on network errors."""
+    try:
+        async with get_http_client().stream("GET", url, headers=headers) as response:
+            validators = {key: response.headers[header] for key, header in VALIDATOR_HEADERS
+                          if response.headers.get(header)}
+            if response.status_code >= 400 or response.status_code == 304:
+                return response.status_code, None, validators
+            content_type = response.headers.get("content-type", "")
+            if content_type and "html" not in content_type:
+                return response.status_code, None, validators
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+                if len(body) >= max_bytes:
+                    break
+            html = bytes(body[:max_bytes]).decode(response.encoding or "utf-8", errors="replace")
+            return response.status_code, html, validators
+    except Exception:
+        return 0, None, {}
+
+
+def looks_complete(html: str, text: str, min_text: int = MIN_VISIBLE_TEXT) -> bool:
+    """Heuristic: is the server-rendered page good enough, or does it need a real browser?"""
+    if not text or len(text) < min_text:
+        return False
+    if any(marker.search(html) for marker in JS_SHELL_MARKERS):
+        # Shells sometimes ship a little SSR text; only trust them when there is plenty
+        return len(text) >= min_text * 3
+    return True
+
+
+def record_tier(tier: str):
+    tier_counts[tier] += 1
+
+
+def tier_stats() -> str:
+    return ", ".join(f"{tier}: {count}" for tier, count in sorted(tier_counts.items())) or "none"
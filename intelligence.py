@@ -1,107 +1,153 @@
+import asyncio
+import json
 import os
 import requests
-import google.generativeai as genai
-from groq import Groq
-from bs4 import BeautifulSoup
+from pydantic import BaseModel, ValidationError
 from dotenv import load_dotenv
 import time
 
 load_dotenv()
 
-# API Configuration
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Milliseconds to wait for DOMContentLoaded before reading whatever has arrived
+DOM_READY_TIMEOUT = int(os.getenv("DOM_READY_TIMEOUT", "8000"))
 
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+# Bump when the analysis prompt changes so cached answers to the old one are not reused
+ANALYSIS_PROMPT_VERSION = "analysis-v1"
+FUSED_PROMPT_VERSION = "fused-v1"
+BATCH_PROMPT_VERSION = "analysis-batch-v1"
 
-# Initialize Groq client
-groq_client = Groq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
+# Fused mode (analysis + email draft in one LLM call) is opt-in
+LLM_FUSED_MODE = os.getenv("LLM_FUSED_MODE", "").lower() in ("1", "true", "yes")
 
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
-from playwright.async_api import async_playwright
+from browser_pool import get_browser_pool, close_browser_pool
+from resource_policy import apply_policy, SITE_RESOURCE_POLICY
+from fetcher import close_fetcher, fetch_html, looks_complete, record_tier, TIER_HTTP, TIER_BROWSER, HTTP_FETCH_MAX_BYTES
+from crawler import crawl_pages, merge_pages, pick_links, PageRead, CRAWL_MAX_BYTES, CRAWL_MAX_PAGES
+from llm_router import get_router
+from extraction import extract_page, shutdown_parse_pool
+from condense import condense_page, save_boilerplate_stats
+from metrics import span, timed
+
+async def close_intelligence():
+    """Releases the shared browser pool, HTTP client and parsing workers at the end of a run."""
+    await close_browser_pool()
+    await close_fetcher()
+    shutdown_parse_pool()
+    save_boilerplate_stats()
 
 async def extract_text_from_url(url: str) -> Optional[str]:
-    """Fetches and extracts text content from a URL using Playwright."""
-    try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            try:
-                # context = await browser.new_context(user_agent="Mozilla/5.0 ...")
-                page = await browser.new_page()
-                try:
-                    await page.goto(url, timeout=30000, wait_until="domcontentloaded")
-                except Exception:
-                    # Retry or ignore timeout if some content loaded
-                    pass
-                
-                content = await page.content()
-                soup = BeautifulSoup(content, 'html.parser')
-                
-                # Remove scripts and styles
-                for script in soup(["script", "style"]):
-                    script.decompose()
-                    
-                text = soup.get_text()
-                
-                # Clean chunks
-                lines = (line.strip() for line in text.splitlines())
-                chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                text = '\n'.join(chunk for chunk in chunks if chunk)
-                
-                return text[:10000]
-            finally:
-                await browser.close()
-    except Exception as e:
-        print(f" [!] Error fetching {url}: {e}")
+    """
+    Fetches and extracts text content from a URL.
+    Tries a plain HTTP GET first and only renders the page in a pooled
+    Playwright browser when the static HTML looks empty or JS-only.
+    Up to CRAWL_MAX_PAGES - 1 booking/contact/services pages linked from
+    it are read in parallel (see crawler.py), and the merged text is
+    condensed to the signals the prompts ask about (see condense.py).
+    """
+    site = await read_site(url)
+    if site is None:
         return None
+    text, outline = site
+    return condense_page(url, text, outline)
 
-def call_gemini(prompt: str) -> Optional[str]:
-    """Calls Gemini 1.5 Pro with fallback logic handled by caller."""
-    try:
-        model = genai.GenerativeModel('gemini-1.5-pro')
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        print(f" [!] Gemini Error: {e}")
+@timed("site.read")
+async def read_site(url: str, home: Optional[PageRead] = None) -> Optional[Tuple[str, dict]]:
+    """
+    Merged (text, outline) of a site's homepage and its best subpages, before
+    condensation. `home` is a homepage read the caller already has.
+    """
+    if home is None:
+        home = await read_page(url)
+    if home is None:
         return None
+    tier, html, text, outline = home
+    record_tier(tier)
 
-def call_groq(prompt: str) -> Optional[str]:
-    """Calls Groq (Llama-3.3-70b) as fallback."""
-    try:
-        if not groq_client:
-            print(" [!] Groq Client not initialized.")
+    pages = [(url, text, outline)]
+    links = pick_links(url, outline.get("links") or [], CRAWL_MAX_PAGES - 1)
+    if links:
+        # The homepage's tier is reused: no HTTP attempt for JS-only sites, no browser for static ones
+        pages += await crawl_pages(
+            links,
+            lambda link, max_bytes: read_page(link, tier, max_bytes),
+            CRAWL_MAX_BYTES - len(html),
+        )
+    return merge_pages(pages)
+
+async def read_page(url: str, tier: Optional[str] = None,
+                    max_bytes: int = HTTP_FETCH_MAX_BYTES) -> Optional[PageRead]:
+    """
+    Reads one page and returns (tier, html, text, outline), or None.
+    Without `tier`, plain HTTP is tried first and the browser only when the
+    static HTML looks incomplete; with `tier`, only that one is used.
+    """
+    if tier != TIER_BROWSER:
+        with span("page.http"):
+            html = await fetch_html(url, max_bytes)
+        if html:
+            with span("page.parse"):
+                text, outline = await extract_page(html)
+            if tier == TIER_HTTP or looks_complete(html, text):
+                return TIER_HTTP, html, text, outline
+        if tier == TIER_HTTP:
             return None
+
+    with span("page.browser"):
+        html = await fetch_html_with_browser(url)
+    if html is None:
+        return None
+    html = html[:max_bytes]
+    with span("page.parse"):
+        text, outline = await extract_page(html)
+    return TIER_BROWSER, html, text, outline
+
+async def fetch_html_with_browser(url: str) -> Optional[str]:
+    """Renders a URL in a pooled Playwright browser and returns its HTML."""
+    try:
+        async with get_browser_pool().page() as page:
+            # Skip images/fonts/media/trackers; only the DOM text matters here
+            await apply_policy(page, SITE_RESOURCE_POLICY)
+            try:
+                await page.goto(url, timeout=30000, wait_until="commit")
+                # Read as soon as the DOM is ready rather than waiting out slow subresources
+                await page.wait_for_load_state("domcontentloaded", timeout=DOM_READY_TIMEOUT)
+            except Exception:
+                # Retry or ignore timeout if some content loaded
+                pass
             
-        chat_completion = groq_client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt,
-                }
-            ],
-            model="llama-3.3-70b-versatile",
-        )
-        return chat_completion.choices[0].message.content
+            return await page.content()
     except Exception as e:
-        print(f" [!] Groq Error: {e}")
+        print(f" [!] Error fetching {url}: {e}")
         return None
 
+def call_gemini(prompt: str, prompt_version: str = ANALYSIS_PROMPT_VERSION) -> Optional[str]:
+    """Calls Gemini 1.5 Pro only, through the router's rate limits and LLM cache."""
+    return get_router().complete(prompt, prompt_version, only="gemini")[0]
+
+def call_groq(prompt: str, prompt_version: str = ANALYSIS_PROMPT_VERSION) -> Optional[str]:
+    """Calls Groq (Llama-3.3-70b) only, through the router's rate limits and LLM cache."""
+    return get_router().complete(prompt, prompt_version, only="groq")[0]
+
 async def analyze_site(url: str, niche: str) -> Optional[dict]:
     """
     Analyzes a website to identify core service, problems, and AI solutions.
-    Uses Gemini first, falls back to Groq.
+    Uses Gemini first, falls back to Groq (see llm_router).
     """
     print(f" [*] Analyzing {url}...")
     
-    # Removed unused start_time
     website_content = await extract_text_from_url(url)
     
     if not website_content:
         return None
 
-    prompt = f"""
+    # LLM clients are blocking; keep them off the event loop
+    return await asyncio.to_thread(analyze_content, url, niche, website_content)
+
+def analysis_prompt(url: str, niche: str, website_content: str) -> str:
+    """The single-site analysis prompt; batched analyses are cached under it too, one site at a time."""
+    return f"""
     Analyze the following website content for a {niche} business.
     Website URL: {url}
     Content:
@@ -119,35 +165,203 @@ async def analyze_site(url: str, niche: str) -> Optional[dict]:
         "ai_solution": "..."
     }}
     """
+
+@timed("llm.analysis")
+def analyze_content(url: str, niche: str, website_content: str) -> Optional[dict]:
+    """
+    Runs the LLM analysis on already-extracted website content.
+    Blocking; async callers should run it in a worker thread.
+    """
+    prompt = analysis_prompt(url, niche, website_content)
     
-    result_text = None
-    engine_used = "Gemini 1.5 Pro"
-    
-    # Try Gemini
-    result_text = call_gemini(prompt)
-    
-    # Fallback to Groq
-    if not result_text:
-        print(" [!] Gemini failed. Switching to Groq...")
-        engine_used = "Groq Llama-3.3-70b"
-        result_text = call_groq(prompt)
+    # Gemini first, Groq as fallback, with rate limits and circuit breakers
+    result_text, engine_used = get_router().complete(prompt, ANALYSIS_PROMPT_VERSION, accept=_analysis_ok)
         
     if not result_text:
         print(" [!] intelligence analysis failed on both engines.")
         return None
 
-    # Parse JSON
+    data = parse_llm_json(result_text)
+    if data is None:
+        return None
+    data['engine_used'] = engine_used
+    return data
+
+def load_llm_json(result_text: str):
+    """The JSON in an LLM answer, or None when it isn't valid JSON."""
     # LLMs might add markdown backticks
     try:
-        import json
         clean_text = result_text.replace("```json", "").replace("```", "").strip()
-        data = json.loads(clean_text)
-        data['engine_used'] = engine_used
-        return data
+        return json.loads(clean_text)
     except json.JSONDecodeError:
+        return None
+
+def parse_llm_json(result_text: str):
+    """Parses a JSON answer from an LLM. Returns None (and logs) when it isn't valid JSON."""
+    data = load_llm_json(result_text)
+    if data is None:
         print(f" [!] Error parsing JSON from LLM: {result_text}")
+    return data
+
+class SiteAnalysis(BaseModel):
+    core_service: str
+    problem: str
+    ai_solution: str
+
+class FusedLeadResult(SiteAnalysis):
+    email_draft: str
+
+class BatchedSiteAnalysis(SiteAnalysis):
+    lead_id: str
+
+# Router `accept` checks: only answers that parse and validate are cached
+def _is_valid(model, data) -> bool:
+    try:
+        model.model_validate(data)
+        return True
+    except ValidationError:
+        return False
+
+def _analysis_ok(result_text: str) -> bool:
+    return _is_valid(SiteAnalysis, load_llm_json(result_text))
+
+def _fused_ok(result_text: str) -> bool:
+    return _is_valid(FusedLeadResult, load_llm_json(result_text))
+
+
+@timed("llm.analysis_batch")
+def analyze_batch(items: List[dict]) -> Dict[str, dict]:
+    """
+    Analyzes several sites in one LLM request. Each item needs `lead_id`,
+    `url`, `niche` and `content`. Returns analyses keyed by str(lead_id);
+    sites missing from the answer or failing validation are simply absent,
+    so callers can re-run them individually with analyze_content.
+    The cache works per site, under the single-site prompt: a batch almost
+    never recurs with the same sites in the same order, but its sites do.
+    Blocking; async callers should run it in a worker thread.
+    """
+    router = get_router()
+    results = {}
+    pending = {}
+    for item in items:
+        prompt = analysis_prompt(item['url'], item['niche'], item['content'])
+        hit = router.cached(prompt, ANALYSIS_PROMPT_VERSION, accept=_analysis_ok)
+        if hit is not None:
+            results[str(item['lead_id'])] = {**load_llm_json(hit[0]), 'engine_used': hit[1]}
+        else:
+            pending[str(item['lead_id'])] = (item, prompt)
+    if not pending:
+        return results
+    items = [item for item, _ in pending.values()]
+
+    sites = "\n".join(
+        f"""
+    === SITE lead_id={item['lead_id']} (niche: {item['niche']}) ===
+    Website URL: {item['url']}
+    Content:
+    {item['content']}
+    """
+        for item in items
+    )
+    prompt = f"""
+    Analyze each of the following {len(items)} business websites independently.
+    {sites}
+    
+    For every site, identify the following:
+    1. Core Service: What is their main offering?
+    2. Problem: Identify one major operational hole, missing feature, or inefficiency visible on the site (e.g., no online booking, generic text, slow load, no chatbot, outdated design).
+    3. AI Improvement Idea: Propose a specific AI automation or tool to fix this problem.
+    
+    Output strictly a JSON array with one object per site, copying its lead_id:
+    [
+        {{
+            "lead_id": "...",
+            "core_service": "...",
+            "problem": "...",
+            "ai_solution": "..."
+        }}
+    ]
+    """
+
+    result_text, engine_used = router.complete(prompt, BATCH_PROMPT_VERSION, cache=False)
+
+    if not result_text:
+        return results
+
+    data = parse_llm_json(result_text)
+    if not isinstance(data, list):
+        return results
+
+    for entry in data:
+        if isinstance(entry, dict) and "lead_id" in entry:
+            entry = {**entry, "lead_id": str(entry["lead_id"])}
+        try:
+            analysis = BatchedSiteAnalysis.model_validate(entry)
+        except ValidationError:
+            continue
+        if analysis.lead_id not in pending:
+            continue
+        result = analysis.model_dump(exclude={"lead_id"})
+        router.remember(engine_used, pending[analysis.lead_id][1], ANALYSIS_PROMPT_VERSION, json.dumps(result))
+        result['engine_used'] = engine_used
+        results[analysis.lead_id] = result
+    return results
+
+@timed("llm.fused")
+def analyze_and_draft(lead: dict, niche: str, website_content: str) -> Optional[dict]:
+    """
+    Fused mode: one prompt and one LLM call return the analysis fields plus
+    `email_draft`. Returns None when the answer is missing or fails
+    validation, so callers can fall back to analyze_content + generate_email.
+    Blocking; async callers should run it in a worker thread.
+    """
+    prompt = f"""
+    You are preparing outreach to {lead.get('company_name')}, a {niche} business.
+    Website URL: {lead.get('website_url')}
+    Content:
+    {website_content}
+    
+    Step 1 - Analyze the website:
+    1. Core Service: What is their main offering?
+    2. Problem: Identify one major operational hole, missing feature, or inefficiency visible on the site (e.g., no online booking, generic text, slow load, no chatbot, outdated design).
+    3. AI Improvement Idea: Propose a specific AI automation or tool to fix this problem.
+    
+    Step 2 - Write a cold email to them based on that analysis:
+    1. Access the recipient as "Hi [Name]" (if unknown, use "Hi there").
+    2. Start with a specific compliment about their site content (be genuine).
+    3. Mention the problem briefly and pivot to the solution.
+    4. Keep it under 125 words.
+    5. Tone: Professional, helpful, not salesy.
+    6. Sign off with "Best, [Your Name]".
+    
+    Output strictly in JSON format (escape newlines inside the email):
+    {{
+        "core_service": "...",
+        "problem": "...",
+        "ai_solution": "...",
+        "email_draft": "..."
+    }}
+    """
+
+    result_text, engine_used = get_router().complete(prompt, FUSED_PROMPT_VERSION, accept=_fused_ok)
+
+    if not result_text:
         return None
 
+    data = parse_llm_json(result_text)
+    if data is None:
+        return None
+    try:
+        result = FusedLeadResult.model_validate(data)
+    except ValidationError as e:
+        print(f" [!] Fused answer failed validation: {e.error_count()} error(s)")
+        return None
+
+    fused = result.model_dump()
+    fused['email_draft'] = fused['email_draft'].strip()
+    fused['engine_used'] = engine_used
+    return fused
+
 if __name__ == "__main__":
     # Test
     # print(analyze_site("https://example.com", "software"))
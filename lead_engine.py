@@ -0,0 +1,274 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Iterable, Optional, Tuple
+
+from tqdm import tqdm
+
+from intelligence import analyze_content, analyze_and_draft, LLM_FUSED_MODE
+from pipeline import generate_email, update_lead_record, build_lead_update, mark_lead_checked
+from refresh import check_site, read_lead_site, UNCHANGED
+from analysis_batcher import AnalysisBatcher, LLM_BATCH_MODE
+from work_queue import LeadWorkQueue, WORKER_POLL_INTERVAL
+from metrics import count, span
+
+# Concurrency Configuration
+LEAD_CONCURRENCY = int(os.getenv("LEAD_CONCURRENCY", "8"))
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "16"))
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "6"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+DB_CONCURRENCY = int(os.getenv("DB_CONCURRENCY", "4"))
+
+
+class LeadEngine:
+    """
+    Async worker engine shared by main.py (Phase 2) and process_leads.py.
+    Runs up to `concurrency` leads at once, with separate limits for page
+    fetches, LLM calls and database writes. With a `work_queue`, leads are
+    claimed and saved under a lease so several engines can share the table.
+    With `refresh`, already processed leads are re-checked and only those
+    whose site changed go through the LLM steps again.
+    """
+
+    def __init__(self, concurrency: int = LEAD_CONCURRENCY, fetch_limit: int = FETCH_CONCURRENCY,
+                 llm_limit: int = LLM_CONCURRENCY, db_limit: int = DB_CONCURRENCY,
+                 fused: bool = LLM_FUSED_MODE, batch: bool = LLM_BATCH_MODE,
+                 work_queue: Optional[LeadWorkQueue] = None, refresh: bool = False):
+        self.concurrency = max(1, concurrency)
+        self.refresh = refresh
+        self.unchanged_count = 0
+        self.work_queue = work_queue
+        # Claimed leads not yet finished, kept alive by the heartbeat
+        self._leased = {}
+        self.fused = fused
+        self.fused_fallbacks = 0
+        # Fused mode already folds the analysis into the email call, so it takes precedence
+        self.batcher = AnalysisBatcher(self._llm_call) if batch and not fused else None
+        self.fetch_semaphore = asyncio.Semaphore(max(1, fetch_limit))
+        self.llm_semaphore = asyncio.Semaphore(max(1, llm_limit))
+        self.db_semaphore = asyncio.Semaphore(max(1, db_limit))
+        # LLM SDKs and the Supabase client are blocking; give them their own
+        # threads so the default executor size never caps the limits above.
+        self._executor = ThreadPoolExecutor(max_workers=max(1, llm_limit) + max(1, db_limit))
+        self.success_count = 0
+        self.failure_count = 0
+
+    async def _run_blocking(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _llm_call(self, func, *args):
+        async with self.llm_semaphore:
+            return await self._run_blocking(func, *args)
+
+    async def process_lead(self, lead: dict, niche: Optional[str] = None) -> bool:
+        """Fetches, analyzes, drafts and saves a single lead. Returns True on success."""
+        niche = niche or lead.get('niche') or "business"
+        url = lead['website_url']
+
+        async with self.fetch_semaphore:
+            if self.refresh:
+                print(f" [*] Checking {url} for changes...")
+                site = await check_site(lead)
+            else:
+                print(f" [*] Analyzing {url}...")
+                site = await read_lead_site(lead)
+
+        if site.outcome == UNCHANGED:
+            self.unchanged_count += 1
+            count("leads_unchanged")
+            async with self.db_semaphore:
+                return await self._run_blocking(mark_lead_checked, lead['id'], site.fields)
+
+        website_content = site.content
+        if not website_content:
+            print(f" [!] Analysis failed for {lead['company_name']}")
+            return False
+
+        analysis = None
+        email_draft = None
+        if self.fused:
+            analysis = await self._llm_call(analyze_and_draft, lead, niche, website_content)
+            if analysis:
+                email_draft = analysis.pop('email_draft')
+            else:
+                # Fall back to the two-call path below
+                self.fused_fallbacks += 1
+
+        if not analysis and self.batcher is not None:
+            analysis = await self.batcher.analyze(lead, niche, website_content)
+        elif not analysis:
+            analysis = await self._llm_call(analyze_content, url, niche, website_content)
+
+        if not analysis:
+            print(f" [!] Analysis failed for {lead['company_name']}")
+            return False
+
+        if not email_draft:
+            # Pass combined data to email generator
+            lead_context = {
+                **lead,
+                **analysis
+            }
+            email_draft = await self._llm_call(generate_email, lead_context)
+
+        if not email_draft:
+            print(f" [!] Failed to draft email for {lead['company_name']}")
+            return False
+
+        async with self.db_semaphore:
+            if self.work_queue is not None:
+                fields = {**build_lead_update(analysis, email_draft), **site.fields}
+                return await self._run_blocking(self.work_queue.complete, lead, fields)
+            return await self._run_blocking(update_lead_record, lead['id'], analysis, email_draft, site.fields)
+
+    async def _handle(self, lead: dict, niche: Optional[str], pbar: tqdm):
+        error = "analysis or email draft failed"
+        try:
+            with span("lead.total"):
+                ok = await self.process_lead(lead, niche)
+        except Exception as e:
+            print(f" [!] Error processing lead {lead.get('id')}: {e}")
+            error = str(e) or type(e).__name__
+            ok = False
+
+        if self.work_queue is not None:
+            if not ok:
+                # No-op if the lease was already lost to another worker
+                async with self.db_semaphore:
+                    await self._run_blocking(self.work_queue.fail, lead, error)
+            self._leased.pop(lead['id'], None)
+
+        if ok:
+            self.success_count += 1
+            count("leads_processed")
+        else:
+            self.failure_count += 1
+            count("leads_failed")
+        pbar.update(1)
+
+    async def consume(self, queue: asyncio.Queue, niche: Optional[str], pbar: tqdm):
+        """
+        Worker loop: processes leads from `queue` until it receives a `None` sentinel.
+        Run `concurrency` of these side by side.
+        """
+        while True:
+            lead = await queue.get()
+            try:
+                if lead is None:
+                    return
+                await self._handle(lead, niche, pbar)
+            finally:
+                queue.task_done()
+
+    async def run(self, leads: Iterable[dict], niche: Optional[str] = None,
+                  desc: str = "Processing Leads") -> Tuple[int, int]:
+        """Processes a fixed batch of leads. Returns (success_count, failure_count)."""
+        leads = list(leads)
+        queue = asyncio.Queue()
+        for lead in leads:
+            queue.put_nowait(lead)
+
+        workers = min(self.concurrency, len(leads)) or 1
+        for _ in range(workers):
+            queue.put_nowait(None)
+
+        try:
+            with tqdm(total=len(leads), desc=desc) as pbar:
+                await asyncio.gather(*(self.consume(queue, niche, pbar) for _ in range(workers)))
+        finally:
+            self.shutdown()
+
+        return self.success_count, self.failure_count
+
+    async def stream(self, produce: Callable[[asyncio.Queue], Awaitable], niche: Optional[str] = None,
+                     expected: int = 0, desc: str = "Processing Leads") -> Tuple[int, int]:
+        """
+        Pipelined mode: runs `produce(queue)` (e.g. discovery) while the workers
+        consume leads from the same bounded queue. The queue's size caps how far
+        discovery can run ahead; workers are stopped once the producer returns
+        and the queue has drained. Returns (success_count, failure_count).
+        """
+        queue = asyncio.Queue(maxsize=max(1, STREAM_QUEUE_SIZE))
+        try:
+            with tqdm(total=expected or None, desc=desc) as pbar:
+                workers = [asyncio.create_task(self.consume(queue, niche, pbar)) for _ in range(self.concurrency)]
+                try:
+                    await produce(queue)
+                finally:
+                    for _ in workers:
+                        await queue.put(None)
+                    await asyncio.gather(*workers)
+                    # Discovery may stop short of the limit; keep the bar honest
+                    pbar.total = pbar.n
+                    pbar.refresh()
+        finally:
+            self.shutdown()
+
+        return self.success_count, self.failure_count
+
+    async def _claim_leads(self, queue: asyncio.Queue, limit: Optional[int], follow: bool, pbar: tqdm):
+        claimed = 0
+        while limit is None or claimed < limit:
+            want = self.work_queue.batch_size if limit is None else min(self.work_queue.batch_size, limit - claimed)
+            async with self.db_semaphore:
+                leads = await self._run_blocking(self.work_queue.claim, want)
+            if not leads:
+                if not follow:
+                    return
+                await asyncio.sleep(WORKER_POLL_INTERVAL)
+                continue
+            for lead in leads:
+                self._leased[lead['id']] = lead
+            claimed += len(leads)
+            pbar.total = claimed
+            pbar.refresh()
+            for lead in leads:
+                await queue.put(lead)
+
+    async def _heartbeat(self):
+        interval = max(1.0, self.work_queue.lease_seconds / 3)
+        while True:
+            await asyncio.sleep(interval)
+            if self._leased:
+                await self._run_blocking(self.work_queue.heartbeat, list(self._leased))
+
+    async def run_queue(self, niche: Optional[str] = None, limit: Optional[int] = None, follow: bool = False,
+                        desc: str = "Processing Leads") -> Tuple[int, int]:
+        """
+        Multi-worker mode: claims leads from the shared table in batches via the
+        engine's work queue, so any number of processes or machines can run
+        side by side without processing a lead twice. Claims stop at `limit`
+        or when nothing is left (with `follow`, it keeps polling instead).
+        Leases on in-flight leads are renewed by a heartbeat, and leads still
+        held when the run stops are handed back. Returns (success_count, failure_count).
+        """
+        if self.work_queue is None:
+            raise ValueError("run_queue needs a LeadEngine created with a work_queue")
+        # Claim only what the workers can start soon, so leases aren't held idle
+        queue = asyncio.Queue(maxsize=self.concurrency)
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            with tqdm(total=0, desc=desc) as pbar:
+                workers = [asyncio.create_task(self.consume(queue, niche, pbar)) for _ in range(self.concurrency)]
+                try:
+                    await self._claim_leads(queue, limit, follow, pbar)
+                finally:
+                    for _ in workers:
+                        await queue.put(None)
+                    await asyncio.gather(*workers)
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            if self._leased:
+                # Like every other queue call, off the event loop so a slow database can't stall it
+                released = await self._run_blocking(self.work_queue.release, list(self._leased))
+                print(f" [*] Released {released} unfinished leads back to the queue.")
+                self._leased.clear()
+            self.shutdown()
+
+        return self.success_count, self.failure_count
+
+    def shutdown(self):
+        """Releases the engine's worker threads."""
+        self._executor.shutdown(wait=False)
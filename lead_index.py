@@ -0,0 +1,141 @@
+import hashlib
+import math
+import os
+from typing import Iterable, Optional, Set
+
+from supabase_client import PaginationError
+
+# Dedup Configuration
+DEDUP_PAGE_SIZE = int(os.getenv("DEDUP_PAGE_SIZE", "1000"))
+DEDUP_BLOOM_THRESHOLD = int(os.getenv("DEDUP_BLOOM_THRESHOLD", "500000"))
+DEDUP_CONFIRM_BATCH = int(os.getenv("DEDUP_CONFIRM_BATCH", "100"))
+
+
+class BloomFilter:
+    """Compact probabilistic set: no false negatives, tunable false-positive rate."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.count = 0
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class ScalableBloomFilter:
+    """Chain of Bloom filters that doubles in capacity instead of overfilling."""
+
+    def __init__(self, initial_capacity: int, error_rate: float = 0.001):
+        self.error_rate = error_rate
+        self.filters = [BloomFilter(initial_capacity, error_rate)]
+
+    def add(self, item: str):
+        if self.filters[-1].full:
+            self.filters.append(BloomFilter(self.filters[-1].capacity * 2, self.error_rate))
+        self.filters[-1].add(item)
+
+    def __contains__(self, item: str) -> bool:
+        return any(item in f for f in self.filters)
+
+
+class LeadIndex:
+    """
+    In-memory index of every `website_url` already in the `leads` table.
+    Loaded once per run, then updated as new leads are saved, so discovery
+    can dedup listings without a Supabase round-trip each. Tables larger than
+    `bloom_threshold` rows are held in a Bloom filter and positive hits are
+    confirmed against the database with batched `in.(...)` lookups.
+    """
+
+    def __init__(self, client, table: str = "leads", page_size: int = DEDUP_PAGE_SIZE,
+                 bloom_threshold: int = DEDUP_BLOOM_THRESHOLD):
+        self.client = client
+        self.table = table
+        self.page_size = max(1, page_size)
+        self.bloom_threshold = bloom_threshold
+        self.urls: Set[str] = set()
+        self.bloom: Optional[ScalableBloomFilter] = None
+        self.loaded = False
+        self.confirm_queries = 0
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def load(self) -> int:
+        """Pages through the table projecting only `website_url`. Returns rows read."""
+        total = 0
+        try:
+            for row in self.client.table(self.table).select("website_url").paginate(self.page_size):
+                self._remember(row.get("website_url"))
+                total += 1
+        except PaginationError as e:
+            print(f" [!] Dedup index load error: {e}")
+        self.loaded = True
+        return total
+
+    def _remember(self, website_url: Optional[str]):
+        if not website_url:
+            return
+        if self.bloom is not None:
+            self.bloom.add(website_url)
+            return
+        self.urls.add(website_url)
+        if len(self.urls) > self.bloom_threshold:
+            # Switch to the compact representation; exact membership is confirmed in the DB
+            self.bloom = ScalableBloomFilter(initial_capacity=len(self.urls) * 4)
+            for url in self.urls:
+                self.bloom.add(url)
+            self.urls = set()
+
+    def add(self, website_url: str):
+        """Records a newly saved lead so later listings dedup against it."""
+        if not website_url:
+            return
+        if self.bloom is not None:
+            self.bloom.add(website_url)
+        # Saved in this run: always kept exactly, no confirm needed
+        self.urls.add(website_url)
+
+    def contains(self, website_url: str) -> bool:
+        """True if the URL is already known. Microseconds unless a Bloom hit needs confirming."""
+        if website_url in self.urls:
+            return True
+        if self.bloom is None or website_url not in self.bloom:
+            return False
+        return website_url in self.confirm([website_url])
+
+    def confirm(self, website_urls: Iterable[str]) -> Set[str]:
+        """Returns the subset of `website_urls` that exists in the table, in batched queries."""
+        urls = list(dict.fromkeys(u for u in website_urls if u))
+        found = set()
+        for i in range(0, len(urls), DEDUP_CONFIRM_BATCH):
+            chunk = urls[i:i + DEDUP_CONFIRM_BATCH]
+            self.confirm_queries += 1
+            response = self.client.table(self.table).select("website_url").in_("website_url", chunk).execute()
+            if response.error:
+                print(f" [!] Dedup confirm error: {response.error}")
+                continue
+            found.update(row.get("website_url") for row in response.data or [])
+        for url in found:
+            self.urls.add(url)
+        return found
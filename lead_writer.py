@@ -0,0 +1,171 @@
+import asyncio
+import inspect
+import os
+from contextlib import contextmanager
+from typing import Awaitable, Callable, List, Optional
+
+# Write-Behind Configuration
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "25"))
+WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", "2.0"))
+WRITE_MAX_RETRIES = int(os.getenv("WRITE_MAX_RETRIES", "2"))
+
+
+def _is_row_error(status_code: Optional[int]) -> bool:
+    """A 4xx other than timeout/rate limit means PostgREST rejected the rows themselves."""
+    return status_code is not None and 400 <= status_code < 500 and status_code not in (408, 429)
+
+
+class LeadWriteBuffer:
+    """
+    Write-behind buffer for discovered leads. Rows are collected and sent as
+    one PostgREST bulk upsert (JSON array, `on_conflict`) when the buffer
+    reaches `batch_size`, every `flush_interval` seconds, and on close.
+    A batch PostgREST rejects (a 4xx) is split in half until the bad row is
+    isolated; rate limits, server errors and dropped connections retry the
+    whole batch with backoff instead, then fail it. `on_saved(row)` /
+    `on_failed(lead)` report every row's outcome.
+    Only the `returning` columns (e.g. "id" when the caller needs the new ids)
+    come back from the database and are merged into the saved row; the
+    default "minimal" sends nothing back.
+    """
+
+    def __init__(self, client, table: str = "leads", on_conflict: str = "website_url",
+                 batch_size: int = WRITE_BATCH_SIZE, flush_interval: float = WRITE_FLUSH_INTERVAL,
+                 max_retries: int = WRITE_MAX_RETRIES, backoff_base: float = 0.5, returning: str = "minimal",
+                 on_saved: Optional[Callable[[dict], Awaitable]] = None,
+                 on_failed: Optional[Callable[[dict], Awaitable]] = None):
+        self.client = client
+        self.table = table
+        self.on_conflict = on_conflict
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        # The conflict column identifies which returned row belongs to which lead
+        self.returning = returning if returning == "minimal" else f"{returning},{on_conflict}"
+        self.on_saved = on_saved
+        self.on_failed = on_failed
+        self._buffer: List[dict] = []
+        self._inflight = 0
+        self._reserved = 0
+        self._flush_tasks = set()
+        self._timer_task = None
+        self.saved_count = 0
+        self.failed_count = 0
+        self.requests = 0
+
+    @property
+    def pending_count(self) -> int:
+        """Rows accepted but not yet confirmed by the database."""
+        return len(self._buffer) + self._inflight
+
+    @property
+    def committed_count(self) -> int:
+        """Rows saved so far, rows still on their way to the database and reserved slots."""
+        return self.saved_count + self.pending_count + self._reserved
+
+    @contextmanager
+    def reserve(self):
+        """
+        Holds one slot towards a lead limit while a listing is read, so callers
+        checking committed_count in parallel can't all claim the last one. A
+        row added inside the block takes the slot over; otherwise it is given
+        back on exit.
+        """
+        self._reserved += 1
+        try:
+            yield
+        finally:
+            self._reserved -= 1
+
+    async def start(self):
+        """Starts the periodic flush timer."""
+        if self._timer_task is None and self.flush_interval > 0:
+            self._timer_task = asyncio.create_task(self._timer())
+
+    async def _timer(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # Waiting on a tracked task means cancelling the timer never abandons a batch mid-write
+            await asyncio.wait({self._spawn_flush()})
+
+    def _spawn_flush(self) -> asyncio.Task:
+        task = asyncio.create_task(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+        return task
+
+    async def add(self, lead_data: dict):
+        """Queues a lead for writing. Never waits on the database."""
+        self._buffer.append(lead_data)
+        if len(self._buffer) >= self.batch_size:
+            self._spawn_flush()
+
+    async def flush(self):
+        """Writes everything currently buffered and reports each row's outcome."""
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        self._inflight += len(batch)
+        try:
+            results = await self._write(batch)
+        finally:
+            self._inflight -= len(batch)
+
+        for lead, saved in zip(batch, results):
+            if saved is not None:
+                self.saved_count += 1
+                if self.on_saved:
+                    await self.on_saved(saved)
+            else:
+                self.failed_count += 1
+                if self.on_failed:
+                    await self.on_failed(lead)
+
+    async def close(self):
+        """Stops the timer and flushes whatever is left."""
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+            try:
+                await self._timer_task
+            except asyncio.CancelledError:
+                pass
+            self._timer_task = None
+        await self.drain()
+
+    async def drain(self):
+        """Waits for in-flight batches and writes whatever is still buffered."""
+        if self._flush_tasks:
+            await asyncio.gather(*list(self._flush_tasks), return_exceptions=True)
+        await self.flush()
+
+    async def _execute(self, query):
+        # Works with both SupabaseClient (blocking, run in a thread) and AsyncSupabaseClient
+        if inspect.iscoroutinefunction(query.execute):
+            return await query.execute()
+        return await asyncio.to_thread(query.execute)
+
+    async def _write(self, batch: List[dict]) -> List[Optional[dict]]:
+        """Bulk upsert with retry and split-in-half isolation of rejected rows. One result per input row."""
+        error = None
+        for attempt in range(self.max_retries + 1):
+            self.requests += 1
+            query = self.client.table(self.table).upsert(batch, on_conflict=self.on_conflict, returning=self.returning)
+            response = await self._execute(query)
+            if not response.error:
+                returned = {row.get(self.on_conflict): row for row in response.data or [] if isinstance(row, dict)}
+                return [{**lead, **returned.get(lead.get(self.on_conflict), {})} for lead in batch]
+            error = response.error
+            if _is_row_error(response.status_code):
+                # A bad row fails the same way every time: isolate it instead of retrying
+                if len(batch) == 1:
+                    print(f" [!] Database Upsert Error: {error}")
+                    return [None]
+                middle = len(batch) // 2
+                return await self._write(batch[:middle]) + await self._write(batch[middle:])
+            if attempt < self.max_retries:
+                await asyncio.sleep(self.backoff_base * (2 ** attempt))
+
+        # Rate limits, server errors and dropped connections say nothing about the rows: fail the batch once
+        print(f" [!] Database Upsert Error ({len(batch)} rows): {error}")
+        return [None] * len(batch)
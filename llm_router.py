@@ -0,0 +1,411 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, List, Optional, Tuple
+
+import google.generativeai as genai
+from groq import Groq
+from dotenv import load_dotenv
+
+from llm_cache import get_llm_cache
+from metrics import count, span
+
+load_dotenv()
+
+# API Configuration
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+
+if GEMINI_API_KEY:
+    genai.configure(api_key=GEMINI_API_KEY)
+
+# Initialize Groq client
+groq_client = Groq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
+
+GEMINI_MODEL = "gemini-1.5-pro"
+GROQ_MODEL = "llama-3.3-70b-versatile"
+
+# Rate Limits (per provider, per minute)
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "60"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+GROQ_RPM = int(os.getenv("GROQ_RPM", "30"))
+GROQ_TPM = int(os.getenv("GROQ_TPM", "60000"))
+
+# Routing Configuration
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "3"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_MAX_QUEUE_WAIT = float(os.getenv("LLM_MAX_QUEUE_WAIT", "20"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "").lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = 20
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used for budgeting and rate limits."""
+    return len(text) // 4 + 1
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """True for provider 429s (Gemini ResourceExhausted, Groq RateLimitError, raw HTTP 429)."""
+    if getattr(error, "status_code", None) == 429 or getattr(error, "code", None) == 429:
+        return True
+    name = type(error).__name__
+    return name in ("ResourceExhausted", "RateLimitError", "TooManyRequests") or "429" in str(error)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `per_minute` units per minute."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = max(1, per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: int, max_wait: float) -> Optional[float]:
+        """
+        Reserves `amount` units and returns how long the caller must sleep
+        before using them, or None (nothing reserved) if that exceeds `max_wait`.
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            deficit = amount - self.tokens
+            delay = max(0.0, deficit / self.rate)
+            if delay > max_wait:
+                return None
+            self.tokens -= amount
+            return delay
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; lets one probe through after `reset_after` seconds."""
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, reset_after: float = LLM_BREAKER_RESET):
+        self.threshold = max(1, threshold)
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self._prober: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def ready(self) -> bool:
+        """Whether allow() would let a request through, without claiming the probe."""
+        with self._lock:
+            state = self.state
+            return state == "closed" or (state == "half-open" and not self.probing)
+
+    def allow(self) -> bool:
+        """Call right before sending a request; in half-open state only one caller gets through."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self.probing:
+                self.probing = True
+                self._prober = threading.get_ident()
+                return True
+            return False
+
+    def release(self):
+        """Hands back a probe this thread claimed but never sent, so a later call can probe instead."""
+        with self._lock:
+            if self.probing and self._prober == threading.get_ident():
+                self.probing = False
+                self._prober = None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+            self._prober = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+            self._prober = None
+
+
+class Provider:
+    """
+    One LLM backend. `request(prompt)` must return the answer text or raise;
+    tests can swap in any callable as a local stand-in.
+    """
+
+    def __init__(self, name: str, model: str, label: str, request: Callable[[str], str],
+                 rpm: int, tpm: int, available: bool = True):
+        self.name = name
+        self.model = model
+        self.label = label
+        self.request = request
+        self.available = available
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.breaker = CircuitBreaker()
+        self.latencies = deque(maxlen=200)
+        self.calls = 0
+        self.failures = 0
+        self.rate_limited = 0
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        if len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+
+def _gemini_request(prompt: str) -> str:
+    model = genai.GenerativeModel(GEMINI_MODEL)
+    response = model.generate_content(prompt)
+    return response.text
+
+def _groq_request(prompt: str) -> str:
+    chat_completion = groq_client.chat.completions.create(
+        messages=[
+            {
+                "role": "user",
+                "content": prompt,
+            }
+        ],
+        model=GROQ_MODEL,
+    )
+    return chat_completion.choices[0].message.content
+
+
+def default_providers() -> List[Provider]:
+    return [
+        Provider("gemini", GEMINI_MODEL, "Gemini 1.5 Pro", _gemini_request, GEMINI_RPM, GEMINI_TPM,
+                 available=bool(GEMINI_API_KEY)),
+        Provider("groq", GROQ_MODEL, "Groq Llama-3.3-70b", _groq_request, GROQ_RPM, GROQ_TPM,
+                 available=groq_client is not None),
+    ]
+
+
+def _never(text: str) -> bool:
+    return False
+
+
+class LLMRouter:
+    """
+    Routes prompts across providers in priority order (Gemini, then Groq).
+    Each provider has request/token buckets, a circuit breaker that skips it
+    after repeated failures and probes it again later, and exponential
+    backoff on 429s. With `hedge=True`, the next provider is started when
+    the current one runs past its latency percentile and the first answer wins.
+    Answers go through the LLM cache keyed by provider model and prompt version.
+    """
+
+    def __init__(self, providers: Optional[List[Provider]] = None, hedge: bool = LLM_HEDGE,
+                 hedge_percentile: float = LLM_HEDGE_PERCENTILE, max_retries: int = LLM_MAX_RETRIES,
+                 backoff_base: float = LLM_BACKOFF_BASE, max_queue_wait: float = LLM_MAX_QUEUE_WAIT):
+        self.providers = providers if providers is not None else default_providers()
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.max_queue_wait = max_queue_wait
+        self.fallbacks = 0
+        self.hedges = 0
+        self._executor = ThreadPoolExecutor(max_workers=8)
+
+    def provider(self, name: str) -> Optional[Provider]:
+        return next((p for p in self.providers if p.name == name), None)
+
+    def _attempt(self, provider: Provider, prompt: str, version: str,
+                 accept: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        """
+        One provider with rate limiting, 429 backoff and breaker bookkeeping. None on failure.
+        The answer is cached only if `accept(answer)` holds, so output that fails to parse is retried next run.
+        """
+        # Checked only now, when the request is really about to go out, so a
+        # half-open provider's probe is never claimed by a call that won't use it
+        if not provider.breaker.allow():
+            print(f" [!] {provider.label} circuit open; routing around it.")
+            return None
+        try:
+            return self._call(provider, prompt, version, accept)
+        finally:
+            # Every path that records nothing (e.g. a full rate-limit queue) gives the probe back
+            provider.breaker.release()
+
+    def _call(self, provider: Provider, prompt: str, version: str,
+              accept: Optional[Callable[[str], bool]]) -> Optional[str]:
+        tokens = estimate_tokens(prompt)
+        text = None
+        for attempt in range(self.max_retries + 1):
+            delay = provider.requests.reserve(1, self.max_queue_wait)
+            token_delay = provider.tokens.reserve(tokens, self.max_queue_wait) if delay is not None else None
+            if delay is None or token_delay is None:
+                print(f" [!] {provider.label} rate limit queue is full; skipping it.")
+                return None
+            if max(delay, token_delay) > 0:
+                time.sleep(max(delay, token_delay))
+
+            provider.calls += 1
+            started = time.monotonic()
+            try:
+                with span(f"llm.{provider.name}"):
+                    text = provider.request(prompt)
+            except Exception as e:
+                if is_rate_limited(e) and attempt < self.max_retries:
+                    provider.rate_limited += 1
+                    count("llm_rate_limited")
+                    time.sleep(self.backoff_base * (2 ** attempt))
+                    continue
+                print(f" [!] {provider.label} Error: {e}")
+            else:
+                provider.latencies.append(time.monotonic() - started)
+            break
+
+        # An error, or an empty answer, counts against the provider's breaker
+        if not text:
+            provider.failures += 1
+            provider.breaker.record_failure()
+            return None
+        provider.breaker.record_success()
+        count(f"llm_prompt_tokens_{provider.name}", tokens)
+        if accept is None or accept(text):
+            get_llm_cache().put(provider.model, version, prompt, text)
+        return text
+
+    def _candidates(self, only: Optional[str] = None) -> List[Provider]:
+        candidates = []
+        for provider in self.providers:
+            if only and provider.name != only:
+                continue
+            if not provider.available:
+                continue
+            if not provider.breaker.ready():
+                print(f" [!] {provider.label} circuit open; routing around it.")
+                continue
+            candidates.append(provider)
+        return candidates
+
+    def cached(self, prompt: str, version: str, only: Optional[str] = None,
+               accept: Optional[Callable[[str], bool]] = None) -> Optional[Tuple[str, str]]:
+        """
+        (answer, provider label) from the LLM cache, or None. Any provider's
+        earlier answer to this exact prompt will do; one failing `accept` is evicted.
+        """
+        eligible = [p for p in self.providers if not only or p.name == only]
+        cached = get_llm_cache().get_any([p.model for p in eligible], version, prompt)
+        if cached is not None and accept is not None and not accept(cached[1]):
+            get_llm_cache().evict(cached[0], version, prompt)
+            cached = None
+        count("llm_cache_hits" if cached is not None else "llm_cache_misses")
+        if cached is None:
+            return None
+        model, text = cached
+        return text, next(p.label for p in eligible if p.model == model)
+
+    def remember(self, label: str, prompt: str, version: str, text: str):
+        """Caches an answer under the model of the provider labelled `label`, e.g. one site split out of a batch."""
+        provider = next((p for p in self.providers if p.label == label), None)
+        if provider is not None:
+            get_llm_cache().put(provider.model, version, prompt, text)
+
+    def complete(self, prompt: str, version: str, only: Optional[str] = None,
+                 accept: Optional[Callable[[str], bool]] = None,
+                 cache: bool = True) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Returns (answer, provider label), or (None, None) when every provider failed.
+        `accept` tells a usable answer from malformed output: only accepted
+        answers are cached, and a cached one that fails it is evicted and asked again.
+        With `cache=False` the cache is neither read nor written.
+        """
+        if cache:
+            hit = self.cached(prompt, version, only, accept)
+            if hit is not None:
+                return hit
+        else:
+            # No answer passes, so none is written either
+            accept = _never
+
+        candidates = self._candidates(only)
+        if self.hedge and len(candidates) > 1:
+            return self._complete_hedged(candidates, prompt, version, accept)
+
+        for index, provider in enumerate(candidates):
+            if index > 0:
+                self.fallbacks += 1
+                count("llm_fallbacks")
+                print(f" [!] {candidates[index - 1].label} failed. Switching to {provider.label}...")
+            text = self._attempt(provider, prompt, version, accept)
+            if text:
+                return text, provider.label
+        return None, None
+
+    def _complete_hedged(self, candidates: List[Provider], prompt: str, version: str,
+                         accept: Optional[Callable[[str], bool]] = None) -> Tuple[Optional[str], Optional[str]]:
+        primary, backups = candidates[0], list(candidates[1:])
+        futures = {self._executor.submit(self._attempt, primary, prompt, version, accept): primary}
+        threshold = primary.latency_percentile(self.hedge_percentile)
+
+        while futures:
+            timeout = threshold if (backups and len(futures) == 1 and threshold is not None) else None
+            done, _ = wait(list(futures), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Primary is slower than usual: race the next provider against it
+                backup = backups.pop(0)
+                self.hedges += 1
+                count("llm_hedges")
+                futures[self._executor.submit(self._attempt, backup, prompt, version, accept)] = backup
+                continue
+            for future in done:
+                provider = futures.pop(future)
+                text = future.result()
+                if text:
+                    return text, provider.label
+            if not futures and backups:
+                self.fallbacks += 1
+                count("llm_fallbacks")
+                backup = backups.pop(0)
+                futures[self._executor.submit(self._attempt, backup, prompt, version, accept)] = backup
+        return None, None
+
+    def stats(self) -> str:
+        parts = []
+        for p in self.providers:
+            parts.append(f"{p.name}: {p.calls} calls, {p.failures} failed, {p.rate_limited} rate-limited, breaker {p.breaker.state}")
+        return "; ".join(parts) + f"; fallbacks: {self.fallbacks}, hedges: {self.hedges}"
+
+
+_router: Optional[LLMRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> LLMRouter:
+    """Returns the process-wide router, creating it with the default providers on first use."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = LLMRouter()
+        return _router
+
+
+def set_router(router: Optional[LLMRouter]):
+    """Replaces the process-wide router (e.g. with local stand-in providers in tests)."""
+    global _router
+    with _router_lock:
+        _router = router
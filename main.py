@@ -1,24 +1,77 @@
 import argparse
 import asyncio
-from tqdm import tqdm
 from validator import validate_inputs, check_connectivity, validate_api_keys
-from discovery import search_leads
-from intelligence import analyze_site
-from pipeline import get_discovered_leads, generate_email, update_lead_record
+from discovery import search_leads, discover_shards, DISCOVERY_CONTEXTS, DISCOVERY_HEADLESS
+from intelligence import close_intelligence, LLM_FUSED_MODE
+from lead_engine import LeadEngine, LEAD_CONCURRENCY
+from analysis_batcher import LLM_BATCH_MODE
+from pipeline import iter_discovered_leads
+from process_leads import print_summary, process_stream
+from llm_cache import get_llm_cache
+from metrics import get_metrics, METRICS_HOST, METRICS_PORT
+
+def read_locations(path: str):
+    """One location per line; blank lines and '#' comments are ignored."""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+
+async def discover(args, lead_queue=None):
+    """Single-query discovery, or a sharded run over --locations-file."""
+    if args.locations:
+        pairs = [(args.niche, location) for location in args.locations]
+        return await discover_shards(pairs, args.limit, lead_queue=lead_queue,
+                                     contexts=args.contexts, headless=args.headless)
+    return await search_leads(args.niche, args.location, args.limit, lead_queue=lead_queue, headless=args.headless)
+
+async def run_streaming(args):
+    """Discovery and intelligence run side by side; only leads saved by this run are processed."""
+    print(f"\n[Pipeline] Discovering and analyzing up to {args.limit} leads for '{args.niche}' in '{args.where}'...")
+    engine = LeadEngine(concurrency=args.concurrency, fused=args.fused or LLM_FUSED_MODE,
+                        batch=args.batch or LLM_BATCH_MODE)
+
+    async def produce(queue):
+        try:
+            await discover(args, lead_queue=queue)
+        except Exception as e:
+            print(f" [!] Discovery Failed: {e}")
+
+    try:
+        stats = await engine.stream(produce, niche=args.niche, expected=args.limit)
+    finally:
+        await close_intelligence()
+
+    print_summary(stats, "Execution Complete")
+    print("Check Supabase for details.")
 
 async def main():
     parser = argparse.ArgumentParser(description="LeadGen-Nexus V2 CLI")
     parser.add_argument("--niche", type=str, required=True, help="Business niche (e.g., 'dentist')")
-    parser.add_argument("--location", type=str, required=True, help="Location (e.g., 'New York')")
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument("--location", type=str, help="Location (e.g., 'New York')")
+    where.add_argument("--locations-file", type=str, help="File with one location per line; each becomes a discovery shard")
+    parser.add_argument("--contexts", type=int, default=DISCOVERY_CONTEXTS, help="Browser contexts for sharded discovery")
+    parser.add_argument("--headless", action=argparse.BooleanOptionalAction, default=DISCOVERY_HEADLESS,
+                        help="Run the discovery browser headless (--no-headless overrides DISCOVERY_HEADLESS)")
     parser.add_argument("--limit", type=int, required=True, help="Number of leads to find")
+    parser.add_argument("--concurrency", type=int, default=LEAD_CONCURRENCY, help="Leads processed in parallel")
+    parser.add_argument("--stream", action="store_true", help="Analyze leads while discovery is still scrolling")
+    parser.add_argument("--fused", action="store_true", help="Analyze and draft the email in a single LLM call")
+    parser.add_argument("--batch", action="store_true", help="Pack several sites into each analysis request")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached LLM results and call the models again")
     
     args = parser.parse_args()
     
     print("\n=== LeadGen-Nexus V2 ===")
     
     # 1. Validation
-    if not validate_inputs(args.niche, args.location, args.limit):
+    args.locations = read_locations(args.locations_file) if args.locations_file else []
+    if args.locations_file and not args.locations:
+        print(f"Error: {args.locations_file} lists no locations.")
         return
+    for location in args.locations or [args.location]:
+        if not validate_inputs(args.niche, location, args.limit):
+            return
+    args.where = f"{len(args.locations)} locations" if args.locations else args.location
         
     if not validate_api_keys():
         return
@@ -26,10 +79,17 @@ async def main():
     if not check_connectivity():
         return
 
+    if args.no_cache:
+        get_llm_cache().bypass = True
+
+    if args.stream:
+        await run_streaming(args)
+        return
+
     # 2. Discovery
-    print(f"\n[Phase 1] Discovery: Finding {args.limit} leads for '{args.niche}' in '{args.location}'...")
+    print(f"\n[Phase 1] Discovery: Finding {args.limit} leads for '{args.niche}' in '{args.where}'...")
     try:
-        await search_leads(args.niche, args.location, args.limit)
+        await discover(args)
     except Exception as e:
         print(f" [!] Discovery Failed: {e}")
         return
@@ -37,60 +97,22 @@ async def main():
     # 3. Processing (Intelligence & Pipeline)
     print("\n[Phase 2] Intelligence & Drafting...")
     
-    # Fetch leads that need processing
-    # We fetch up to the limit, assuming we just found them or they were pending.
-    # Note: If there were old 'discovered' leads, this might pick them up. This is acceptable behavior.
-    leads = get_discovered_leads(args.limit)
-    
-    if not leads:
-        print(" [!] No 'discovered' leads found in database to process.")
-        return
-
-    success_count = 0
-    failure_count = 0
-    
-    with tqdm(total=len(leads), desc="Processing Leads") as pbar:
-        for lead in leads:
-            try:
-                # Analyze
-                analysis = await analyze_site(lead['website_url'], args.niche)
-                
-                if analysis:
-                    # Generate Email
-                    # Pass combined data to email generator
-                    lead_context = {
-                        **lead,
-                        **analysis
-                    }
-                    email_draft = generate_email(lead_context)
-                    
-                    if email_draft:
-                        # Save
-                        update_lead_record(lead['id'], analysis, email_draft)
-                        success_count += 1
-                    else:
-                        print(f" [!] Failed to draft email for {lead['company_name']}")
-                        failure_count += 1
-                else:
-                    print(f" [!] Analysis failed for {lead['company_name']}")
-                    failure_count += 1
-                    
-            except Exception as e:
-                print(f" [!] Error processing lead {lead.get('id')}: {e}")
-                failure_count += 1
-                
-            pbar.update(1)
+    # Leads left 'discovered' by earlier runs are picked up too, oldest first
+    engine = LeadEngine(concurrency=args.concurrency, fused=args.fused or LLM_FUSED_MODE,
+                        batch=args.batch or LLM_BATCH_MODE)
+    stats = await process_stream(iter_discovered_leads(args.limit), engine, args.limit, niche=args.niche)
 
-    # Final Report
-    print("\n=== Execution Complete ===")
-    print(f"Processed: {len(leads)}")
-    print(f"Successes: {success_count}")
-    print(f"Failures:  {failure_count}")
+    print_summary(stats, "Execution Complete")
     print("Check Supabase for details.")
 
 if __name__ == "__main__":
+    if METRICS_PORT:
+        print(f"Metrics: http://{METRICS_HOST}:{get_metrics().serve(METRICS_PORT)}/metrics")
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         print("\n[!] Process interrupted by user.")
+    finally:
+        # Flushes the span trace file, if one is being written
+        get_metrics().close()
 
@@ -0,0 +1,164 @@
+import json
+import re
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# Responses that carry search results: the first search and each feed page loaded while scrolling
+SEARCH_RESPONSE_PATTERN = re.compile(r"/search\?(.*&)?tbm=map|/maps/preview/search|/maps/search/")
+XSSI_PREFIX = ")]}'"
+TRAILER = '/*""*/'
+
+FEATURE_ID_PATTERN = re.compile(r"^0x[0-9a-f]+:0x[0-9a-f]+$")
+PLACE_ID_PATTERN = re.compile(r"^ChIJ[\w-]{10,}$")
+
+# Field positions inside a place record (the array Maps nests at result[14])
+NAME = 11
+WEBSITE = 7
+RATING_BLOCK = 4
+FEATURE_ID = 10
+ADDRESS = 39
+PLACE_ID = 78
+
+
+def decode_payload(body: str):
+    """JSON from a Maps response: strips the XSSI prefix and unwraps the {"d": "..."} envelope."""
+    body = body.strip()
+    if body.endswith(TRAILER):
+        body = body[: -len(TRAILER)]
+    if body.startswith(XSSI_PREFIX):
+        body = body[len(XSSI_PREFIX):]
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    if isinstance(data, dict) and isinstance(data.get("d"), str):
+        return decode_payload(data["d"])
+    return data
+
+
+def _at(node, *path):
+    for index in path:
+        if not isinstance(node, list) or index >= len(node):
+            return None
+        node = node[index]
+    return node
+
+
+def _is_place(node) -> bool:
+    return (
+        isinstance(node, list)
+        and len(node) > FEATURE_ID
+        and isinstance(node[NAME], str)
+        and isinstance(node[FEATURE_ID], str)
+        and bool(FEATURE_ID_PATTERN.match(node[FEATURE_ID]))
+    )
+
+
+def find_place_records(data) -> Iterator[list]:
+    """Every place record anywhere in the payload, so wrapper changes don't break parsing."""
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, list):
+            continue
+        if _is_place(node):
+            yield node
+            continue
+        stack.extend(reversed(node))
+
+
+def _website(value) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    if value.startswith("/url?"):
+        # Redirect wrapper: the real site is in ?q=
+        value = parse_qs(urlparse(value).query).get("q", [""])[0]
+    return value if value.startswith(("http://", "https://")) else None
+
+
+def parse_place(record: list) -> Dict[str, object]:
+    rating = _at(record, RATING_BLOCK, 7)
+    reviews = _at(record, RATING_BLOCK, 8)
+    place_id = _at(record, PLACE_ID)
+    address = _at(record, ADDRESS)
+    return {
+        "name": record[NAME].strip(),
+        "website": _website(_at(record, WEBSITE, 0)),
+        "rating": float(rating) if isinstance(rating, (int, float)) and 0 <= rating <= 5 else None,
+        "review_count": int(reviews) if isinstance(reviews, (int, float)) and reviews >= 0 else None,
+        "feature_id": record[FEATURE_ID],
+        "place_id": place_id if isinstance(place_id, str) and PLACE_ID_PATTERN.match(place_id) else None,
+        "address": address if isinstance(address, str) else None,
+    }
+
+
+def parse_search_payload(body: str) -> List[Dict[str, object]]:
+    data = decode_payload(body)
+    if data is None:
+        return []
+    return [parse_place(record) for record in find_place_records(data)]
+
+
+def _name_key(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+def matches_listing(place: Optional[Dict[str, object]], name: Optional[str]) -> bool:
+    """True if a parsed place carries the feed item's name, so its other fields can be trusted."""
+    return bool(place and place["name"] and name and _name_key(place["name"]) == _name_key(name))
+
+
+class PlaceCollector:
+    """
+    Listens to the search responses Maps loads while the feed scrolls and
+    keeps every place found in them, indexed by place id, feature id and
+    name. Discovery looks listings up here before falling back to a click.
+    """
+
+    def __init__(self):
+        self._by_id: Dict[str, Dict[str, object]] = {}
+        self._by_name: Dict[str, List[Dict[str, object]]] = {}
+        self.responses = 0
+        self.hits = 0
+        self.misses = 0
+
+    def attach(self, page):
+        page.on("response", self._on_response)
+
+    async def _on_response(self, response):
+        if not SEARCH_RESPONSE_PATTERN.search(response.url):
+            return
+        try:
+            body = await response.text()
+        except Exception:
+            return
+        self.ingest(body)
+
+    def ingest(self, body: str) -> int:
+        """Adds the places in one response body; returns how many were found."""
+        places = parse_search_payload(body)
+        self.responses += 1
+        for place in places:
+            for key in (place["feature_id"], place["place_id"]):
+                if key:
+                    self._by_id[key] = place
+            matches = self._by_name.setdefault(_name_key(place["name"]), [])
+            if all(p["feature_id"] != place["feature_id"] for p in matches):
+                matches.append(place)
+        return len(places)
+
+    def lookup(self, identity: Optional[str], name: Optional[str]) -> Optional[Dict[str, object]]:
+        """The place for a feed item, by id first and by name only when the name is unambiguous."""
+        place = self._by_id.get(identity) if identity else None
+        if place is None and name:
+            matches = self._by_name.get(_name_key(name), [])
+            place = matches[0] if len(matches) == 1 else None
+        if place is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return place
+
+    @property
+    def place_count(self) -> int:
+        return len({p["feature_id"] for p in self._by_id.values()})
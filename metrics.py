@@ -0,0 +1,255 @@
+import functools
+import inspect
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+# Instrumentation Configuration
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+# Write every span as one JSON line here (off when empty)
+METRICS_TRACE_PATH = os.getenv("METRICS_TRACE_PATH", "")
+# Serve Prometheus text format on this port at /metrics (off when 0)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Interface the endpoint listens on; loopback only unless set (e.g. 0.0.0.0 for a scraper on another host)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Durations kept per stage for percentiles; counts and totals stay exact past it
+METRICS_SAMPLE_SIZE = int(os.getenv("METRICS_SAMPLE_SIZE", "5000"))
+
+_NOOP = nullcontext()
+
+
+class Stage:
+    """Durations of one named step: exact count/total/max plus a uniform sample for percentiles."""
+
+    def __init__(self, sample_size: int):
+        self.sample_size = sample_size
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.samples: List[float] = []
+
+    def add(self, seconds: float, error: bool = False):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if error:
+            self.errors += 1
+        if len(self.samples) < self.sample_size:
+            self.samples.append(seconds)
+        else:
+            # Reservoir sampling keeps every duration equally likely to be in the sample
+            slot = random.randrange(self.count)
+            if slot < self.sample_size:
+                self.samples[slot] = seconds
+
+    def percentile(self, percentile: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "attrs", "started", "wall")
+
+    def __init__(self, metrics: "Metrics", name: str, attrs: dict):
+        self.metrics = metrics
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.wall = time.time()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.record(self.name, time.perf_counter() - self.started, exc_type is not None, self.wall, self.attrs)
+        return False
+
+
+class Metrics:
+    """
+    Run-level timings and counters. `span(name)` times a block (sync or
+    async code alike) and `count(name)` bumps a counter; the module-level
+    `timed(name)` decorator wraps whole functions. Stages are summarized
+    with p50/p95 at the end of a run, can be streamed to a JSONL trace and
+    scraped in Prometheus text format.
+    When disabled, span() hands back a shared no-op context and timed()
+    returns the function untouched.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED, trace_path: str = METRICS_TRACE_PATH,
+                 sample_size: int = METRICS_SAMPLE_SIZE):
+        self.enabled = enabled
+        self.sample_size = max(1, sample_size)
+        self.stages: Dict[str, Stage] = {}
+        self.counters: Dict[str, float] = {}
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._trace = open(trace_path, "a", encoding="utf-8") if enabled and trace_path else None
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, name, attrs)
+
+    def count(self, name: str, value: float = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record(self, name: str, seconds: float, error: bool = False, wall: Optional[float] = None,
+               attrs: Optional[dict] = None):
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = Stage(self.sample_size)
+            stage.add(seconds, error)
+            if self._trace is not None:
+                line = {"name": name, "start": round(wall or time.time() - seconds, 6),
+                        "ms": round(seconds * 1000, 3), "error": error, "thread": threading.current_thread().name}
+                if attrs:
+                    line["attrs"] = attrs
+                self._trace.write(json.dumps(line, default=str) + "\n")
+
+    def leads_per_minute(self) -> float:
+        minutes = (time.monotonic() - self.started) / 60
+        return self.counters.get("leads_processed", 0) / minutes if minutes > 0 else 0.0
+
+    def summary(self) -> str:
+        if not self.enabled:
+            return "off"
+        with self._lock:
+            stages = sorted(self.stages.items(), key=lambda item: -item[1].total)
+            counters = sorted(self.counters.items())
+        elapsed = time.monotonic() - self.started
+        lines = [f"{elapsed:.1f}s elapsed, {self.leads_per_minute():.1f} leads/min"]
+        for name, stage in stages:
+            errors = f", {stage.errors} errors" if stage.errors else ""
+            lines.append(f"  {name}: {stage.count}x, p50 {stage.percentile(50) * 1000:.0f}ms, "
+                         f"p95 {stage.percentile(95) * 1000:.0f}ms, max {stage.max * 1000:.0f}ms, "
+                         f"total {stage.total:.1f}s{errors}")
+        if counters:
+            lines.append("  counters: " + ", ".join(f"{name}={value:g}" for name, value in counters))
+        return "\n".join(lines)
+
+    def prometheus(self) -> str:
+        """Current state in Prometheus text exposition format."""
+        out = []
+        with self._lock:
+            for name, stage in sorted(self.stages.items()):
+                metric = "leadgen_" + _metric_name(name) + "_seconds"
+                out.append(f"# TYPE {metric} summary")
+                for quantile in (0.5, 0.95):
+                    out.append(f'{metric}{{quantile="{quantile}"}} {stage.percentile(quantile * 100):.6f}')
+                out.append(f"{metric}_sum {stage.total:.6f}")
+                out.append(f"{metric}_count {stage.count}")
+            for name, value in sorted(self.counters.items()):
+                metric = "leadgen_" + _metric_name(name) + "_total"
+                out.append(f"# TYPE {metric} counter")
+                out.append(f"{metric} {value:g}")
+        out.append("# TYPE leadgen_leads_per_minute gauge")
+        out.append(f"leadgen_leads_per_minute {self.leads_per_minute():.3f}")
+        return "\n".join(out) + "\n"
+
+    def serve(self, port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[int]:
+        """Starts the /metrics endpoint in a background thread. Returns the bound port."""
+        if not self.enabled or self._server is not None:
+            return None
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server.server_address[1]
+
+    def close(self):
+        """Stops the endpoint and flushes the trace file."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+_metrics: Optional[Metrics] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """Returns the process-wide metrics, creating them on first use."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
+
+
+def set_metrics(metrics: Optional[Metrics]):
+    """Swaps the process-wide metrics (tests and benchmarks)."""
+    global _metrics
+    with _metrics_lock:
+        _metrics = metrics
+
+
+def span(name: str, **attrs):
+    return get_metrics().span(name, **attrs)
+
+
+def count(name: str, value: float = 1):
+    get_metrics().count(name, value)
+
+
+def timed(name: str):
+    """Decorator that times each call under `name` with the process-wide metrics."""
+    def decorate(func):
+        if not get_metrics().enabled:
+            return func
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with get_metrics().span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_metrics().span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def metrics_summary() -> str:
+    return get_metrics().summary()
@@ -1,6 +1,9 @@
 import os
-import google.generativeai as genai
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional
 from supabase_client import create_client, SupabaseClient as Client
+from llm_router import get_router
+from metrics import timed
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,13 +13,10 @@ url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
 supabase: Client = create_client(url, key)
 
-# Initialize Gemini
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-from groq import Groq
-
-# Initialize Groq client
-groq_client = Groq(api_key=os.getenv("GROQ_API_KEY")) if os.getenv("GROQ_API_KEY") else None
+# Bump when the email prompt changes so cached drafts for the old one are not reused
+EMAIL_PROMPT_VERSION = "email-v1"
 
+@timed("llm.email")
 def generate_email(lead_data: dict) -> Optional[str]:
     """
     Generates a personalized cold email (<125 words) using Gemini (primary) or Groq (fallback).
@@ -40,54 +40,76 @@ def generate_email(lead_data: dict) -> Optional[str]:
     Output only the email body.
     """
 
-    # 1. Try Gemini
-    try:
-        model = genai.GenerativeModel('gemini-1.5-pro')
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        print(f" [!] Email Generation (Gemini) Failed: {e}")
+    # Gemini first, Groq as fallback, with rate limits and circuit breakers
+    email, _ = get_router().complete(prompt, EMAIL_PROMPT_VERSION)
+    if not email:
+        print(" [!] Email Generation failed on both engines.")
+        return None
+    return email.strip()
 
-    # 2. Try Groq (Fallback)
-    try:
-        if groq_client:
-            print(" [!] Switching to Groq for email generation...")
-            chat_completion = groq_client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="llama-3.3-70b-versatile",
-            )
-            return chat_completion.choices[0].message.content.strip()
-        else:
-             print(" [!] Groq client not available for fallback.")
-    except Exception as e:
-        print(f" [!] Email Generation (Groq) Failed: {e}")
-        
-    return None
+def build_lead_update(analysis_data: dict, email_draft: str) -> dict:
+    """Columns written when a lead has been analyzed and drafted."""
+    return {
+        "problem_identified": analysis_data.get("problem"),
+        "ai_solution_idea": analysis_data.get("ai_solution"),
+        "email_draft": email_draft,
+        # We preserve original engine_used regarding discovery, 
+        # but maybe we should log intelligence engine too? 
+        # The schema has one 'engine_used'. We can append or overwrite.
+        # Let's overwrite or keep it simple.
+    }
 
-def update_lead_record(lead_id: int, analysis_data: dict, email_draft: str):
-    """Updates the existing lead record with analysis and email draft."""
+def update_lead_record(lead_id: int, analysis_data: dict, email_draft: str,
+                       extra_fields: Optional[dict] = None) -> bool:
+    """Updates the existing lead record with analysis and email draft. Returns True on success."""
     try:
-        data = {
-            "problem_identified": analysis_data.get("problem"),
-            "ai_solution_idea": analysis_data.get("ai_solution"),
-            "email_draft": email_draft,
-            "status": "processed",
-            # We preserve original engine_used regarding discovery, 
-            # but maybe we should log intelligence engine too? 
-            # The schema has one 'engine_used'. We can append or overwrite.
-            # Let's overwrite or keep it simple.
-        }
+        data = {**build_lead_update(analysis_data, email_draft), **(extra_fields or {}), "status": "processed",
+                "processed_at": datetime.now(timezone.utc).isoformat()}
         
-        supabase.table("leads").update(data).eq("id", lead_id).execute()
+        response = supabase.table("leads").update(data).eq("id", lead_id).execute()
+        if response.error:
+            print(f" [!] Database Update Error: {response.error}")
+            return False
         print(f" [+] Lead {lead_id} updated with analysis and draft.")
+        return True
     except Exception as e:
         print(f" [!] Database Update Error: {e}")
+        return False
+
+# Columns the analysis and email steps read; skips large text like email_draft
+LEAD_COLUMNS = "id,niche,location,company_name,website_url,rating,review_count"
+
+def iter_discovered_leads(limit: Optional[int] = None) -> Iterator[dict]:
+    """Streams leads with status 'discovered' page by page, oldest first. Raises on a failed page."""
+    query = supabase.table("leads").select(LEAD_COLUMNS).eq("status", "discovered")
+    if limit is not None:
+        query = query.limit(limit)
+    return query.paginate()
+
+# Plus what a refresh compares against
+REFRESH_COLUMNS = LEAD_COLUMNS + ",content_hash,http_etag,http_last_modified"
+
+def iter_stale_leads(older_than_days: float, limit: Optional[int] = None) -> Iterator[dict]:
+    """Streams processed leads not checked for changes in `older_than_days` (or never)."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=older_than_days)).isoformat()
+    query = (supabase.table("leads").select(REFRESH_COLUMNS).eq("status", "processed")
+             .or_(f"checked_at.is.null,checked_at.lt.{cutoff}"))
+    if limit is not None:
+        query = query.limit(limit)
+    return query.paginate()
+
+def mark_lead_checked(lead_id: int, fields: dict) -> bool:
+    """Records a change check that found nothing new (check time, validators, fingerprint)."""
+    response = supabase.table("leads").update(fields).eq("id", lead_id).execute()
+    if response.error:
+        print(f" [!] Database Update Error: {response.error}")
+        return False
+    return True
 
 def get_discovered_leads(limit: int):
     """Fetches leads with status 'discovered' from Supabase."""
     try:
-        response = supabase.table("leads").select("*").eq("status", "discovered").limit(limit).execute()
-        return response.data
+        return list(iter_discovered_leads(limit))
     except Exception as e:
         print(f" [!] Error fetching discovered leads: {e}")
         return []
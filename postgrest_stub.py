@@ -0,0 +1,275 @@
+import json
+import sqlite3
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qsl, urlparse
+
+# Enough of PostgREST's dialect for supabase_client.py, backed by SQLite
+OPERATORS = {"eq": "=", "neq": "!=", "lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict"}
+
+LEADS_TABLE = """
+create table leads (
+  id integer primary key autoincrement,
+  created_at text default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+  niche text,
+  location text,
+  company_name text,
+  website_url text not null unique,
+  rating numeric,
+  review_count integer,
+  problem_identified text,
+  ai_solution_idea text,
+  email_draft text,
+  engine_used text,
+  status text default 'discovered',
+  worker_id text,
+  lease_expires_at text,
+  attempts integer default 0 not null,
+  last_error text,
+  discovered_at text default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+  processed_at text,
+  content_hash text,
+  checked_at text,
+  http_etag text,
+  http_last_modified text
+)
+"""
+
+
+def _split(text: str) -> List[str]:
+    """Splits a PostgREST list on top-level commas, respecting parentheses and quotes."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return value
+
+
+def _condition(column: str, expression: str) -> Tuple[str, list]:
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    op, _, value = expression.partition(".")
+    if op in OPERATORS:
+        sql, args = f'"{column}" {OPERATORS[op]} ?', [value]
+    elif op == "in":
+        values = [_unquote(v) for v in _split(value.strip("()"))]
+        sql, args = f'"{column}" in ({",".join("?" * len(values)) or "null"})', values
+    elif op == "is":
+        sql, args = f'"{column}" is {"null" if value == "null" else "?"}', [] if value == "null" else [value == "true"]
+    else:
+        raise ValueError(f"unsupported operator: {op}")
+    return (f"not ({sql})" if negate else sql), args
+
+
+def _logic(joiner: str, body: str) -> Tuple[str, list]:
+    clauses, args = [], []
+    for item in _split(body.strip()[1:-1]):
+        if item.startswith(("and(", "or(")):
+            name, _, rest = item.partition("(")
+            sql, item_args = _logic(name, "(" + rest)
+        else:
+            column, _, expression = item.partition(".")
+            sql, item_args = _condition(column, expression)
+        clauses.append(sql)
+        args.extend(item_args)
+    return "(" + f" {joiner} ".join(clauses) + ")", args
+
+
+class PostgrestStub:
+    """
+    Local stand-in for a Supabase/PostgREST endpoint: GET with filters,
+    `or=`/`and=` logic, ordering and paging; POST upserts; PATCH updates with
+    `Prefer: return=representation|minimal`. Each request runs under one lock,
+    so a conditional PATCH is as atomic as it is in Postgres. Counts requests
+    per method so tests and benchmarks can see how chatty a client is.
+
+        stub = PostgrestStub().start()
+        client = create_client(stub.url, "test-key")
+        ...
+        stub.stop()
+    """
+
+    def __init__(self, schema: str = LEADS_TABLE, port: int = 0):
+        self.db = sqlite3.connect(":memory:", check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(schema)
+        self.lock = threading.Lock()
+        self.requests: Counter = Counter()
+        self.rows_returned = 0
+        self.bytes_returned = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub._handle(self, "GET")
+
+            def do_POST(self):
+                stub._handle(self, "POST")
+
+            def do_PATCH(self):
+                stub._handle(self, "PATCH")
+
+            def do_DELETE(self):
+                stub._handle(self, "DELETE")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "PostgrestStub":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def rows(self, table: str = "leads") -> List[dict]:
+        with self.lock:
+            return [dict(row) for row in self.db.execute(f'select * from "{table}" order by id')]
+
+    def insert(self, table: str, rows: List[dict]):
+        with self.lock:
+            for row in rows:
+                columns = ",".join(f'"{c}"' for c in row)
+                self.db.execute(f'insert into "{table}" ({columns}) values ({",".join("?" * len(row))})', list(row.values()))
+            self.db.commit()
+
+    def _where(self, params: List[Tuple[str, str]]) -> Tuple[str, list]:
+        clauses, args = [], []
+        for key, value in params:
+            if key in RESERVED_PARAMS:
+                continue
+            if key in ("or", "and"):
+                sql, item_args = _logic(key, value)
+            else:
+                sql, item_args = _condition(key, value)
+            clauses.append(sql)
+            args.extend(item_args)
+        return (" where " + " and ".join(clauses)) if clauses else "", args
+
+    def _select(self, table: str, params: List[Tuple[str, str]]) -> List[dict]:
+        options = dict(params)
+        columns = options.get("select", "*")
+        columns = "*" if columns == "*" else ",".join(f'"{c.strip()}"' for c in columns.split(","))
+        where, args = self._where(params)
+        sql = f'select {columns} from "{table}"{where}'
+        if "order" in options:
+            terms = []
+            for term in options["order"].split(","):
+                column, _, direction = term.partition(".")
+                terms.append(f'"{column}" {"desc" if direction.startswith("desc") else "asc"}')
+            sql += " order by " + ", ".join(terms)
+        sql += f" limit {int(options.get('limit', -1))} offset {int(options.get('offset', 0))}"
+        return [dict(row) for row in self.db.execute(sql, args)]
+
+    def _upsert(self, table: str, params: List[Tuple[str, str]], rows: List[dict], merge: bool) -> List[dict]:
+        conflict = dict(params).get("on_conflict")
+        written = []
+        for row in rows:
+            columns = ",".join(f'"{c}"' for c in row)
+            sql = f'insert into "{table}" ({columns}) values ({",".join("?" * len(row))})'
+            if merge and conflict:
+                updates = ",".join(f'"{c}"=excluded."{c}"' for c in row if c != conflict)
+                sql += f' on conflict("{conflict}") do ' + (f"update set {updates}" if updates else "nothing")
+            sql += " returning *"
+            written.extend(dict(r) for r in self.db.execute(sql, list(row.values())).fetchall())
+        return written
+
+    def _update(self, table: str, params: List[Tuple[str, str]], data: dict) -> List[dict]:
+        where, args = self._where(params)
+        assignments = ",".join(f'"{c}"=?' for c in data)
+        sql = f'update "{table}" set {assignments}{where} returning *'
+        return [dict(r) for r in self.db.execute(sql, list(data.values()) + args).fetchall()]
+
+    def _delete(self, table: str, params: List[Tuple[str, str]]) -> List[dict]:
+        where, args = self._where(params)
+        return [dict(r) for r in self.db.execute(f'delete from "{table}"{where} returning *', args).fetchall()]
+
+    @staticmethod
+    def _project(rows: List[dict], params: List[Tuple[str, str]]) -> List[dict]:
+        # On writes, select= shapes the returned representation
+        columns = dict(params).get("select", "*")
+        if columns == "*":
+            return rows
+        keep = [c.strip() for c in columns.split(",")]
+        return [{c: row.get(c) for c in keep} for row in rows]
+
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str):
+        parsed = urlparse(handler.path)
+        table = parsed.path.rstrip("/").rsplit("/", 1)[-1]
+        params = parse_qsl(parsed.query, keep_blank_values=True)
+        prefer = handler.headers.get("Prefer", "")
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = json.loads(handler.rfile.read(length) or b"null") if length else None
+
+        self.requests[method] += 1
+        status, rows = 200, []
+        try:
+            with self.lock:
+                if method == "GET":
+                    rows = self._select(table, params)
+                elif method == "POST":
+                    rows = self._upsert(table, params, body if isinstance(body, list) else [body],
+                                        "merge-duplicates" in prefer)
+                    status = 201
+                elif method == "PATCH":
+                    rows = self._update(table, params, body or {})
+                else:
+                    rows = self._delete(table, params)
+                self.db.commit()
+        except (sqlite3.Error, ValueError) as e:
+            self.db.rollback()
+            payload = json.dumps({"message": str(e)}).encode()
+            handler.send_response(400)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(payload)))
+            handler.end_headers()
+            handler.wfile.write(payload)
+            return
+
+        if method != "GET" and "return=representation" not in prefer:
+            handler.send_response(204 if status == 200 else status)
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+        if method != "GET":
+            rows = self._project(rows, params)
+        self.rows_returned += len(rows)
+        self.bytes_returned += len(json.dumps(rows))
+        payload = json.dumps(rows).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
@@ -1,57 +1,98 @@
+import argparse
 import asyncio
-from tqdm import tqdm
-from pipeline import get_discovered_leads, generate_email, update_lead_record
-from intelligence import analyze_site
+from pipeline import iter_discovered_leads, iter_stale_leads, supabase
+from fetcher import tier_stats
+from intelligence import close_intelligence
+from resource_policy import policy_stats
+from condense import condense_stats
+from crawler import crawl_stats
+from lead_engine import LeadEngine
+from llm_cache import get_llm_cache
+from llm_router import get_router
+from metrics import get_metrics, metrics_summary, METRICS_HOST, METRICS_PORT
+from work_queue import LeadWorkQueue
+from refresh import refresh_stats, REFRESH_AFTER_DAYS
+from supabase_client import PaginationError
 
-async def process_existing_leads():
+async def process_existing_leads(limit=50):
     print("Fetching discovered leads from database...")
-    leads = get_discovered_leads(50) # Process up to 50
-    
-    if not leads:
-        print("No discovered leads found.")
-        return
-
-    print(f"Found {len(leads)} leads to process.")
-    
-    success_count = 0
-    failure_count = 0
-    
-    with tqdm(total=len(leads), desc="Processing Leads") as pbar:
-        for lead in leads:
-            try:
-                print(f"\nProcessing: {lead['company_name']}")
-                # Analyze
-                analysis = await analyze_site(lead['website_url'], lead['niche'] or "business")
-                
-                if analysis:
-                    # Generate Email
-                    lead_context = {
-                        **lead,
-                        **analysis
-                    }
-                    email_draft = generate_email(lead_context)
-                    
-                    if email_draft:
-                        # Save
-                        update_lead_record(lead['id'], analysis, email_draft)
-                        success_count += 1
-                        print(" [V] Success.")
-                    else:
-                        print(f" [!] Failed to draft email for {lead['company_name']}")
-                        failure_count += 1
-                else:
-                    print(f" [!] Analysis failed for {lead['company_name']}")
-                    failure_count += 1
-                    
-            except Exception as e:
-                print(f" [!] Error processing lead {lead.get('id')}: {e}")
-                failure_count += 1
-                
-            pbar.update(1)
-
-    print("\n=== Processing Complete ===")
+    print_summary(await process_stream(iter_discovered_leads(limit), LeadEngine(), limit))
+
+async def refresh_leads(limit=None, older_than_days=REFRESH_AFTER_DAYS):
+    """Re-checks processed leads and re-analyzes only the ones whose site changed."""
+    print(f"Checking processed leads not checked in {older_than_days:g} days...")
+    engine = LeadEngine(refresh=True)
+    print_summary(await process_stream(iter_stale_leads(older_than_days, limit), engine, limit))
+    print(f"Unchanged (skipped): {engine.unchanged_count}")
+    print(f"Change detection: {refresh_stats()}")
+
+async def process_stream(leads, engine, limit, niche=None):
+    """Feeds `leads` to the engine as pages arrive; returns its (successes, failures)."""
+    async def produce(queue):
+        # Leads arrive a page at a time, so work starts on the first row
+        found = 0
+        try:
+            while (lead := await asyncio.to_thread(next, leads, None)) is not None:
+                found += 1
+                await queue.put(lead)
+        except PaginationError as e:
+            # Leads already queued are still processed and reported
+            print(f" [!] Error fetching leads: {e}")
+        print(f"Found {found} leads to process." if found else "No leads found to process.")
+
+    try:
+        return await engine.stream(produce, niche=niche, expected=limit or 0)
+    finally:
+        await close_intelligence()
+
+async def process_queued_leads(limit=None, follow=False, worker_id=None):
+    """Claims leads under a lease, so this can run in several processes or on several machines at once."""
+    work_queue = LeadWorkQueue(supabase, worker_id=worker_id)
+    print(f"Claiming discovered leads as {work_queue.worker_id}...")
+
+    engine = LeadEngine(work_queue=work_queue)
+    try:
+        stats = await engine.run_queue(limit=limit, follow=follow)
+    finally:
+        await close_intelligence()
+
+    print_summary(stats)
+    print(f"Work queue: {work_queue.stats()}")
+
+def print_summary(stats, title="Processing Complete"):
+    """Final report for a run; `stats` is the (successes, failures) pair LeadEngine returns."""
+    success_count, failure_count = stats
+    print(f"\n=== {title} ===")
+    print(f"Processed: {success_count + failure_count}")
     print(f"Successes: {success_count}")
     print(f"Failures:  {failure_count}")
+    print(f"LLM cache: {get_llm_cache().stats()}")
+    print(f"LLM routing: {get_router().stats()}")
+    print(f"Fetch tiers: {tier_stats()}")
+    print(f"Resource blocking: {policy_stats()}")
+    print(f"Site crawl: {crawl_stats()}")
+    print(f"Content condensing: {condense_stats()}")
+    print(f"Stage timings: {metrics_summary()}")
 
 if __name__ == "__main__":
-    asyncio.run(process_existing_leads())
+    parser = argparse.ArgumentParser(description="Analyze and draft emails for discovered leads.")
+    parser.add_argument("--queue", action="store_true", help="Claim leads with a lease so several workers can run at once")
+    parser.add_argument("--limit", type=int, default=None, help="Leads to process (default 50; no limit with --queue or --refresh)")
+    parser.add_argument("--follow", action="store_true", help="Keep polling for newly discovered leads (--queue only)")
+    parser.add_argument("--refresh", action="store_true", help="Re-check processed leads; only changed sites are re-analyzed")
+    parser.add_argument("--older-than", type=float, default=REFRESH_AFTER_DAYS, help="Days since a lead's last check before --refresh revisits it")
+    parser.add_argument("--worker-id", default=None, help="Name for this worker's leases (default: host-pid-random)")
+    args = parser.parse_args()
+
+    if METRICS_PORT:
+        print(f"Metrics: http://{METRICS_HOST}:{get_metrics().serve(METRICS_PORT)}/metrics")
+    try:
+        if args.refresh:
+            asyncio.run(refresh_leads(args.limit, args.older_than))
+        elif args.queue:
+            asyncio.run(process_queued_leads(args.limit, args.follow, args.worker_id))
+        else:
+            asyncio.run(process_existing_leads(args.limit if args.limit is not None else 50))
+    finally:
+        # Flushes the span trace file, if one is being written
+        get_metrics().close()
@@ -0,0 +1,118 @@
+import os
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from condense import condense_page, content_fingerprint
+from extraction import extract_page
+from fetcher import fetch_html_conditional, looks_complete, TIER_HTTP, TIER_BROWSER
+from intelligence import read_page, read_site
+
+# Refresh Configuration
+# Processed leads last checked this many days ago are due for a refresh
+REFRESH_AFTER_DAYS = float(os.getenv("REFRESH_AFTER_DAYS", "7"))
+
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+FAILED = "failed"
+
+refresh_counts: Counter = Counter()
+
+
+class SiteCheck:
+    """
+    Outcome of reading a lead's site: whether it changed, the condensed
+    content to analyze when it did, and the columns to store either way
+    (fingerprint, HTTP validators, check time).
+    """
+
+    def __init__(self, outcome: str, content: Optional[str] = None, fields: Optional[Dict[str, object]] = None):
+        self.outcome = outcome
+        self.content = content
+        self.fields = fields or {}
+
+
+def _checked_now() -> Dict[str, object]:
+    return {"checked_at": datetime.now(timezone.utc).isoformat()}
+
+
+def _validator_fields(validators: Dict[str, str]) -> Dict[str, object]:
+    return {f"http_{key}": value for key, value in validators.items()}
+
+
+async def _read_site_from(url: str, html: Optional[str]) -> Optional[Tuple[str, dict]]:
+    """
+    read_site, reusing the homepage HTML a conditional GET already downloaded:
+    complete HTML is parsed as is, and an incomplete one goes straight to the
+    browser instead of being fetched over plain HTTP a second time.
+    """
+    if not html:
+        return await read_site(url)
+    text, outline = await extract_page(html)
+    if looks_complete(html, text):
+        home = (TIER_HTTP, html, text, outline)
+    else:
+        home = await read_page(url, TIER_BROWSER)
+        if home is None:
+            return None
+    return await read_site(url, home)
+
+
+async def read_lead_site(lead: dict) -> SiteCheck:
+    """
+    Unconditional read for first-time processing; records the fingerprint
+    and the homepage's HTTP validators for later refreshes.
+    """
+    url = lead['website_url']
+    _, html, validators = await fetch_html_conditional(url)
+    site = await _read_site_from(url, html)
+    if site is None:
+        return SiteCheck(FAILED)
+    text, outline = site
+    fields = {**_checked_now(), **_validator_fields(validators), "content_hash": content_fingerprint(text)}
+    return SiteCheck(CHANGED, condense_page(url, text, outline), fields)
+
+
+async def check_site(lead: dict) -> SiteCheck:
+    """
+    Cheapest proof that a processed lead's site is unchanged: a conditional
+    GET of the homepage (304 Not Modified ends it there), else the
+    fingerprint of the freshly read pages against the one stored last time.
+    Only a changed site is condensed for the models. Leads processed before
+    fingerprints were stored have nothing to compare against: their
+    fingerprint and validators are stored and they count as unchanged, so
+    only a real mismatch triggers re-analysis.
+    """
+    url = lead['website_url']
+    not_modified, html, validators = await fetch_html_conditional(
+        url, lead.get("http_etag"), lead.get("http_last_modified"))
+    fields = {**_checked_now(), **_validator_fields(validators)}
+    if not_modified:
+        refresh_counts["not_modified"] += 1
+        return SiteCheck(UNCHANGED, fields=fields)
+
+    site = await _read_site_from(url, html)
+    if site is None:
+        refresh_counts["failed"] += 1
+        return SiteCheck(FAILED)
+
+    text, outline = site
+    fields["content_hash"] = content_fingerprint(text)
+    if not lead.get("content_hash"):
+        refresh_counts["baselined"] += 1
+        return SiteCheck(UNCHANGED, fields=fields)
+    if fields["content_hash"] == lead["content_hash"]:
+        refresh_counts["same_text"] += 1
+        return SiteCheck(UNCHANGED, fields=fields)
+    refresh_counts["changed"] += 1
+    return SiteCheck(CHANGED, condense_page(url, text, outline), fields)
+
+
+def refresh_stats() -> str:
+    checked = sum(refresh_counts.values())
+    if not checked:
+        return "no sites checked"
+    unchanged = refresh_counts["not_modified"] + refresh_counts["same_text"]
+    return (f"{checked} sites checked, {unchanged} unchanged ({refresh_counts['not_modified']} by HTTP 304, "
+            f"{refresh_counts['same_text']} by text fingerprint), {refresh_counts['changed']} changed, "
+            f"{refresh_counts['baselined']} fingerprinted for the first time, {refresh_counts['failed']} failed")
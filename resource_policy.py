@@ -0,0 +1,101 @@
+import os
+from collections import Counter
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+# Policy Selection ("off" disables interception)
+SITE_RESOURCE_POLICY = os.getenv("SITE_RESOURCE_POLICY", "text-only")
+DISCOVERY_RESOURCE_POLICY = os.getenv("DISCOVERY_RESOURCE_POLICY", "maps-minimal")
+
+# Analytics / ad hosts that never contribute visible content
+TRACKER_DOMAINS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googleadservices.com",
+    "googlesyndication.com",
+    "doubleclick.net",
+    "adservice.google.com",
+    "facebook.net",
+    "connect.facebook.net",
+    "hotjar.com",
+    "clarity.ms",
+    "segment.com",
+    "segment.io",
+    "mixpanel.com",
+    "amplitude.com",
+    "fullstory.com",
+    "newrelic.com",
+    "nr-data.net",
+    "bat.bing.com",
+    "ads-twitter.com",
+    "analytics.tiktok.com",
+    "snap.licdn.com",
+]
+
+
+class ResourcePolicy:
+    """
+    A `page.route` filter: aborts requests for unneeded resource types and
+    known tracker hosts, and keeps per-policy counts of what it let through.
+    """
+
+    def __init__(self, name: str, blocked_types: Iterable[str], blocked_domains: Iterable[str] = TRACKER_DOMAINS):
+        self.name = name
+        self.blocked_types = set(blocked_types)
+        self.blocked_domains = list(blocked_domains)
+        self.stats: Counter = Counter()
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if resource_type in self.blocked_types:
+            return True
+        host = urlparse(url).hostname or ""
+        return any(host == domain or host.endswith(f".{domain}") for domain in self.blocked_domains)
+
+    async def handle(self, route):
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self.stats["blocked"] += 1
+            self.stats[f"blocked:{request.resource_type}"] += 1
+            try:
+                await route.abort()
+            except Exception:
+                pass
+        else:
+            self.stats["allowed"] += 1
+            try:
+                await route.continue_()
+            except Exception:
+                pass
+
+    def summary(self) -> str:
+        return f"{self.name}: {self.stats['allowed']} allowed, {self.stats['blocked']} blocked"
+
+
+POLICIES: Dict[str, ResourcePolicy] = {
+    # Site analysis only needs the DOM text; scripts stay so JS-rendered sites still render
+    "text-only": ResourcePolicy("text-only", ["image", "media", "font", "stylesheet", "imageset", "texttrack"]),
+    # Maps needs its scripts and styles to lay out the feed, but not tiles, photos or fonts
+    "maps-minimal": ResourcePolicy("maps-minimal", ["image", "media", "font", "imageset"]),
+}
+
+
+def get_policy(name: Optional[str]) -> Optional[ResourcePolicy]:
+    if not name or name == "off":
+        return None
+    if name not in POLICIES:
+        print(f" [!] Unknown resource policy '{name}', loading everything.")
+        return None
+    return POLICIES[name]
+
+
+async def apply_policy(target, name: Optional[str]) -> Optional[ResourcePolicy]:
+    """Installs the named policy on a Playwright page or context. Returns it, or None when disabled."""
+    policy = get_policy(name)
+    if policy is not None:
+        await target.route("**/*", policy.handle)
+    return policy
+
+
+def policy_stats() -> str:
+    used = [p.summary() for p in POLICIES.values() if p.stats]
+    return "; ".join(used) or "none"
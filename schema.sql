@@ -1,4 +1,4 @@
-create table leads (
+create table if not exists leads (
   id bigint generated by default as identity primary key,
   created_at timestamp with time zone default timezone('utc'::text, now()) not null,
   niche text,
@@ -13,3 +13,27 @@ create table leads (
   engine_used text,
   status text default 'discovered'
 );
+
+-- Lease columns for process_leads.py --queue (safe to re-run on an existing table)
+alter table leads add column if not exists worker_id text;
+alter table leads add column if not exists lease_expires_at timestamp with time zone;
+alter table leads add column if not exists attempts integer default 0 not null;
+alter table leads add column if not exists last_error text;
+
+-- Stage timestamps and the page fingerprint used to skip unchanged sites
+alter table leads add column if not exists discovered_at timestamp with time zone;
+update leads set discovered_at = created_at where discovered_at is null;
+alter table leads alter column discovered_at set default timezone('utc'::text, now());
+alter table leads add column if not exists processed_at timestamp with time zone;
+alter table leads add column if not exists content_hash text;
+
+-- Partial indexes: only unfinished leads are polled, so processed rows never bloat them
+drop index if exists leads_claim_idx;
+create index if not exists leads_unprocessed_idx on leads (status, id) where status in ('discovered', 'processing');
+create index if not exists leads_lease_idx on leads (lease_expires_at) where status = 'processing';
+
+-- Change detection for process_leads.py --refresh
+alter table leads add column if not exists checked_at timestamp with time zone;
+alter table leads add column if not exists http_etag text;
+alter table leads add column if not exists http_last_modified text;
+create index if not exists leads_refresh_idx on leads (checked_at) where status = 'processed';
@@ -0,0 +1,81 @@
+import time
+from collections import deque
+from typing import Deque, Iterable, List, Optional, Tuple
+
+
+class Shard:
+    """One (niche, location) Maps query and what it yielded."""
+
+    def __init__(self, niche: str, location: str):
+        self.niche = niche
+        self.location = location
+        self.worker: Optional[int] = None
+        self.outcome = "pending"
+        self.listings = 0
+        self.leads = 0
+        self.scrolls = 0
+        self.started: Optional[float] = None
+        self.seconds = 0.0
+
+    @property
+    def query(self) -> str:
+        return f"{self.niche} in {self.location}"
+
+    def start(self, worker: int):
+        self.worker = worker
+        self.outcome = "running"
+        self.started = time.monotonic()
+
+    def finish(self, outcome: str):
+        self.outcome = outcome
+        if self.started is not None:
+            self.seconds = time.monotonic() - self.started
+
+    def summary(self) -> str:
+        rate = f"{self.leads / self.listings:.0%}" if self.listings else "-"
+        return (f"{self.query}: {self.leads} leads from {self.listings} listings ({rate}), "
+                f"{self.scrolls} scrolls, {self.seconds:.1f}s, {self.outcome}")
+
+
+class ShardScheduler:
+    """
+    Deals shards round-robin onto one deque per worker. A worker takes from
+    the front of its own deque and, once that is empty, steals from the back
+    of the fullest other deque, so no browser context sits idle while
+    another still has a backlog.
+    """
+
+    def __init__(self, shards: Iterable[Shard], workers: int):
+        self.shards: List[Shard] = list(shards)
+        self.queues: List[Deque[Shard]] = [deque() for _ in range(max(1, workers))]
+        for index, shard in enumerate(self.shards):
+            self.queues[index % len(self.queues)].append(shard)
+        self.steals = 0
+
+    def next(self, worker: int) -> Optional[Shard]:
+        own = self.queues[worker]
+        if own:
+            return own.popleft()
+        victim = max(self.queues, key=len)
+        if not victim:
+            return None
+        self.steals += 1
+        return victim.pop()
+
+    def skip_remaining(self):
+        """Marks shards nobody got to (e.g. the global limit was reached first)."""
+        for queue in self.queues:
+            while queue:
+                queue.popleft().finish("skipped")
+
+
+def make_shards(pairs: Iterable[Tuple[str, str]]) -> List[Shard]:
+    seen = set()
+    shards = []
+    for niche, location in pairs:
+        key = (niche.strip().lower(), location.strip().lower())
+        if key in seen:
+            continue
+        seen.add(key)
+        shards.append(Shard(niche.strip(), location.strip()))
+    return shards
@@ -10,16 +10,18 @@ def show_leads():
     supabase = create_client(url, key)
     
     try:
-        # Fetch all leads
-        response = supabase.table("leads").select("*").execute()
-        leads = response.data
+        # Stream leads a page at a time; only the columns printed below
+        leads = supabase.table("leads").select("id,status,company_name,website_url,email_draft").paginate()
         
-        print(f"\n--- Discovered Leads ({len(leads)}) ---")
+        print("\n--- Discovered Leads ---")
+        count = 0
         for lead in leads:
+            count += 1
             print(f"[{lead.get('status', 'unknown')}] {lead.get('company_name')} - {lead.get('website_url')}")
             if lead.get('email_draft'):
                 print(f"   Draft: {lead.get('email_draft')[:50]}...")
             print("-" * 20)
+        print(f"Total: {count} leads")
             
     except Exception as e:
         print(f"Error fetching leads: {e}")
@@ -1,65 +1,221 @@
+import copy
+import os
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from metrics import span
+
+# Connection Pool Configuration
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "10"))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+SUPABASE_READ_TIMEOUT = float(os.getenv("SUPABASE_READ_TIMEOUT", "30"))
+# Rows fetched per request when paginating
+SUPABASE_PAGE_SIZE = int(os.getenv("SUPABASE_PAGE_SIZE", "1000"))
+
+class PaginationError(RuntimeError):
+    """A page request failed partway through paginate()."""
+
+def _build_headers(key):
+    return {
+        "apikey": key,
+        "Authorization": f"Bearer {key}",
+        "Content-Type": "application/json"
+    }
 
 class SupabaseClient:
-    def __init__(self, url, key):
+    """
+    Minimal PostgREST client. Owns a keep-alive `requests.Session` so queries
+    reuse pooled TCP/TLS connections instead of handshaking every time.
+    """
+    def __init__(self, url, key, pool_size=SUPABASE_POOL_SIZE,
+                 timeout=(SUPABASE_CONNECT_TIMEOUT, SUPABASE_READ_TIMEOUT)):
         self.url = url
         self.key = key
-        self.headers = {
-            "apikey": key,
-            "Authorization": f"Bearer {key}",
-            "Content-Type": "application/json"
-        }
+        self.headers = _build_headers(key)
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
     def table(self, table_name):
-        return SupabaseQueryBuilder(self.url, self.headers, table_name)
+        return SupabaseQueryBuilder(self.url, self.headers, table_name, self.session, self.timeout)
+
+    def close(self):
+        self.session.close()
+
+class AsyncSupabaseClient:
+    """
+    Awaitable twin of SupabaseClient backed by a pooled `httpx.AsyncClient`.
+    Same fluent API, but `execute()` is a coroutine, so DB calls never stall
+    the browser and LLM coroutines sharing the event loop.
+    """
+    def __init__(self, url, key, pool_size=SUPABASE_POOL_SIZE,
+                 timeout=(SUPABASE_CONNECT_TIMEOUT, SUPABASE_READ_TIMEOUT)):
+        self.url = url
+        self.key = key
+        self.headers = _build_headers(key)
+        connect_timeout, read_timeout = timeout
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        )
+
+    def table(self, table_name):
+        return AsyncSupabaseQueryBuilder(self.url, self.headers, table_name, self.http)
+
+    async def aclose(self):
+        await self.http.aclose()
 
 class SupabaseQueryBuilder:
-    def __init__(self, base_url, headers, table_name):
+    def __init__(self, base_url, headers, table_name, session=None, timeout=None):
         self.query_url = f"{base_url}/rest/v1/{table_name}"
         self.headers = headers.copy()
         self.params = {}
         self.json_data = None
         self.method = 'GET'
+        self.session = session or requests
+        self.timeout = timeout
 
     def select(self, columns="*"):
         self.method = 'GET'
-        self.params["select"] = columns
+        # Accepts "id,website_url" or ["id", "website_url"]
+        self.params["select"] = columns if isinstance(columns, str) else ",".join(columns)
         return self
 
     def eq(self, column, value):
         self.params[f"{column}"] = f"eq.{value}"
         return self
         
+    def lt(self, column, value):
+        self.params[f"{column}"] = f"lt.{value}"
+        return self
+
+    def lte(self, column, value):
+        self.params[f"{column}"] = f"lte.{value}"
+        return self
+
+    def gt(self, column, value):
+        self.params[f"{column}"] = f"gt.{value}"
+        return self
+
+    def gte(self, column, value):
+        self.params[f"{column}"] = f"gte.{value}"
+        return self
+
+    def range(self, column, low=None, high=None):
+        """low <= column < high; either bound may be None. Combines with other filters on the same column."""
+        if low is not None:
+            self._and(f"{column}.gte.{low}")
+        if high is not None:
+            self._and(f"{column}.lt.{high}")
+        return self
+
+    def _and(self, condition):
+        # One "and" group per query, so filters on the same column don't overwrite each other
+        existing = self.params.get("and")
+        self.params["and"] = f"({existing[1:-1]},{condition})" if existing else f"({condition})"
+
+    def or_(self, filters):
+        # PostgREST boolean logic, e.g. "(status.eq.discovered,lease_expires_at.lt.2024-01-01)"
+        self.params["or"] = filters if filters.startswith("(") else f"({filters})"
+        return self
+
+    def in_(self, column, values):
+        # PostgREST list syntax; quote every value so commas/parens in URLs survive
+        quoted = ",".join('"' + str(v).replace('\\', '\\\\').replace('"', '\\"') + '"' for v in values)
+        self.params[f"{column}"] = f"in.({quoted})"
+        return self
+
+    def order(self, column, desc=False):
+        self.params["order"] = f"{column}.{'desc' if desc else 'asc'}"
+        return self
+
     def limit(self, count):
         self.params["limit"] = str(count)
         return self
 
-    def upsert(self, data, on_conflict=None):
+    def offset(self, count):
+        self.params["offset"] = str(count)
+        return self
+
+    def _returning(self, returning):
+        """
+        What a write sends back. "minimal" (the default) returns no body, so
+        Postgres doesn't serialize rows (email drafts included) nobody reads;
+        "representation" returns whole rows; a column list such as "id" or
+        ["id", "website_url"] returns just those columns.
+        """
+        if returning == "minimal":
+            return "return=minimal"
+        if returning != "representation":
+            self.params["select"] = returning if isinstance(returning, str) else ",".join(returning)
+        return "return=representation"
+
+    def upsert(self, data, on_conflict=None, returning="minimal"):
         self.method = 'POST'
-        self.headers["Prefer"] = "resolution=merge-duplicates,return=representation"
+        self.headers["Prefer"] = f"resolution=merge-duplicates,{self._returning(returning)}"
         if on_conflict:
             self.params["on_conflict"] = on_conflict
         self.json_data = data
         return self
 
-    def update(self, data):
+    def update(self, data, returning="minimal"):
         self.method = 'PATCH'
-        self.headers["Prefer"] = "return=representation"
+        self.headers["Prefer"] = self._returning(returning)
         self.json_data = data
         return self
 
+    def _page_query(self, key, after, page_size):
+        """A copy of this GET query for the page of rows whose `key` is after `after`."""
+        page = copy.copy(self)
+        page.params = dict(self.params)
+        select = page.params.get("select", "*")
+        if select != "*" and key not in select.split(","):
+            page.params["select"] = f"{select},{key}"
+        if after is not None:
+            page._and(f"{key}.gt.{after}")
+        page.params["order"] = f"{key}.asc"
+        page.params["limit"] = str(page_size)
+        page.params.pop("offset", None)
+        return page
+
+    def paginate(self, page_size=SUPABASE_PAGE_SIZE, key="id"):
+        """
+        Yields the query's rows page by page using keyset pagination on the
+        unique, sortable `key` column (WHERE key > last ORDER BY key LIMIT n),
+        so memory stays flat and deep pages cost the same as the first. Unlike
+        offsets, rows updated out of the filter mid-scan don't shift later
+        pages. An existing limit() caps the total rows yielded.
+        Raises PaginationError if a page request fails.
+        """
+        remaining = int(self.params["limit"]) if "limit" in self.params else None
+        after = None
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            response = self._page_query(key, after, size).execute()
+            if response.error:
+                raise PaginationError(f"Supabase pagination error: {response.error}")
+            rows = response.data or []
+            yield from rows
+            if len(rows) < size:
+                return
+            after = rows[-1][key]
+            if remaining is not None:
+                remaining -= len(rows)
+
     def execute(self):
         try:
-            if self.method == 'GET':
-                response = requests.get(self.query_url, headers=self.headers, params=self.params)
-            elif self.method == 'POST':
-                response = requests.post(self.query_url, headers=self.headers, params=self.params, json=self.json_data)
-            elif self.method == 'PATCH':
-                response = requests.patch(self.query_url, headers=self.headers, params=self.params, json=self.json_data)
-            else:
+            if self.method not in ('GET', 'POST', 'PATCH'):
                 return Response(None, "Unsupported Method")
-                
-            response.raise_for_status()
+
+            with span(f"db.{self.method}"):
+                response = self.session.request(self.method, self.query_url, headers=self.headers,
+                                                params=self.params, json=self.json_data, timeout=self.timeout)
+            try:
+                response.raise_for_status()
+            except requests.HTTPError as e:
+                return Response([], str(e), response.status_code)
             try:
                 data = response.json()
             except ValueError:
@@ -71,10 +227,61 @@ class SupabaseQueryBuilder:
             # print(f"Supabase Request Error: {e}")
             return Response([], str(e))
 
+class AsyncSupabaseQueryBuilder(SupabaseQueryBuilder):
+    def __init__(self, base_url, headers, table_name, http):
+        super().__init__(base_url, headers, table_name)
+        self.http = http
+
+    async def paginate(self, page_size=SUPABASE_PAGE_SIZE, key="id"):
+        """Async twin of SupabaseQueryBuilder.paginate: `async for row in query.paginate()`."""
+        remaining = int(self.params["limit"]) if "limit" in self.params else None
+        after = None
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            response = await self._page_query(key, after, size).execute()
+            if response.error:
+                raise PaginationError(f"Supabase pagination error: {response.error}")
+            rows = response.data or []
+            for row in rows:
+                yield row
+            if len(rows) < size:
+                return
+            after = rows[-1][key]
+            if remaining is not None:
+                remaining -= len(rows)
+
+    async def execute(self):
+        try:
+            if self.method not in ('GET', 'POST', 'PATCH'):
+                return Response(None, "Unsupported Method")
+
+            with span(f"db.{self.method}"):
+                response = await self.http.request(self.method, self.query_url, headers=self.headers,
+                                                   params=self.params, json=self.json_data)
+            if response.status_code >= 400:
+                # Match the requests-style message the sync client surfaces
+                kind = "Client" if response.status_code < 500 else "Server"
+                return Response([], f"{response.status_code} {kind} Error: {response.reason_phrase} for url: {response.url}",
+                                response.status_code)
+            try:
+                data = response.json()
+            except ValueError:
+                data = [] # Handle no content
+
+            return Response(data)
+
+        except Exception as e:
+            return Response([], str(e))
+
 class Response:
-    def __init__(self, data, error=None):
+    def __init__(self, data, error=None, status_code=None):
         self.data = data
         self.error = error
+        # HTTP status of a failed request; None when it never got an answer
+        self.status_code = status_code
 
 def create_client(url, key):
     return SupabaseClient(url, key)
+
+def create_async_client(url, key):
+    return AsyncSupabaseClient(url, key)
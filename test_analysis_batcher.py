@@ -0,0 +1,88 @@
+import asyncio
+import json
+import re
+
+import analysis_batcher
+from analysis_batcher import AnalysisBatcher
+from fakes import StandIn, patched, scratch_llm_cache
+from llm_router import LLMRouter, Provider, set_router
+
+ANALYSIS = {"core_service": "Dentistry", "problem": "No online booking", "ai_solution": "Booking assistant"}
+
+class Analyst:
+    """Stand-in for intelligence's analysis calls; `skip` lead ids are left out of batch answers."""
+
+    def __init__(self, skip=()):
+        self.skip = set(skip)
+        self.batches = []
+        self.singles = 0
+
+    def analyze_batch(self, items):
+        lead_ids = [item["lead_id"] for item in items]
+        self.batches.append(lead_ids)
+        return {i: dict(ANALYSIS) for i in lead_ids if i not in self.skip}
+
+    def analyze_content(self, url, niche, content):
+        self.singles += 1
+        return dict(ANALYSIS)
+
+def batch_all(leads, max_sites, token_budget=12000):
+    async def analyze_all():
+        batcher = AnalysisBatcher(lambda func, *args: asyncio.to_thread(func, *args), token_budget=token_budget,
+                                  max_sites=max_sites, linger=0.05)
+        results = await asyncio.gather(*(batcher.analyze(lead, "dentist", content) for lead, content in leads))
+        return batcher, results
+    return asyncio.run(analyze_all())
+
+def run_batch(analyst, leads, max_sites, token_budget=12000):
+    with patched(analysis_batcher, analyze_batch=analyst.analyze_batch, analyze_content=analyst.analyze_content):
+        return batch_all(leads, max_sites, token_budget)
+
+def leads_for(*ids):
+    return [({"id": i, "website_url": f"https://site{i}.example/"}, f"Family dentistry number {i}.") for i in ids]
+
+def test_batches_are_split_by_site_cap_and_token_budget():
+    analyst = Analyst()
+    batcher, results = run_batch(analyst, leads_for(1, 2, 3, 4, 5), max_sites=2)
+    assert all(r["problem"] == "No online booking" for r in results)
+    # 2 + 2 sites batched, the odd one out sent on its own
+    assert [len(b) for b in analyst.batches] == [2, 2] and analyst.singles == 1 and batcher.batches == 2
+
+    # A budget smaller than two sites sends every site on its own
+    analyst = Analyst()
+    run_batch(analyst, leads_for(6, 7, 8), max_sites=8, token_budget=610)
+    assert analyst.batches == [] and analyst.singles == 3
+
+def test_sites_missing_from_the_answer_are_rerun_alone():
+    analyst = Analyst(skip={"2"})
+    batcher, results = run_batch(analyst, leads_for(1, 2, 3), max_sites=8)
+    assert analyst.batches == [["1", "2", "3"]] and analyst.singles == 1 and batcher.requeued == 1
+    assert all(r["core_service"] == "Dentistry" for r in results)
+
+def test_batched_sites_are_cached_one_by_one():
+    batches = []
+
+    def answer(prompt):
+        lead_ids = re.findall(r"=== SITE lead_id=(\S+)", prompt)
+        batches.append(lead_ids)
+        return json.dumps([{"lead_id": i, **ANALYSIS} for i in lead_ids] if lead_ids else ANALYSIS)
+
+    stand_in = StandIn("stand-in", answer)
+    set_router(LLMRouter(providers=[Provider("gemini", "stand-in", "Stand-in", stand_in, 6000, 10_000_000)]))
+    try:
+        with scratch_llm_cache():
+            batch_all(leads_for(1, 2, 3, 4), max_sites=4)
+            assert batches == [["1", "2", "3", "4"]]
+
+            # A different grouping of the same sites is answered from the cache; only the new site is sent
+            _, results = batch_all(leads_for(3, 1, 5), max_sites=3)
+    finally:
+        set_router(None)
+    assert batches == [["1", "2", "3", "4"], ["5"]] and stand_in.calls == 2
+    assert [r["engine_used"] for r in results] == ["Stand-in"] * 3
+
+if __name__ == "__main__":
+    test_batches_are_split_by_site_cap_and_token_budget()
+    test_sites_missing_from_the_answer_are_rerun_alone()
+    test_batched_sites_are_cached_one_by_one()
+    print("Analysis batcher OK")
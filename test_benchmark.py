@@ -0,0 +1,74 @@
+import json
+
+import httpx
+
+from bench_fixtures import FakeLLM, FakeRateLimit, FixtureServer
+from benchmark import compare_results
+from crawler import pick_links
+from extraction import parse_page
+from intelligence import BatchedSiteAnalysis, FusedLeadResult, SiteAnalysis, parse_llm_json
+from llm_router import is_rate_limited
+from maps_payload import PlaceCollector
+
+def test_fixture_maps_responses_and_sites():
+    fixtures = FixtureServer(businesses=30, latency=0, maps_latency=0).start()
+    try:
+        base = fixtures.maps_url.rsplit("/maps", 1)[0]
+        collector = PlaceCollector()
+        with httpx.Client() as client:
+            assert 'id="searchboxinput"' in client.get(fixtures.maps_url).text
+            pages = [client.get(f"{base}/maps/search/?q=dentist&page={page}").text for page in (0, 1)]
+            assert [collector.ingest(body) for body in pages] == [20, 10]
+
+            # Every fourth website is only in the detail panel, as on Maps
+            business = fixtures.businesses[4]
+            place = collector.lookup(business.place_id, business.name)
+            assert place["website"] is None and place["rating"] == business.rating
+            panel = client.get(f"{base}/maps/place/", params={"id": business.feature_id}).json()
+            assert panel == {"name": business.name, "website": business.url}
+            assert collector.lookup(None, fixtures.businesses[5].name)["website"] == fixtures.businesses[5].url
+
+            home = client.get(business.url)
+            assert home.status_code == 200 and client.get(business.url, headers={"If-None-Match": home.headers["ETag"]}).status_code == 304
+        _, outline = parse_page(home.text)
+        assert [link.rsplit("/", 1)[1] for link in pick_links(business.url, outline["links"], 3)] == ["booking", "contact", "services"]
+        # Sites are spread over several listeners so the per-host crawl limit isn't shared by all of them
+        assert len({b.url.split("/")[2] for b in fixtures.businesses}) == len(fixtures.servers)
+    finally:
+        fixtures.stop()
+
+def test_fake_llm_answers_every_prompt_shape():
+    llm = FakeLLM("gemini", latency=0, jitter=0, rpm=3)
+    analysis = parse_llm_json(llm("Analyze the following website content for a dentist business."))
+    SiteAnalysis.model_validate(analysis)
+    fused = parse_llm_json(llm("You are preparing outreach to Oak Dental, a dentist business.\n"
+                               "Step 2 - Write a cold email to them based on that analysis:"))
+    assert "Oak Dental" in FusedLeadResult.model_validate(fused).email_draft
+    batch = parse_llm_json(llm("=== SITE lead_id=7 (niche: dentist) ===\n=== SITE lead_id=9 (niche: dentist) ==="))
+    assert [BatchedSiteAnalysis.model_validate(entry).lead_id for entry in batch] == ["7", "9"]
+
+    # The fourth call inside a minute is over the fake's own limit
+    try:
+        llm("Write a cold email to Oak Dental (Niche: dentist).")
+        raise AssertionError("expected a 429")
+    except FakeRateLimit as e:
+        assert is_rate_limited(e)
+    assert llm.calls == {"analysis": 1, "fused": 1, "batch": 1, "rate_limited": 1}
+
+def test_compare_flags_regressions_only():
+    baseline = {"stages": {"phase2": {"leads_per_min": 600.0}}, "latency_ms": {"lead.total": {"p50": 500.0, "p95": 900.0}},
+                "db": {"total_requests": 100}, "peak_rss_mb": 120.0}
+    current = json.loads(json.dumps(baseline))
+    current["stages"]["phase2"]["leads_per_min"] = 480.0
+    current["latency_ms"]["lead.total"]["p50"] = 400.0
+    current["db"]["total_requests"] = 105
+    lines = compare_results(baseline, current, tolerance=10)
+    assert len(lines) == 5
+    assert [line.split(":")[0].strip() for line in lines if "regression" in line] == ["phase 2 leads/min"]
+    assert "lead p50 ms: 500 -> 400 (-20.0%)" in lines[1]
+
+if __name__ == "__main__":
+    test_fixture_maps_responses_and_sites()
+    test_fake_llm_answers_every_prompt_shape()
+    test_compare_flags_regressions_only()
+    print("Benchmark OK")
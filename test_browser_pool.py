@@ -0,0 +1,75 @@
+import asyncio
+
+from browser_pool import BrowserPool
+from fakes import FakePlaywright
+
+def make_pool(delay=0.0, **kwargs):
+    pool = BrowserPool(**kwargs)
+    # start() leaves an already-set Playwright alone, so no real browser is ever launched
+    pool._playwright = FakePlaywright(delay)
+    return pool, pool._playwright.chromium
+
+async def browser_of(pool):
+    async with pool.page():
+        return [slot.browser for slot in pool._slots if slot.active][0]
+
+def test_crashed_browser_is_replaced():
+    async def run():
+        pool, chromium = make_pool(size=1)
+        first = await browser_of(pool)
+        assert await browser_of(pool) is first
+        first.crash()
+        second = await browser_of(pool)
+        assert second is not first and pool.launches == 2
+
+        # The old browser's late disconnect event must not mark its replacement as crashed
+        first.crash()
+        assert await browser_of(pool) is second and pool.launches == 2
+    asyncio.run(run())
+
+def test_browser_is_recycled_after_its_page_budget():
+    async def run():
+        pool, chromium = make_pool(size=1, recycle_after=2)
+        browsers = [await browser_of(pool) for _ in range(5)]
+        assert [b.number for b in browsers] == [1, 1, 2, 2, 3] and pool.launches == 3
+        assert not browsers[0].is_connected() and browsers[-1].is_connected()
+    asyncio.run(run())
+
+def test_pages_are_capped_and_contexts_reused():
+    async def run():
+        pool, chromium = make_pool(size=2, max_pages=3)
+        in_use = []
+
+        async def visit():
+            async with pool.page():
+                in_use.append(sum(slot.active for slot in pool._slots))
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(visit() for _ in range(9)))
+        assert max(in_use) <= 3 and all(slot.active == 0 for slot in pool._slots)
+        # Released contexts go back to their browser: nine pages never need more contexts than pages at once
+        assert sum(b.contexts_opened for b in chromium.browsers) <= 3
+        await pool.close()
+        assert not any(b.is_connected() for b in chromium.browsers)
+    asyncio.run(run())
+
+def test_concurrent_acquires_launch_browsers_in_parallel():
+    async def run():
+        pool, chromium = make_pool(delay=0.05, size=2, max_pages=6)
+
+        async def visit():
+            async with pool.page():
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(visit() for _ in range(6)))
+        # Launching one browser doesn't hold the pool lock, so both start at once and no slot launches twice
+        assert pool.launches == 2 and chromium.most_at_once == 2
+        await pool.close()
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    test_crashed_browser_is_replaced()
+    test_browser_is_recycled_after_its_page_budget()
+    test_pages_are_capped_and_contexts_reused()
+    test_concurrent_acquires_launch_browsers_in_parallel()
+    print("Browser pool OK")
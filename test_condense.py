@@ -0,0 +1,83 @@
+import os
+import tempfile
+
+from condense import BoilerplateStats, Condenser, estimate_tokens
+from extraction import parse_page
+
+PAGE = """<html><head><title>{name} Dental</title>
+<meta name="description" content="Family dentistry in Dubai">
+<script src="https://assets.calendly.com/assets/external/widget.js"></script></head>
+<body><div>We use cookies to improve your experience.</div>
+<nav><a href="/">Home</a> <a href="/team">Meet the team</a></nav>
+<h1>Welcome to {name}</h1>
+<ul><li>Teeth whitening from $199</li></ul>
+<a class="btn" href="/book">Book an Appointment</a> <a href="mailto:hello@{name}.ae">Email</a>
+<form><input name="name" placeholder="Your name"><input type="hidden" name="csrf"></form>
+<p>Site built by Acme Web Studio for small businesses everywhere</p>
+{filler}</body></html>"""
+
+def page(name):
+    filler = "\n".join(f"<p>Blog post number {i} about {name} and the many ways people care for their teeth</p>" for i in range(400))
+    return PAGE.format(name=name, filler=filler)
+
+def test_keeps_signals_within_budget():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "stats.json")
+        # A first run learns which lines the sites share and saves that for the next run
+        first = Condenser(token_budget=400, stats=BoilerplateStats.load(path, warmup_sites=3))
+        for name in ["pearl", "bright", "smile"]:
+            text, outline = parse_page(page(name))
+            first.condense(f"https://{name}.example", text, outline)
+        first.stats.save(path)
+        condenser = Condenser(token_budget=400, stats=BoilerplateStats.load(path, warmup_sites=3))
+        condensed = condenser.condense("https://smile.example", text, outline)
+
+    assert estimate_tokens(condensed) <= 400
+    assert "Title: smile Dental" in condensed
+    assert "Description: Family dentistry in Dubai" in condensed
+    assert "Book an Appointment" in condensed
+    assert "Online booking widget: Calendly" in condensed
+    assert "Chat widget: none detected" in condensed
+    assert "hello@smile.ae" in condensed
+    assert "[Your name]" in condensed
+    assert "Teeth whitening from $199" in condensed
+    # Cookie banner by pattern, shared agency footer by cross-site frequency
+    assert "cookies" not in condensed
+    assert "Acme Web Studio" not in condensed
+
+def test_same_page_same_prompt_whatever_came_before():
+    stats = BoilerplateStats(warmup_sites=0)
+    condenser = Condenser(token_budget=400, stats=stats)
+    text, outline = parse_page(page("smile"))
+    before = condenser.condense("https://smile.example", text, outline)
+    for name in ["pearl", "bright", "coral"]:
+        condenser.condense(f"https://{name}.example", *parse_page(page(name)))
+    # The agency footer is now shared by four sites, but only the next run's snapshot will know
+    assert condenser.condense("https://smile.example", text, outline) == before
+    stats.freeze()
+    assert "Acme Web Studio" not in condenser.condense("https://smile.example", text, outline)
+
+def test_header_alone_is_held_to_the_budget():
+    headings = "".join(f"<h2>Treatment option number {i} for the whole family</h2>" for i in range(300))
+    text, outline = parse_page(f"<html><head><title>Big Clinic</title></head><body>{headings}</body></html>")
+    condensed = Condenser(token_budget=200, stats=BoilerplateStats()).condense("https://big.example", text, outline)
+    assert estimate_tokens(condensed) <= 200
+    assert "Title: Big Clinic" in condensed and "Chat widget: none detected" in condensed
+
+def test_stats_stay_bounded_and_carry_over():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "stats.json")
+        stats = BoilerplateStats.load(path, max_lines=10, warmup_sites=20)
+        for i in range(25):
+            stats.observe(f"site{i}.example", ["Powered by Acme Web Studio", f"Clinic number {i}"])
+        # The run's own site list is capped, but every site still counts towards warmup
+        assert len(stats._seen_sites) <= 10
+        stats.save()
+        assert BoilerplateStats.load(path, max_lines=10, warmup_sites=20).is_shared("Powered by Acme Web Studio")
+
+if __name__ == "__main__":
+    test_keeps_signals_within_budget()
+    test_same_page_same_prompt_whatever_came_before()
+    test_header_alone_is_held_to_the_budget()
+    test_stats_stay_bounded_and_carry_over()
+    print("Condensing OK")
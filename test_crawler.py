@@ -0,0 +1,38 @@
+import asyncio
+from crawler import crawl_pages, merge_pages, pick_links
+
+LINKS = [
+    ("/blog", "Blog"),
+    ("/contact", "Contact us"),
+    ("services/", "What we do"),
+    ("https://www.pearl.example/book#form", "Book now"),
+    ("https://facebook.com/pearl", "Book on Facebook"),
+    ("/price-list.pdf", "Prices"),
+    ("/contact/", "Contact"),
+]
+
+def test_pick_links_prefers_booking_and_contact():
+    picked = pick_links("https://pearl.example/", LINKS, 3)
+    assert picked == [
+        "https://www.pearl.example/book",
+        "https://pearl.example/contact",
+        "https://pearl.example/services/",
+    ]
+    assert pick_links("https://pearl.example/", LINKS, 0) == []
+
+def test_crawl_pages_drops_slow_pages():
+    async def read(url, max_bytes):
+        await asyncio.sleep(5 if "slow" in url else 0)
+        return "http", "<html></html>", f"text of {url}", {"booking": ["Calendly"]} if "book" in url else {}
+
+    pages = asyncio.run(crawl_pages(["https://a.example/book", "https://a.example/slow"], read, 1000, time_budget=0.2))
+    assert [url for url, _, _ in pages] == ["https://a.example/book"]
+
+    text, outline = merge_pages([("https://a.example/", "home", {"title": "A"})] + pages)
+    assert text == "home\ntext of https://a.example/book"
+    assert outline["title"] == "A" and outline["booking"] == ["Calendly"]
+
+if __name__ == "__main__":
+    test_pick_links_prefers_booking_and_contact()
+    test_crawl_pages_drops_slow_pages()
+    print("Crawler OK")
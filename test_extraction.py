@@ -0,0 +1,48 @@
+import asyncio
+from bs4 import BeautifulSoup
+import extraction
+
+def reference_clean(content):
+    # The cleanup extract_text_from_url has always done, kept verbatim for comparison
+    soup = BeautifulSoup(content, 'html.parser')
+    for script in soup(["script", "style"]):
+        script.decompose()
+    text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+SAMPLES = [
+    "<html><head><title>Pearl Dental</title><style>body{color:red}</style></head><body><h1>Welcome</h1></body></html>",
+    "<div>Book  an   appointment<script>var x = '<p>not text</p>';</script>\n\n   Call us: 555-0100</div>",
+    "<p>Implants&nbsp;&amp; Whitening</p><!-- hidden comment --><noscript>Enable JS</noscript>",
+    "<ul>\r\n<li> Cleaning </li>\r\n<li>Braces    and aligners</li></ul><footer>© 2024</footer>",
+    "<body><p>unclosed paragraph<div>nested <b>bold  text</div>",
+    "",
+]
+
+def big_page():
+    rows = "".join(f"<tr><td>Service {i}</td><td>  Price  {i * 10} AED</td></tr>\n" for i in range(2000))
+    return f"<html><body><script>{'x' * 5000}</script><table>{rows}</table></body></html>"
+
+def test_page_text_matches_reference():
+    for sample in SAMPLES + [big_page()]:
+        assert extraction.parse_page(sample)[0] == reference_clean(sample)
+
+def test_process_pool_matches_reference():
+    page = big_page()
+    assert len(page) > extraction.INLINE_PARSE_MAX_BYTES
+
+    async def run():
+        return await asyncio.gather(*(extraction.extract_page(p) for p in [page] + SAMPLES))
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        extraction.shutdown_parse_pool()
+    assert [text for text, _ in results] == [reference_clean(p) for p in [page] + SAMPLES]
+
+if __name__ == "__main__":
+    test_page_text_matches_reference()
+    test_process_pool_matches_reference()
+    print("Extraction parity OK")
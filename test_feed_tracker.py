@@ -0,0 +1,83 @@
+import asyncio
+
+import discovery
+from discovery import FeedTracker, process_batch
+from fakes import FakeFeed, FakeSupabase, patched
+from lead_writer import LeadWriteBuffer
+
+OAK = "https://www.google.com/maps/place/Oak/data=!1s0x1:0x2"
+
+def visit(tracker, feed):
+    fresh = asyncio.run(tracker.new_items(feed))
+    for index, identity, _ in fresh:
+        tracker.mark(index, identity)
+    return [name for _, _, name in fresh]
+
+def test_each_article_is_visited_once():
+    feed = FakeFeed(("Oak Dental", OAK), ("Pine Dental", None))
+    tracker = FeedTracker()
+    assert visit(tracker, feed) == ["Oak Dental", "Pine Dental"]
+    # Only what the feed appended since is read, and a place seen before under another index is skipped
+    feed.articles += [("Elm Dental", None), ("Oak Dental", OAK)]
+    assert visit(tracker, feed) == ["Elm Dental"] and tracker.cursor == 3
+
+def test_unlabeled_article_waits_for_its_label():
+    feed = FakeFeed(("Oak Dental", None), (None, None), ("Pine Dental", None))
+    tracker = FeedTracker()
+    # Still rendering: the batch stops there and picks up from it next time
+    assert visit(tracker, feed) == ["Oak Dental"]
+    feed.articles[1] = ("Birch Dental", None)
+    assert visit(tracker, feed) == ["Birch Dental", "Pine Dental"] and tracker.cursor == 3
+
+def test_unlabeled_article_is_skipped_after_a_few_polls():
+    feed = FakeFeed(("Oak Dental", None), (None, None), ("Pine Dental", None))
+    tracker = FeedTracker(max_unlabeled_polls=3)
+    assert visit(tracker, feed) == ["Oak Dental"]
+    assert visit(tracker, feed) == []
+    # A label that never shows up no longer stops the rest of the feed
+    assert visit(tracker, feed) == ["Pine Dental"] and tracker.cursor == 3
+
+    # A late label within the allowance is still picked up
+    feed.articles += [(None, None), ("Elm Dental", None)]
+    assert visit(tracker, feed) == []
+    feed.articles[3] = ("Birch Dental", None)
+    assert visit(tracker, feed) == ["Birch Dental", "Elm Dental"]
+
+class FeedPage:
+    def __init__(self, feed):
+        self.feed = feed
+
+    def locator(self, selector):
+        return self.feed
+
+def test_parallel_batches_stop_at_the_limit():
+    writer = LeadWriteBuffer(FakeSupabase(), batch_size=100, flush_interval=0)
+
+    async def process_listing(listing, name, place, processed_urls, niche, location, writer, clock):
+        # The click and panel wait: every context is mid-listing at once
+        await asyncio.sleep(0.01)
+        if name.startswith("Closed"):
+            return False
+        await writer.add({"company_name": name, "website_url": f"https://{name.replace(' ', '-')}.example"})
+        return True
+
+    feeds = [FakeFeed(*[(f"Clinic {c}-{i}", None) for i in range(10)]) for c in range(3)]
+    feeds[0].articles[:2] = [("Closed 1", None), ("Closed 2", None)]
+
+    async def run():
+        added = await asyncio.gather(*(process_batch(FeedPage(feed), FeedTracker(), set(), "dentist", "Dubai", 5,
+                                                     writer, None) for feed in feeds))
+        await writer.close()
+        return added
+
+    with patched(discovery, process_listing=process_listing):
+        added = asyncio.run(run())
+    # Three contexts share the limit without overshooting it; listings with no lead give their slot back
+    assert sum(added) == 5 and writer.saved_count == 5
+
+if __name__ == "__main__":
+    test_each_article_is_visited_once()
+    test_unlabeled_article_waits_for_its_label()
+    test_unlabeled_article_is_skipped_after_a_few_polls()
+    test_parallel_batches_stop_at_the_limit()
+    print("Feed tracker OK")
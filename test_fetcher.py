@@ -0,0 +1,64 @@
+import asyncio
+
+import fetcher
+from extraction import parse_page
+from fakes import QuietHandler, scratch_boilerplate_stats, serve
+from fetcher import fetch_html, looks_complete
+from intelligence import close_intelligence, extract_text_from_url
+
+ARTICLE = "".join(f"<p>Paragraph {i}: gentle family dentistry, cleanings, whitening and emergency visits.</p>"
+                  for i in range(12))
+
+PAGES = {
+    "/ssr": ("text/html; charset=utf-8", f"<html><body><h1>Marina Dental</h1>{ARTICLE}</body></html>"),
+    "/shell": ("text/html", '<html><body><div id="root"></div><noscript>You need to enable JavaScript to run this app.'
+                            '</noscript><script src="/app.js"></script></body></html>'),
+    "/shell-with-ssr": ("text/html", f'<html><body><div id="app"></div>{ARTICLE * 2}</body></html>'),
+    "/thin": ("text/html", "<html><body><p>Welcome!</p></body></html>"),
+    "/big": ("text/html", "<html><body><p>" + "x" * 5000 + "</p></body></html>"),
+    "/data.json": ("application/json", '{"ok": true}'),
+}
+
+class Site(QuietHandler):
+    def do_GET(self):
+        if self.path not in PAGES:
+            self.reply(404)
+            return
+        content_type, text = PAGES[self.path]
+        self.reply(200, text, {"Content-Type": content_type})
+
+def test_http_tier_and_browser_heuristic():
+    async def scenario(base):
+        try:
+            pages = {path: await fetch_html(base + path) for path in ("/ssr", "/shell", "/shell-with-ssr", "/thin")}
+            # Non-HTML and error responses come back as None, so the caller escalates to the browser
+            assert await fetch_html(base + "/data.json") is None and await fetch_html(base + "/missing") is None
+            assert len(await fetch_html(base + "/big", max_bytes=1000)) == 1000
+
+            # A complete server-rendered page never reaches the browser tier
+            before = fetcher.tier_counts[fetcher.TIER_HTTP]
+            assert "Marina Dental" in await extract_text_from_url(base + "/ssr")
+            assert fetcher.tier_counts[fetcher.TIER_HTTP] == before + 1
+            return pages
+        finally:
+            await close_intelligence()
+
+    with serve(Site) as base, scratch_boilerplate_stats():
+        pages = asyncio.run(scenario(base))
+
+    def complete(path):
+        return looks_complete(pages[path], parse_page(pages[path])[0], min_text=400)
+
+    # Server-rendered text is enough; an empty JS shell or a near-empty page needs the browser
+    assert complete("/ssr")
+    assert not complete("/shell") and not complete("/thin")
+    # A shell that also ships plenty of server-rendered text is trusted
+    assert complete("/shell-with-ssr")
+    # ...but it needs three times the usual text, where a plain page passes with the minimum
+    text = parse_page(pages["/ssr"])[0]
+    assert looks_complete(pages["/ssr"], text, min_text=len(text))
+    assert not looks_complete(pages["/shell-with-ssr"], text + text, min_text=len(text))
+
+if __name__ == "__main__":
+    test_http_tier_and_browser_heuristic()
+    print("Fetcher OK")
@@ -1,5 +1,5 @@
 import asyncio
-from intelligence import analyze_site
+from intelligence import analyze_site, close_intelligence
 
 async def test():
     # Test with a known URL from our list
@@ -9,6 +9,7 @@ async def test():
     result = await analyze_site(url, "dentist")
     print("\nResult:")
     print(result)
+    await close_intelligence()
 
 if __name__ == "__main__":
     asyncio.run(test())
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import lead_engine
+from fakes import InFlight, patched
+from lead_engine import LeadEngine
+from refresh import CHANGED, FAILED, SiteCheck
+
+ANALYSIS = {"core_service": "Dentistry", "problem": "No online booking", "ai_solution": "Booking assistant"}
+
+class Stages:
+    """Stand-ins for the fetch, LLM and database calls LeadEngine makes, each one gauged."""
+
+    def __init__(self, fetch_time=0.01, llm_time=0.03, fused_answers=True):
+        self.fetch_time = fetch_time
+        self.llm_time = llm_time
+        self.fused_answers = fused_answers
+        self.sites, self.llm, self.db = InFlight(), InFlight(), InFlight()
+        self.saved = {}
+
+    async def read_lead_site(self, lead):
+        with self.sites:
+            await asyncio.sleep(self.fetch_time)
+        if "broken" in lead["website_url"]:
+            return SiteCheck(FAILED)
+        return SiteCheck(CHANGED, f"Family dentistry at {lead['website_url']}")
+
+    def analyze_content(self, url, niche, content):
+        with self.llm:
+            time.sleep(self.llm_time)
+        if "crash" in url:
+            raise RuntimeError("model went away")
+        return dict(ANALYSIS)
+
+    def analyze_and_draft(self, lead, niche, content):
+        with self.llm:
+            time.sleep(self.llm_time)
+        # A model that ignores the second half of the fused prompt gets no draft back
+        if not self.fused_answers:
+            return None
+        return {**ANALYSIS, "email_draft": f"Hi there, {lead['company_name']} could take bookings online."}
+
+    def generate_email(self, lead_context):
+        with self.llm:
+            time.sleep(self.llm_time)
+        return f"Hi there, {lead_context['company_name']} could take bookings online."
+
+    def update_lead_record(self, lead_id, analysis, email_draft, fields=None):
+        with self.db:
+            time.sleep(0.005)
+        self.saved[lead_id] = email_draft
+        return True
+
+    def patch(self):
+        return patched(lead_engine, read_lead_site=self.read_lead_site,
+                       analyze_content=self.analyze_content, analyze_and_draft=self.analyze_and_draft,
+                       generate_email=self.generate_email, update_lead_record=self.update_lead_record)
+
+def leads(count):
+    return [{"id": i, "company_name": f"Clinic {i}", "website_url": f"https://clinic{i}.example/", "niche": "dentist"}
+            for i in range(count)]
+
+def test_concurrency_limits_are_respected():
+    stages = Stages()
+    with stages.patch():
+        engine = LeadEngine(concurrency=8, fetch_limit=3, llm_limit=2, db_limit=2, fused=False, batch=False)
+        assert asyncio.run(engine.run(leads(16), niche="dentist")) == (16, 0)
+    # Never more sites in flight than fetch slots, never more model calls than LLM slots; both are used
+    assert stages.sites.most == 3 and stages.llm.most == 2 and stages.db.most <= 2
+    assert stages.llm.calls == 32 and len(stages.saved) == 16
+
+def test_failed_leads_are_counted_not_raised():
+    stages = Stages(llm_time=0)
+    batch = leads(6)
+    batch[4]["website_url"], batch[5]["website_url"] = "https://broken.example/", "https://crash.example/"
+    with stages.patch():
+        assert asyncio.run(LeadEngine(concurrency=3, fused=False, batch=False).run(batch)) == (4, 2)
+    assert sorted(stages.saved) == [0, 1, 2, 3]
+
+def test_stream_holds_back_a_producer_that_runs_ahead():
+    stages = Stages(fetch_time=0.005, llm_time=0.005)
+    engine = LeadEngine(concurrency=2, fused=False, batch=False)
+    ahead = []
+
+    async def produce(queue):
+        for put, lead in enumerate(leads(30), 1):
+            await queue.put(lead)
+            ahead.append(put - engine.success_count - engine.failure_count)
+
+    with stages.patch():
+        assert asyncio.run(engine.stream(produce, niche="dentist", expected=30)) == (30, 0)
+    # The producer can only get the queue plus one lead per worker ahead of the workers
+    assert max(ahead) <= lead_engine.STREAM_QUEUE_SIZE + engine.concurrency < 30
+
+def test_fused_mode_falls_back_to_two_calls():
+    stages = Stages(llm_time=0)
+    with stages.patch():
+        engine = LeadEngine(concurrency=4, fused=True)
+        assert asyncio.run(engine.run(leads(4))) == (4, 0)
+    assert engine.fused_fallbacks == 0 and stages.llm.calls == 4
+
+    stages = Stages(llm_time=0, fused_answers=False)
+    with stages.patch():
+        engine = LeadEngine(concurrency=4, fused=True)
+        assert asyncio.run(engine.run(leads(4))) == (4, 0)
+    # One fused attempt, then the usual analysis and email calls, for every lead
+    assert engine.fused_fallbacks == 4 and stages.llm.calls == 12 and len(stages.saved) == 4
+
+if __name__ == "__main__":
+    test_concurrency_limits_are_respected()
+    test_failed_leads_are_counted_not_raised()
+    test_stream_holds_back_a_producer_that_runs_ahead()
+    test_fused_mode_falls_back_to_two_calls()
+    print("Lead engine OK")
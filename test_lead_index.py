@@ -0,0 +1,43 @@
+from fakes import FakeSupabase
+from lead_index import BloomFilter, LeadIndex
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    urls = [f"https://clinic{i}.example" for i in range(1000)]
+    for url in urls:
+        bloom.add(url)
+    assert all(url in bloom for url in urls) and bloom.full
+    false_positives = sum(f"https://other{i}.example" in bloom for i in range(10000))
+    assert false_positives < 300
+
+def test_bloom_hits_are_confirmed_against_the_table():
+    db = FakeSupabase([{"company_name": f"Clinic {i}", "website_url": f"https://clinic{i}.example"}
+                       for i in range(50)])
+    index = LeadIndex(db, page_size=20, bloom_threshold=10)
+    assert index.load() == 50 and db.requests["GET"] == 3
+    assert index.bloom is not None and len(index) == 0
+
+    # Every bit set: each lookup is a Bloom hit, so only the table can tell a false positive apart
+    for bloom in index.bloom.filters:
+        bloom.bits = bytearray(b"\xff" * len(bloom.bits))
+    assert not index.contains("https://new.example") and index.confirm_queries == 1
+    assert index.contains("https://clinic7.example") and index.confirm_queries == 2
+    # A confirmed URL is kept exactly and never asked about again
+    assert index.contains("https://clinic7.example") and index.confirm_queries == 2
+
+    # Leads saved this run are known without a query
+    index.add("https://saved.example")
+    assert index.contains("https://saved.example") and index.confirm_queries == 2
+
+def test_small_tables_are_held_exactly():
+    db = FakeSupabase([{"website_url": f"https://clinic{i}.example"} for i in range(5)] + [{"website_url": None}])
+    index = LeadIndex(db, page_size=100)
+    assert index.load() == 6 and index.bloom is None and len(index) == 5
+    assert index.contains("https://clinic3.example") and not index.contains("https://clinic9.example")
+    assert index.confirm_queries == 0
+
+if __name__ == "__main__":
+    test_bloom_filter_has_no_false_negatives()
+    test_bloom_hits_are_confirmed_against_the_table()
+    test_small_tables_are_held_exactly()
+    print("Lead index OK")
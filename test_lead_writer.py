@@ -0,0 +1,83 @@
+import asyncio
+
+from fakes import FakeSupabase
+from lead_writer import LeadWriteBuffer
+from postgrest_stub import PostgrestStub
+from supabase_client import create_async_client, create_client
+
+COLUMNS = ["company_name", "website_url", "status"]
+
+def lead(i, **extra):
+    return {"company_name": f"Clinic {i}", "website_url": f"https://clinic{i}.example", "status": "discovered", **extra}
+
+def write_all(db, leads, **kwargs):
+    saved, failed = [], []
+
+    async def on_saved(row):
+        saved.append(row)
+
+    async def on_failed(row):
+        failed.append(row)
+
+    async def run():
+        writer = LeadWriteBuffer(db, flush_interval=0, on_saved=on_saved, on_failed=on_failed, **kwargs)
+        for row in leads:
+            await writer.add(row)
+            # Let a flush the add just started take its batch, as discovery's page waits would
+            await asyncio.sleep(0)
+        await writer.close()
+        return writer
+
+    return asyncio.run(run()), saved, failed
+
+def test_failed_requests_carry_their_status_code():
+    stub = PostgrestStub().start()
+    try:
+        bad = create_client(stub.url, "key").table("leads").upsert(lead(1, no_such_column=1)).execute()
+        assert bad.error and bad.status_code == 400
+        assert create_client(stub.url, "key").table("leads").upsert(lead(1)).execute().status_code is None
+
+        async def write():
+            client = create_async_client(stub.url, "key")
+            try:
+                return await client.table("leads").upsert(lead(2, no_such_column=1)).execute()
+            finally:
+                await client.aclose()
+        assert asyncio.run(write()).status_code == 400
+    finally:
+        stub.stop()
+
+def test_rows_are_written_in_batches():
+    db = FakeSupabase(columns=COLUMNS)
+    writer, saved, failed = write_all(db, [lead(i) for i in range(5)], batch_size=2, returning="id")
+    assert db.requests["POST"] == 3 and len(db.rows) == 5 and failed == []
+    assert sorted(row["id"] for row in saved) == [1, 2, 3, 4, 5]
+    assert (writer.saved_count, writer.pending_count) == (5, 0)
+
+def test_bad_row_is_isolated_without_retries():
+    db = FakeSupabase(columns=COLUMNS)
+    leads = [lead(i, no_such_column=1) if i == 2 else lead(i) for i in range(4)]
+    writer, saved, failed = write_all(db, leads, batch_size=100, max_retries=2)
+    assert [row["company_name"] for row in failed] == ["Clinic 2"]
+    assert sorted(row["company_name"] for row in saved) == ["Clinic 0", "Clinic 1", "Clinic 3"]
+    # A 400 is never retried: 4 rows -> halves -> the bad row alone, one request each
+    assert writer.requests == 5 and (writer.saved_count, writer.failed_count) == (3, 1)
+
+def test_unavailable_database_retries_the_whole_batch():
+    db = FakeSupabase(columns=COLUMNS)
+    # Rate limited, then a server error, then it answers: nothing is split, nothing lost
+    db.failures = [429, 503]
+    writer, saved, failed = write_all(db, [lead(i) for i in range(4)], batch_size=100, max_retries=2, backoff_base=0)
+    assert writer.requests == 3 and len(saved) == 4 and failed == []
+
+    # Still down after every retry: the batch fails once, as a whole
+    db.failures = [503, None, 502]
+    writer, saved, failed = write_all(db, [lead(i) for i in range(4, 8)], batch_size=100, max_retries=2, backoff_base=0)
+    assert writer.requests == 3 and saved == [] and len(failed) == 4 and len(db.rows) == 4
+
+if __name__ == "__main__":
+    test_failed_requests_carry_their_status_code()
+    test_rows_are_written_in_batches()
+    test_bad_row_is_isolated_without_retries()
+    test_unavailable_database_retries_the_whole_batch()
+    print("Lead writer OK")
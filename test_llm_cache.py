@@ -0,0 +1,79 @@
+import os
+import tempfile
+import time
+
+from fakes import StandIn, scratch_llm_cache
+from intelligence import analyze_content
+from llm_cache import LLMCache
+from llm_router import LLMRouter, Provider, set_router
+
+ANALYSIS = '{"core_service": "Dentistry", "problem": "No online booking", "ai_solution": "Booking assistant"}'
+
+def test_hit_ttl_and_lru_eviction():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = LLMCache(os.path.join(tmp, "cache.sqlite3"), ttl=0.2, max_entries=2)
+        cache.put("gemini", "v1", "prompt a", "answer a")
+        assert cache.get("gemini", "v1", "prompt a") == "answer a"
+        # Model and prompt version are part of the key
+        assert cache.get("groq", "v1", "prompt a") is None and cache.get("gemini", "v2", "prompt a") is None
+
+        time.sleep(0.01)
+        cache.put("gemini", "v1", "prompt b", "answer b")
+        time.sleep(0.01)
+        # Reading "a" makes "b" the least recently used, so it goes first
+        assert cache.get("gemini", "v1", "prompt a") == "answer a"
+        time.sleep(0.01)
+        cache.put("gemini", "v1", "prompt c", "answer c")
+        assert cache.get("gemini", "v1", "prompt b") is None
+        assert cache.get("gemini", "v1", "prompt c") == "answer c"
+
+        time.sleep(0.25)
+        assert cache.get("gemini", "v1", "prompt c") is None
+        assert (cache.hits, cache.misses) == (3, 4)
+        cache.close()
+
+def test_empty_answers_and_bypass_are_never_stored():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = LLMCache(os.path.join(tmp, "cache.sqlite3"))
+        cache.put("gemini", "v1", "silent", "")
+        assert cache.get("gemini", "v1", "silent") is None
+        cache.put("gemini", "v1", "hello", "answer to hello")
+
+        # Bypass neither reads nor writes, so a run with it leaves the cache as it was
+        cache.bypass = True
+        assert cache.get("gemini", "v1", "hello") is None
+        cache.put("gemini", "v1", "fresh", "answer to fresh")
+        cache.bypass = False
+        assert cache.get("gemini", "v1", "hello") == "answer to hello" and cache.get("gemini", "v1", "fresh") is None
+        cache.close()
+
+def test_only_valid_answers_are_cached():
+    answers = ["Sure! Here is the analysis: {core_service", ANALYSIS]
+    prompts = []
+
+    def answer(prompt):
+        prompts.append(prompt)
+        return answers[min(len(prompts), len(answers)) - 1]
+
+    stand_in = StandIn("stand-in", answer)
+    set_router(LLMRouter(providers=[Provider("gemini", "stand-in", "Stand-in", stand_in, 600, 1_000_000)]))
+    try:
+        with scratch_llm_cache() as cache:
+            # A malformed answer is returned once but never cached, so the next run asks again
+            assert analyze_content("https://a.example/", "dentist", "We fix teeth.") is None
+            assert analyze_content("https://a.example/", "dentist", "We fix teeth.")["problem"] == "No online booking"
+            assert analyze_content("https://a.example/", "dentist", "We fix teeth.")["engine_used"] == "Stand-in"
+            assert stand_in.calls == 2
+
+            # A bad entry already in the cache (e.g. from an older version) is evicted and asked again
+            cache.put("stand-in", "analysis-v1", prompts[0].replace("We fix teeth.", "Braces."), "not json")
+            assert analyze_content("https://a.example/", "dentist", "Braces.")["core_service"] == "Dentistry"
+            assert stand_in.calls == 3
+    finally:
+        set_router(None)
+
+if __name__ == "__main__":
+    test_hit_ttl_and_lru_eviction()
+    test_empty_answers_and_bypass_are_never_stored()
+    test_only_valid_answers_are_cached()
+    print("LLM cache OK")
@@ -0,0 +1,104 @@
+import time
+
+from fakes import StandIn, scratch_llm_cache
+from llm_router import CircuitBreaker, LLMRouter, Provider, TokenBucket
+
+class TooManyRequests(Exception):
+    status_code = 429
+
+def make_router(*stand_ins, **kwargs):
+    providers = [Provider(s.name, f"model-{s.name}", s.name, s, 6000, 1_000_000) for s in stand_ins]
+    for provider in providers:
+        provider.breaker = CircuitBreaker(threshold=2, reset_after=0.05)
+    return LLMRouter(providers=providers, backoff_base=0, **kwargs)
+
+def test_fallback_opens_breaker_and_routes_around():
+    a, b = StandIn("a", RuntimeError("500")), StandIn("b")
+    router = make_router(a, b)
+    with scratch_llm_cache(bypass=True):
+        assert router.complete("p1", "v1") == ("ok from b", "b")
+        assert router.complete("p2", "v1") == ("ok from b", "b")
+        # Two failures in a row open a's breaker: the next call goes straight to b
+        assert router.provider("a").breaker.state == "open"
+        assert router.complete("p3", "v1") == ("ok from b", "b")
+    assert (a.calls, b.calls, router.fallbacks) == (2, 3, 2)
+
+def test_half_open_fallback_is_probed_once_it_is_needed():
+    a, b = StandIn("a"), StandIn("b", RuntimeError("500"))
+    router = make_router(a, b)
+    breaker = router.provider("b").breaker
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+
+    with scratch_llm_cache(bypass=True):
+        # While the primary answers, the half-open fallback's probe is never claimed
+        for i in range(5):
+            assert router.complete(f"p{i}", "v1") == ("ok from a", "a")
+        assert not breaker.probing and b.calls == 0
+
+        # b has recovered; the first call that needs it probes it and closes the breaker
+        a.answer, b.answer = RuntimeError("500"), "ok from b"
+        assert router.complete("p5", "v1") == ("ok from b", "b")
+    assert breaker.state == "closed" and b.calls == 1
+
+def test_probe_is_given_back_when_the_queue_is_full():
+    b = StandIn("b")
+    router = make_router(b, max_queue_wait=0)
+    provider = router.provider("b")
+    provider.breaker.record_failure()
+    provider.breaker.record_failure()
+    time.sleep(0.06)
+
+    provider.requests = TokenBucket(1)
+    provider.requests.tokens = 0
+    with scratch_llm_cache(bypass=True):
+        assert router.complete("p1", "v1") == (None, None)
+        assert provider.breaker.state == "half-open" and not provider.breaker.probing and b.calls == 0
+
+        provider.requests.tokens = 1
+        assert router.complete("p2", "v1") == ("ok from b", "b")
+    assert provider.breaker.state == "closed"
+
+def test_answers_are_reused_from_the_cache():
+    a, b = StandIn("a"), StandIn("b")
+    router = make_router(a, b)
+    with scratch_llm_cache() as cache:
+        assert router.complete("p1", "v1") == ("ok from a", "a")
+        assert router.complete("p1", "v1") == ("ok from a", "a") and a.calls == 1
+        # Any provider's answer will do, unless the caller asks for one by name
+        assert router.complete("p1", "v1", only="b") == ("ok from b", "b") and b.calls == 1
+        # A new prompt version is asked again
+        assert router.complete("p1", "v2") == ("ok from a", "a") and a.calls == 2
+        assert cache.hits == 1
+
+def test_rate_limited_calls_back_off_and_retry():
+    answers = [TooManyRequests("429 slow down"), "ok from a"]
+    a = StandIn("a", lambda prompt: answers.pop(0))
+    router = make_router(a)
+    with scratch_llm_cache(bypass=True):
+        assert router.complete("p1", "v1") == ("ok from a", "a")
+    assert router.provider("a").rate_limited == 1 and a.calls == 2
+    assert router.provider("a").breaker.failures == 0
+
+def test_hedged_request_races_a_slow_primary():
+    a, b = StandIn("a", delay=0.5), StandIn("b")
+    router = make_router(a, b, hedge=True)
+    router.provider("a").latencies.extend([0.01] * 20)
+    started = time.monotonic()
+    with scratch_llm_cache(bypass=True):
+        assert router.complete("p1", "v1") == ("ok from b", "b")
+        elapsed = time.monotonic() - started
+        # Let the losing call finish while the scratch cache is still in place
+        router._executor.shutdown(wait=True)
+    assert elapsed < 0.4 and router.hedges == 1
+
+if __name__ == "__main__":
+    test_fallback_opens_breaker_and_routes_around()
+    test_half_open_fallback_is_probed_once_it_is_needed()
+    test_probe_is_given_back_when_the_queue_is_full()
+    test_answers_are_reused_from_the_cache()
+    test_rate_limited_calls_back_off_and_retry()
+    test_hedged_request_races_a_slow_primary()
+    print("LLM router OK")
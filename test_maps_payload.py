@@ -0,0 +1,49 @@
+import os
+
+from discovery import listing_identity
+from maps_payload import PlaceCollector, SEARCH_RESPONSE_PATTERN, matches_listing
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "maps")
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+def test_places_from_synthetic_fixtures():
+    collector = PlaceCollector()
+    found = [collector.ingest(read_fixture(name)) for name in ("search_first_page.resp", "search_scroll_page.resp")]
+
+    assert found == [3, 4]
+    assert collector.place_count == 6
+
+    # Feed item matched by the place id in its link
+    href = "https://www.google.com/maps/place/Pearl/data=!4m7!3m6!1s0x3e5f43496ad9c645:0xbde66e5084295162!8m2"
+    pearl = collector.lookup(listing_identity(0, "Pearl Dental Clinic", href), "Pearl Dental Clinic")
+    assert pearl["website"] == "https://pearldental.example/"
+    assert pearl["rating"] == 4.8 and pearl["review_count"] == 1244
+    assert pearl["place_id"] == "ChIJRcbZaklDXz4RYlEphFDm5r0"
+
+    # Redirect-wrapped website, matched by name when the listing has no link
+    bright = collector.lookup(None, "Bright  Smile Center")
+    assert bright["website"] == "https://brightsmile.example/home"
+
+    # No website: discovery falls back to clicking
+    assert collector.lookup(None, "Dr. Nadia's Dental Studio")["website"] is None
+    # Two branches share a name: only ids can tell them apart
+    assert collector.lookup(None, "Smile Co") is None
+    assert collector.lookup("ChIJZmbu7lVVXz4RqoiI__93dnc", "Smile Co")["rating"] == 3.9
+
+    # A place found by id under another name was read from the wrong fields: discovery clicks instead
+    assert matches_listing(pearl, "pearl  dental clinic")
+    assert not matches_listing(pearl, "Bright Smile Center")
+    assert not matches_listing({**pearl, "name": ""}, "Pearl Dental Clinic") and not matches_listing(None, "Pearl")
+
+def test_search_response_urls():
+    assert SEARCH_RESPONSE_PATTERN.search("https://www.google.com/search?tbm=map&authuser=0&hl=en&q=dentist")
+    assert SEARCH_RESPONSE_PATTERN.search("https://www.google.com/maps/preview/search?authuser=0&q=x")
+    assert not SEARCH_RESPONSE_PATTERN.search("https://www.google.com/maps/vt/pb=!1m5")
+
+if __name__ == "__main__":
+    test_places_from_synthetic_fixtures()
+    test_search_response_urls()
+    print("Maps payload parsing OK")
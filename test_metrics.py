@@ -0,0 +1,84 @@
+import asyncio
+import json
+import os
+import tempfile
+import urllib.request
+
+from metrics import Metrics, get_metrics, set_metrics, timed
+
+def test_spans_summary_trace_and_prometheus():
+    with tempfile.TemporaryDirectory() as tmp:
+        trace = os.path.join(tmp, "spans.jsonl")
+        metrics = Metrics(enabled=True, trace_path=trace)
+        for ms in range(1, 101):
+            metrics.record("llm.gemini", ms / 1000)
+        with metrics.span("db.PATCH", table="leads"):
+            pass
+        try:
+            with metrics.span("page.browser"):
+                raise TimeoutError
+        except TimeoutError:
+            pass
+        metrics.count("leads_processed", 3)
+        metrics.count("llm_fallbacks")
+
+        gemini = metrics.stages["llm.gemini"]
+        assert (gemini.count, gemini.percentile(50), gemini.percentile(95)) == (100, 0.051, 0.096)
+        assert metrics.stages["page.browser"].errors == 1
+        summary = metrics.summary()
+        assert "llm.gemini: 100x, p50 51ms, p95 96ms" in summary and "llm_fallbacks=1" in summary
+
+        port = metrics.serve(0)
+        assert metrics._server.server_address[0] == "127.0.0.1"
+        body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics").read().decode()
+        assert 'leadgen_llm_gemini_seconds{quantile="0.95"} 0.096000' in body
+        assert "leadgen_db_PATCH_seconds_count 1" in body and "leadgen_leads_processed_total 3" in body
+        metrics.close()
+
+        with open(trace, encoding="utf-8") as f:
+            spans = [json.loads(line) for line in f]
+        assert len(spans) == 102
+        assert spans[100]["name"] == "db.PATCH" and spans[100]["attrs"] == {"table": "leads"}
+        assert spans[101]["error"] is True
+
+def test_disabled_metrics_stay_out_of_the_way():
+    previous = get_metrics()
+    set_metrics(Metrics(enabled=False))
+    try:
+        async def fetch():
+            return "html"
+
+        # Nothing is wrapped, recorded or counted
+        assert timed("site.read")(fetch) is fetch
+        with get_metrics().span("page.http"):
+            get_metrics().count("leads_processed")
+        assert asyncio.run(fetch()) == "html"
+        assert get_metrics().stages == {} and get_metrics().counters == {}
+        assert get_metrics().summary() == "off"
+    finally:
+        set_metrics(previous)
+
+def test_timed_wraps_sync_and_async_functions():
+    previous = get_metrics()
+    set_metrics(Metrics(enabled=True))
+    try:
+        @timed("llm.email")
+        def draft():
+            return "Hi there"
+
+        @timed("site.read")
+        async def read():
+            await asyncio.sleep(0.01)
+            return "text"
+
+        assert draft() == "Hi there" and asyncio.run(read()) == "text"
+        assert get_metrics().stages["llm.email"].count == 1
+        assert get_metrics().stages["site.read"].total >= 0.01
+    finally:
+        set_metrics(previous)
+
+if __name__ == "__main__":
+    test_spans_summary_trace_and_prometheus()
+    test_disabled_metrics_stay_out_of_the_way()
+    test_timed_wraps_sync_and_async_functions()
+    print("Metrics OK")
@@ -0,0 +1,109 @@
+import asyncio
+import hashlib
+
+import refresh
+from extraction import parse_page
+from fakes import QuietHandler, patched, scratch_boilerplate_stats, serve
+from fetcher import TIER_BROWSER
+from intelligence import close_intelligence
+from refresh import check_site, read_lead_site, CHANGED, UNCHANGED, refresh_counts
+
+SITE = {"body": "", "etags": True}
+
+def _page(year, offer):
+    paragraphs = "".join(f"<p>Family dental care in the marina since {2000 + i}, with gentle cleanings, whitening and "
+                         f"emergency visits for the whole family.</p>" for i in range(6))
+    return (f"<html><head><title>Marina Dental</title></head><body><h1>Marina Dental</h1>{paragraphs}"
+            f"<p>{offer}</p><footer>© {year} Marina Dental. All rights reserved.</footer></body></html>")
+
+class Site(QuietHandler):
+    """Serves SITE["body"], with an ETag and 304 answers while SITE["etags"] is on."""
+
+    def do_GET(self):
+        etag = '"' + hashlib.md5(SITE["body"].encode()).hexdigest() + '"'
+        if SITE["etags"] and self.headers.get("If-None-Match") == etag:
+            self.reply(304)
+            return
+        headers = {"Content-Type": "text/html; charset=utf-8"}
+        if SITE["etags"]:
+            headers["ETag"] = etag
+        self.reply(200, SITE["body"], headers)
+
+def test_only_changed_sites_are_reanalyzed():
+    async def scenario(lead):
+        try:
+            SITE["body"] = _page(2024, "Book a consultation online.")
+            first = await read_lead_site(lead)
+            assert first.outcome == CHANGED and "Marina Dental" in first.content and first.fields["http_etag"]
+            stored = {**lead, **first.fields}
+
+            # The ETag stored by the first read is enough: the server answers 304 and sends no body
+            check = await check_site(stored)
+            assert check.outcome == UNCHANGED and refresh_counts["not_modified"] == 1
+
+            # No ETag stored: the page is downloaded, matched by fingerprint and its ETag recorded again
+            check = await check_site({**stored, "http_etag": None})
+            assert check.outcome == UNCHANGED and check.fields["http_etag"] == stored["http_etag"]
+            assert refresh_counts["same_text"] == 1
+
+            # No validators from the server: only the copyright year moved, so the text fingerprint matches
+            SITE["etags"] = False
+            SITE["body"] = _page(2025, "Book a consultation online.")
+            stored.pop("http_etag")
+            check = await check_site(stored)
+            assert check.outcome == UNCHANGED and refresh_counts["same_text"] == 2
+
+            SITE["body"] = _page(2025, "New: same-day implants and online booking.")
+            check = await check_site(stored)
+            assert check.outcome == CHANGED and "same-day implants" in check.content
+            assert check.fields["content_hash"] != stored["content_hash"]
+
+            # A lead processed before fingerprints were stored is fingerprinted, not re-analyzed
+            changed_hash = check.fields["content_hash"]
+            check = await check_site({**lead, "content_hash": None})
+            assert check.outcome == UNCHANGED and check.content is None and refresh_counts["baselined"] == 1
+            assert check.fields["content_hash"] == changed_hash
+        finally:
+            await close_intelligence()
+
+    with serve(Site) as url, scratch_boilerplate_stats():
+        asyncio.run(scenario({"id": 1, "website_url": url + "/"}))
+
+class Shell(QuietHandler):
+    """A JavaScript app shell: the plain HTML has no text, so the page needs the browser."""
+
+    hits = 0
+
+    def do_GET(self):
+        Shell.hits += 1
+        self.reply(200, '<html><body><div id="root"></div><script src="/app.js"></script></body></html>',
+                   {"Content-Type": "text/html; charset=utf-8", "ETag": '"shell-1"'})
+
+def test_incomplete_homepage_goes_straight_to_the_browser():
+    rendered = _page(2024, "Book a consultation online.")
+    browser_reads = []
+
+    async def read_page(url, tier=None, *args):
+        browser_reads.append(tier)
+        text, outline = parse_page(rendered)
+        return tier, rendered, text, outline
+
+    async def scenario(lead):
+        try:
+            first = await read_lead_site(lead)
+            check = await check_site({**lead, "content_hash": first.fields["content_hash"]})
+            return first, check
+        finally:
+            await close_intelligence()
+
+    with serve(Shell) as url, scratch_boilerplate_stats(), patched(refresh, read_page=read_page):
+        first, check = asyncio.run(scenario({"id": 2, "website_url": url + "/"}))
+    assert first.outcome == CHANGED and "Marina Dental" in first.content and first.fields["http_etag"] == '"shell-1"'
+    assert check.outcome == UNCHANGED
+    # Each read downloads the shell once and renders it without a second plain GET
+    assert Shell.hits == 2 and browser_reads == [TIER_BROWSER, TIER_BROWSER]
+
+if __name__ == "__main__":
+    test_only_changed_sites_are_reanalyzed()
+    test_incomplete_homepage_goes_straight_to_the_browser()
+    print("Change detection OK")
@@ -0,0 +1,45 @@
+import asyncio
+
+from fakes import FakePage, FakeRoute
+from resource_policy import ResourcePolicy, apply_policy, get_policy
+
+def test_blocks_types_and_tracker_hosts():
+    policy = get_policy("text-only")
+    assert policy.should_block("image", "https://clinic.example/logo.png")
+    assert policy.should_block("stylesheet", "https://clinic.example/site.css")
+    assert policy.should_block("script", "https://www.google-analytics.com/analytics.js")
+    # Subdomains of a tracker are blocked, look-alike hosts are not
+    assert policy.should_block("xhr", "https://region1.analytics.google-analytics.com/g/collect")
+    assert not policy.should_block("script", "https://notgoogle-analytics.com/app.js")
+    assert not policy.should_block("document", "https://clinic.example/")
+    assert not policy.should_block("script", "https://clinic.example/app.js")
+
+    # Maps keeps its styles for layout but drops tiles and photos
+    maps = get_policy("maps-minimal")
+    assert not maps.should_block("stylesheet", "https://www.google.com/maps/style.css")
+    assert maps.should_block("image", "https://lh5.googleusercontent.com/p/photo.jpg")
+
+    assert get_policy("off") is None and get_policy(None) is None and get_policy("no-such-policy") is None
+
+def test_routes_are_aborted_or_continued_and_counted():
+    policy = ResourcePolicy("test", ["image", "font"])
+    routes = [FakeRoute("document", "https://clinic.example/"), FakeRoute("image", "https://clinic.example/a.png"),
+              FakeRoute("font", "https://fonts.example/a.woff2"), FakeRoute("script", "https://hotjar.com/x.js")]
+
+    async def scenario():
+        page = FakePage()
+        assert await apply_policy(page, "off") is None and page.routes == []
+        assert await apply_policy(page, "text-only") is get_policy("text-only")
+        assert page.routes == [("**/*", get_policy("text-only").handle)]
+        for route in routes:
+            await policy.handle(route)
+
+    asyncio.run(scenario())
+    assert [r.outcome for r in routes] == ["continued", "aborted", "aborted", "aborted"]
+    assert policy.stats["allowed"] == 1 and policy.stats["blocked"] == 3 and policy.stats["blocked:image"] == 1
+    assert policy.summary() == "test: 1 allowed, 3 blocked"
+
+if __name__ == "__main__":
+    test_blocks_types_and_tracker_hosts()
+    test_routes_are_aborted_or_continued_and_counted()
+    print("Resource policy OK")
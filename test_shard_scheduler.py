@@ -0,0 +1,32 @@
+from shard_scheduler import ShardScheduler, make_shards
+
+def test_idle_worker_steals_from_fullest_queue():
+    shards = make_shards([("dentist", f"Area {i}") for i in range(7)] + [("Dentist", "area 1 ")])
+    assert len(shards) == 7
+
+    scheduler = ShardScheduler(shards, 3)
+    taken = []
+    while (shard := scheduler.next(0)) is not None:
+        taken.append(shard.location)
+
+    # Own shards first, then from the back of the other workers' queues
+    assert taken == ["Area 0", "Area 3", "Area 6", "Area 4", "Area 5", "Area 1", "Area 2"]
+    assert scheduler.steals == 4
+    assert scheduler.next(1) is None
+
+def test_unstarted_shards_are_reported_as_skipped():
+    shards = make_shards([("dentist", "Marina"), ("dentist", "JLT")])
+    scheduler = ShardScheduler(shards, 1)
+    first = scheduler.next(0)
+    first.start(0)
+    first.leads, first.listings = 3, 12
+    first.finish("limit reached")
+    scheduler.skip_remaining()
+
+    assert [s.outcome for s in shards] == ["limit reached", "skipped"]
+    assert first.summary().startswith("dentist in Marina: 3 leads from 12 listings (25%)")
+
+if __name__ == "__main__":
+    test_idle_worker_steals_from_fullest_queue()
+    test_unstarted_shards_are_reported_as_skipped()
+    print("Shard scheduling OK")
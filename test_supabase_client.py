@@ -0,0 +1,167 @@
+import asyncio
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from fakes import QuietHandler, serve
+from postgrest_stub import PostgrestStub
+from supabase_client import AsyncSupabaseClient, PaginationError, create_async_client, create_client
+
+class Leads(QuietHandler):
+    """Answers `GET /rest/v1/leads?id=eq.N` with that one row and records which client port asked."""
+
+    protocol_version = "HTTP/1.1"
+    ports = set()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            self.ports.add(self.client_address[1])
+        time.sleep(0.01)
+        url = urlparse(self.path)
+        if not url.path.endswith("/leads"):
+            self.reply_json({"message": "relation does not exist"}, status=404)
+            return
+        lead_id = parse_qs(url.query).get("id", ["eq.0"])[0].split(".", 1)[1]
+        self.reply_json([{"id": int(lead_id)}])
+
+def test_clients_reuse_pooled_connections():
+    async def burst(url):
+        client = AsyncSupabaseClient(url, "key", pool_size=3)
+        try:
+            await asyncio.gather(*(client.table("leads").select("id").execute() for _ in range(30)))
+        finally:
+            await client.aclose()
+
+    with serve(Leads) as url:
+        Leads.ports.clear()
+        client = create_client(url, "key")
+        for i in range(10):
+            assert client.table("leads").select("id").eq("id", i).execute().data == [{"id": i}]
+        client.close()
+        # One keep-alive connection served every sequential request
+        assert len(Leads.ports) == 1
+
+        Leads.ports.clear()
+        asyncio.run(burst(url))
+        # 30 concurrent requests never open more connections than the pool allows
+        assert 1 < len(Leads.ports) <= 3
+
+def test_async_client_answers_each_query_with_its_own_rows():
+    async def scenario(url):
+        client = create_async_client(url, "key")
+        try:
+            answers = await asyncio.gather(*(client.table("leads").select("id").eq("id", i).execute()
+                                             for i in range(20)))
+            missing = await client.table("no_such_table").select("id").execute()
+            return answers, missing
+        finally:
+            await client.aclose()
+
+    with serve(Leads) as url:
+        answers, missing = asyncio.run(scenario(url))
+        sync_missing = create_client(url, "key").table("no_such_table").select("id").execute()
+    assert [r.data for r in answers] == [[{"id": i}] for i in range(20)] and not any(r.error for r in answers)
+    # HTTP errors read the same whichever client hit them
+    assert missing.error.startswith("404 Client Error") and sync_missing.error.startswith("404 Client Error")
+
+def _stub_with_leads(count):
+    stub = PostgrestStub().start()
+    stub.insert("leads", [
+        {"company_name": f"Clinic {i}", "website_url": f"https://clinic{i}.example", "review_count": i}
+        for i in range(count)
+    ])
+    return stub
+
+def test_keyset_pagination_streams_projected_rows():
+    stub = _stub_with_leads(250)
+    try:
+        client = create_client(stub.url, "key")
+        rows = list(client.table("leads").select(["website_url"]).paginate(page_size=100))
+        assert len(rows) == 250 and set(rows[0]) == {"website_url", "id"}
+        assert stub.requests["GET"] == 3
+
+        # Marking rows processed mid-scan must not make keyset paging skip any
+        seen = []
+        for row in client.table("leads").select("id").eq("status", "discovered").paginate(page_size=40):
+            seen.append(row["id"])
+            client.table("leads").update({"status": "processed"}).eq("id", row["id"]).execute()
+        assert len(seen) == 250
+
+        capped = client.table("leads").select("id").gt("review_count", 9).range("id", 20, 200).limit(55)
+        assert [r["id"] for r in capped.paginate(page_size=25)] == list(range(20, 75))
+
+        # A failed page ends the scan with its own error type, after the rows already read
+        pages = client.table("leads").select("id").gt("review_count", 9).paginate(page_size=100)
+        assert next(pages)["id"] == 11
+        stub.stop()
+        try:
+            list(pages)
+            raise AssertionError("expected a PaginationError")
+        except PaginationError as e:
+            assert "Supabase pagination error" in str(e)
+    finally:
+        stub.stop()
+
+def test_writes_return_only_what_is_asked_for():
+    stub = _stub_with_leads(2)
+    try:
+        client = create_client(stub.url, "key")
+        lead = {"website_url": "https://new.example", "company_name": "New", "email_draft": "x" * 2000}
+        assert client.table("leads").upsert(lead, on_conflict="website_url").execute().data == []
+        assert client.table("leads").update({"status": "processed"}).eq("id", 1).execute().data == []
+        assert stub.bytes_returned == 0
+
+        saved = client.table("leads").upsert(lead, on_conflict="website_url", returning="id").execute()
+        assert saved.data == [{"id": 3}]
+        full = client.table("leads").update({"status": "processed"}, returning="representation").eq("id", 3).execute()
+        assert full.data[0]["email_draft"] == "x" * 2000
+    finally:
+        stub.stop()
+
+def test_async_paginate_matches_sync():
+    stub = _stub_with_leads(30)
+
+    async def collect():
+        client = create_async_client(stub.url, "key")
+        try:
+            return [row["id"] async for row in client.table("leads").select("id").range("id", None, 26).paginate(page_size=7)]
+        finally:
+            await client.aclose()
+
+    try:
+        assert asyncio.run(collect()) == list(range(1, 26))
+    finally:
+        stub.stop()
+
+def test_async_client_writes_and_reads_concurrently():
+    stub = PostgrestStub().start()
+
+    async def scenario():
+        client = create_async_client(stub.url, "key")
+        try:
+            leads = [{"company_name": f"Clinic {i}", "website_url": f"https://clinic{i}.example"} for i in range(20)]
+            saved = await asyncio.gather(*(client.table("leads").upsert(lead, on_conflict="website_url", returning="id")
+                                           .execute() for lead in leads))
+            ids = sorted(r.data[0]["id"] for r in saved)
+            await asyncio.gather(*(client.table("leads").update({"status": "processed"}).eq("id", i).execute()
+                                   for i in ids[:5]))
+            processed = await client.table("leads").select("id").eq("status", "processed").execute()
+            return ids, sorted(row["id"] for row in processed.data)
+        finally:
+            await client.aclose()
+
+    try:
+        ids, processed = asyncio.run(scenario())
+        assert ids == list(range(1, 21)) and processed == ids[:5]
+    finally:
+        stub.stop()
+
+if __name__ == "__main__":
+    test_clients_reuse_pooled_connections()
+    test_async_client_answers_each_query_with_its_own_rows()
+    test_keyset_pagination_streams_projected_rows()
+    test_writes_return_only_what_is_asked_for()
+    test_async_paginate_matches_sync()
+    test_async_client_writes_and_reads_concurrently()
+    print("Supabase client OK")
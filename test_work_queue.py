@@ -0,0 +1,88 @@
+import threading
+
+from postgrest_stub import PostgrestStub
+from supabase_client import create_client
+from work_queue import LeadWorkQueue
+
+def _stub_with_leads(count):
+    stub = PostgrestStub().start()
+    stub.insert("leads", [
+        {"company_name": f"Clinic {i}", "website_url": f"https://clinic{i}.example", "niche": "dentist"}
+        for i in range(count)
+    ])
+    return stub
+
+def test_concurrent_workers_process_each_lead_once():
+    stub = _stub_with_leads(40)
+    done = []
+    lock = threading.Lock()
+
+    def work(name):
+        queue = LeadWorkQueue(create_client(stub.url, "key"), worker_id=name, batch_size=3)
+        while leads := queue.claim():
+            for lead in leads:
+                assert lead["worker_id"] == name
+                assert queue.complete(lead, {"email_draft": f"Hi from {name}"})
+                with lock:
+                    done.append(lead["id"])
+
+    try:
+        workers = [threading.Thread(target=work, args=(f"worker-{i}",)) for i in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        rows = stub.rows()
+    finally:
+        stub.stop()
+
+    assert sorted(done) == [row["id"] for row in rows]
+    assert all(row["status"] == "processed" and row["worker_id"] is None for row in rows)
+
+def test_expired_lease_is_reclaimed_and_old_worker_loses_it():
+    stub = _stub_with_leads(1)
+    try:
+        crashed = LeadWorkQueue(create_client(stub.url, "key"), worker_id="crashed", lease_seconds=-1)
+        survivor = LeadWorkQueue(create_client(stub.url, "key"), worker_id="survivor")
+        [lead] = crashed.claim()
+
+        [reclaimed] = survivor.claim()
+        assert reclaimed["worker_id"] == "survivor" and reclaimed["attempts"] == 1
+        assert survivor.reclaimed == 1
+
+        # The first worker's late result must not overwrite the new lease
+        assert not crashed.complete(lead, {"email_draft": "stale"})
+        assert survivor.heartbeat([lead["id"]]) == 1
+        assert crashed.heartbeat([lead["id"]]) == 0
+        assert survivor.complete(reclaimed, {"email_draft": "fresh"})
+        [row] = stub.rows()
+    finally:
+        stub.stop()
+
+    assert row["status"] == "processed" and row["email_draft"] == "fresh"
+
+def test_failures_retry_until_max_attempts_then_fail():
+    stub = _stub_with_leads(2)
+    try:
+        queue = LeadWorkQueue(create_client(stub.url, "key"), worker_id="w", max_attempts=2)
+        first, second = queue.claim()
+        assert queue.release([second["id"]]) == 1
+
+        assert queue.fail(first, "timeout")
+        [retry, second] = queue.claim()
+        assert retry["attempts"] == 1
+        assert queue.fail(retry, "timeout again")
+        rows = stub.rows()
+    finally:
+        stub.stop()
+
+    assert rows[0]["status"] == "failed" and rows[0]["attempts"] == 2
+    assert rows[0]["last_error"] == "timeout again"
+    # Released leads are handed back without counting an attempt
+    assert rows[1]["status"] == "processing" and rows[1]["attempts"] == 0
+
+if __name__ == "__main__":
+    test_concurrent_workers_process_each_lead_once()
+    test_expired_lease_is_reclaimed_and_old_worker_loses_it()
+    test_failures_retry_until_max_attempts_then_fail()
+    print("Work queue OK")
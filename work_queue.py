@@ -0,0 +1,176 @@
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+# Work Queue Configuration
+WORKER_LEASE_SECONDS = float(os.getenv("WORKER_LEASE_SECONDS", "300"))
+WORKER_CLAIM_BATCH = int(os.getenv("WORKER_CLAIM_BATCH", "10"))
+WORKER_MAX_ATTEMPTS = int(os.getenv("WORKER_MAX_ATTEMPTS", "3"))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "10"))
+
+STATUS_DISCOVERED = "discovered"
+STATUS_PROCESSING = "processing"
+STATUS_PROCESSED = "processed"
+STATUS_FAILED = "failed"
+
+# Columns a claimed lead comes back with: what processing reads, plus the retry count
+CLAIM_COLUMNS = "id,niche,location,company_name,website_url,rating,review_count,attempts,worker_id"
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def _timestamp(moment: datetime) -> str:
+    # Fixed-width UTC so PostgREST (and string comparisons in stand-ins) order correctly
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+
+
+class LeadWorkQueue:
+    """
+    Claim-and-lease work queue over the leads table, so any number of
+    processing workers (on one box or many) never pick up the same lead.
+
+    claim() is a conditional PATCH: rows move from 'discovered' to
+    'processing' only if they are still 'discovered' when Postgres applies
+    the update, and PostgREST returns just the rows this worker won. Each
+    claimed row carries `worker_id` and `lease_expires_at`; heartbeat()
+    extends the lease of leads still being worked on. A lead whose lease
+    expired (its worker died) is claimed again, counting as one attempt.
+    Finished leads become 'processed'; failures go back to 'discovered'
+    until `max_attempts`, then 'failed'. Every write after the claim is
+    conditional on this worker still holding the lease.
+
+    Leases are stamped with this machine's clock; keep workers' clocks in sync.
+    """
+
+    def __init__(self, client, worker_id: Optional[str] = None, table: str = "leads",
+                 lease_seconds: float = WORKER_LEASE_SECONDS, batch_size: int = WORKER_CLAIM_BATCH,
+                 max_attempts: int = WORKER_MAX_ATTEMPTS):
+        self.client = client
+        self.worker_id = worker_id or default_worker_id()
+        self.table = table
+        self.lease_seconds = lease_seconds
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+        self.claimed = 0
+        self.reclaimed = 0
+        self.lost = 0
+
+    def _lease_until(self) -> str:
+        return _timestamp(datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds))
+
+    def _lease_fields(self) -> dict:
+        return {"status": STATUS_PROCESSING, "worker_id": self.worker_id, "lease_expires_at": self._lease_until()}
+
+    def claim(self, limit: Optional[int] = None) -> List[dict]:
+        """Claims up to `limit` leads (default batch_size). Returns the rows this worker now holds."""
+        limit = limit or self.batch_size
+        now = _timestamp(datetime.now(timezone.utc))
+        response = (
+            self.client.table(self.table)
+            .select("id,status,attempts")
+            .or_(f"status.eq.{STATUS_DISCOVERED},and(status.eq.{STATUS_PROCESSING},lease_expires_at.lt.{now})")
+            .order("id")
+            .limit(limit)
+            .execute()
+        )
+        if response.error:
+            print(f" [!] Work queue claim error: {response.error}")
+            return []
+
+        fresh = [row["id"] for row in response.data if row.get("status") == STATUS_DISCOVERED]
+        claimed = []
+        if fresh:
+            result = (
+                self.client.table(self.table)
+                .update(self._lease_fields(), returning=CLAIM_COLUMNS)
+                .in_("id", fresh)
+                .eq("status", STATUS_DISCOVERED)
+                .execute()
+            )
+            if result.error:
+                print(f" [!] Work queue claim error: {result.error}")
+            else:
+                claimed.extend(result.data)
+
+        # Abandoned leases: the attempt count in the filter keeps two workers from both winning
+        for row in response.data:
+            if row.get("status") != STATUS_PROCESSING:
+                continue
+            attempts = (row.get("attempts") or 0) + 1
+            fields = self._lease_fields() if attempts < self.max_attempts else {
+                "status": STATUS_FAILED, "worker_id": None, "lease_expires_at": None,
+                "last_error": "lease expired too many times",
+            }
+            result = (
+                self.client.table(self.table)
+                .update({**fields, "attempts": attempts}, returning=CLAIM_COLUMNS)
+                .eq("id", row["id"])
+                .eq("status", STATUS_PROCESSING)
+                .lt("lease_expires_at", now)
+                .eq("attempts", row.get("attempts") or 0)
+                .execute()
+            )
+            if not result.error and fields["status"] == STATUS_PROCESSING:
+                claimed.extend(result.data)
+                self.reclaimed += len(result.data)
+
+        self.claimed += len(claimed)
+        return claimed
+
+    def _held(self, query):
+        return query.eq("worker_id", self.worker_id).eq("status", STATUS_PROCESSING)
+
+    def heartbeat(self, lead_ids: Iterable) -> int:
+        """Extends the lease on leads this worker still holds. Returns how many were extended."""
+        lead_ids = list(lead_ids)
+        if not lead_ids:
+            return 0
+        result = self._held(
+            self.client.table(self.table).update({"lease_expires_at": self._lease_until()}, returning="id").in_("id", lead_ids)
+        ).execute()
+        if result.error:
+            print(f" [!] Work queue heartbeat error: {result.error}")
+            return 0
+        return len(result.data)
+
+    def complete(self, lead: dict, fields: Dict[str, object]) -> bool:
+        """Saves a finished lead as 'processed'. False if the lease was lost to another worker."""
+        data = {**fields, "status": STATUS_PROCESSED, "processed_at": _timestamp(datetime.now(timezone.utc)),
+                "worker_id": None, "lease_expires_at": None, "last_error": None}
+        # Only the id comes back: enough to tell whether the lease was still ours
+        result = self._held(self.client.table(self.table).update(data, returning="id").eq("id", lead["id"])).execute()
+        if result.error:
+            print(f" [!] Database Update Error: {result.error}")
+            return False
+        if not result.data:
+            self.lost += 1
+            print(f" [!] Lease on lead {lead['id']} was lost; result discarded.")
+            return False
+        print(f" [+] Lead {lead['id']} updated with analysis and draft.")
+        return True
+
+    def fail(self, lead: dict, error: str) -> bool:
+        """Records a failed attempt: back to 'discovered' for a retry, or 'failed' after max_attempts."""
+        attempts = (lead.get("attempts") or 0) + 1
+        status = STATUS_FAILED if attempts >= self.max_attempts else STATUS_DISCOVERED
+        data = {"status": status, "attempts": attempts, "last_error": error[:500],
+                "worker_id": None, "lease_expires_at": None}
+        result = self._held(self.client.table(self.table).update(data, returning="id").eq("id", lead["id"])).execute()
+        return not result.error and bool(result.data)
+
+    def release(self, lead_ids: Iterable) -> int:
+        """Hands unstarted or interrupted leads back without counting an attempt."""
+        lead_ids = list(lead_ids)
+        if not lead_ids:
+            return 0
+        data = {"status": STATUS_DISCOVERED, "worker_id": None, "lease_expires_at": None}
+        result = self._held(self.client.table(self.table).update(data, returning="id").in_("id", lead_ids)).execute()
+        return 0 if result.error else len(result.data)
+
+    def stats(self) -> str:
+        return (f"worker {self.worker_id}: {self.claimed} claimed ({self.reclaimed} from expired leases), "
+                f"{self.lost} leases lost")